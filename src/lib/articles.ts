@@ -1,4 +1,5 @@
 import type { CollectionEntry } from "astro:content";
+import { documentSidecar } from "./sidecars";
 
 export type ArticleEntry = CollectionEntry<"articles">;
 
@@ -63,6 +64,7 @@ export function monthKey(value: Date): string {
 
 export function plainText(value: string): string {
   return value
+    .replace(/<style\b[^>]*>[\s\S]*?<\/style>/gi, " ")
     .replace(/<[^>]+>/g, " ")
     .replace(/&nbsp;|&#160;/gi, " ")
     .replace(/&amp;/gi, "&")
@@ -83,3 +85,19 @@ export function readingMinutes(body: string): number {
 export function isImageOnly(body: string): boolean {
   return plainText(body).length === 0 && /<img\b/i.test(body);
 }
+
+interface SidecarEntry {
+  collection: string;
+  id: string;
+  body?: string;
+}
+
+export function entryReadingMinutes(entry: SidecarEntry): number {
+  return documentSidecar(entry.collection, entry.id)?.readingMinutes ?? readingMinutes(entry.body || "");
+}
+
+export function entryIsImageOnly(entry: SidecarEntry): boolean {
+  const sidecar = documentSidecar(entry.collection, entry.id);
+  if (!sidecar) return isImageOnly(entry.body || "");
+  return sidecar.characters === 0 && sidecar.images > 0;
+}
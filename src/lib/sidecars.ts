@@ -0,0 +1,25 @@
+export interface DocumentSidecar {
+  sourceHash: string;
+  characters: number;
+  hanCharacters: number;
+  images: number;
+  readingMinutes: number;
+}
+
+// Written by wechat_sync/sidecars.py; keyed the same way as collection entry ids.
+// The plain text sits in a `.txt` beside each file and is not bundled here.
+const modules = import.meta.glob<DocumentSidecar>("../sidecars/*/*.json", {
+  eager: true,
+  import: "default",
+});
+
+const sidecars = new Map(
+  Object.entries(modules).map(([path, sidecar]) => {
+    const [collection, file] = path.split("/").slice(-2);
+    return [`${collection}/${file.replace(/\.json$/, "").toLowerCase()}`, sidecar];
+  }),
+);
+
+export function documentSidecar(collection: string, id: string): DocumentSidecar | undefined {
+  return sidecars.get(`${collection}/${id.toLowerCase()}`);
+}
@@ -0,0 +1,112 @@
+"""Hedge key choice and single-key hedge attempts in the RapidAPI client."""
+
+from __future__ import annotations
+
+import io
+import threading
+import unittest
+from unittest import mock
+
+from wechat_sync.client import (
+    APIKeyPool,
+    RapidAPIClient,
+    RapidAPIKeyError,
+    RapidAPINetworkError,
+)
+from wechat_sync.hedging import HedgePolicy
+
+
+def _client(max_ratio: float = 0.1) -> RapidAPIClient:
+    client = RapidAPIClient(
+        APIKeyPool(keys=("first", "second", "third")),
+        hedge_policy=HedgePolicy(max_ratio=max_ratio),
+    )
+    client._active_index = 0
+    return client
+
+
+class HedgeKeyTest(unittest.TestCase):
+    def test_one_hedge_is_allowed_before_the_ratio_applies(self) -> None:
+        client = _client()
+        client.hedged_detail_requests = 5
+        self.assertEqual(client._hedge_key(0), 1)
+
+        client.hedges_sent = 1
+        self.assertIsNone(client._hedge_key(0))
+
+        client.hedged_detail_requests = 20
+        self.assertEqual(client._hedge_key(0), 1)
+
+    def test_keys_that_failed_over_are_not_chosen(self) -> None:
+        client = _client()
+        client.failovers[1] += 1
+        self.assertEqual(client._hedge_key(0), 2)
+
+        client.failovers[2] += 1
+        self.assertIsNone(client._hedge_key(0))
+
+    def test_no_policy_means_no_hedge(self) -> None:
+        client = RapidAPIClient(APIKeyPool(keys=("first", "second")))
+        self.assertIsNone(client._hedge_key(0))
+
+
+class HedgedRequestTest(unittest.TestCase):
+    def setUp(self) -> None:
+        # Hedges and failovers are announced on stdout.
+        patcher = mock.patch("sys.stdout", new_callable=io.StringIO)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_abandoned_primary_does_not_fail_over(self) -> None:
+        client = _client(max_ratio=1.0)
+        release = threading.Event()
+        finished = threading.Event()
+        calls: list[int] = []
+
+        def request(key_index: int) -> str:
+            calls.append(key_index)
+            if key_index == 0:
+                release.wait(5)
+                finished.set()
+                raise RapidAPIKeyError("quota")
+            return f"key {key_index}"
+
+        self.assertEqual(client._hedged(request, 0.01), "key 1")
+        release.set()
+        self.assertTrue(finished.wait(5))
+
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual((client.hedges_sent, client.hedges_won), (1, 1))
+        self.assertEqual(client.failovers, {})
+        self.assertEqual(client._active_index, 0)
+
+    def test_key_errors_on_every_attempt_fail_over_to_untried_keys(self) -> None:
+        client = _client(max_ratio=1.0)
+        primary_started = threading.Event()
+
+        def request(key_index: int) -> str:
+            if key_index == 0:
+                primary_started.wait(5)
+                raise RapidAPIKeyError("quota")
+            if key_index == 1:
+                primary_started.set()
+                raise RapidAPIKeyError("quota")
+            return f"key {key_index}"
+
+        self.assertEqual(client._hedged(request, 0.01), "key 2")
+        self.assertEqual(client.failovers, {0: 1, 1: 1})
+        self.assertEqual(client._active_index, 2)
+
+    def test_other_errors_are_raised_without_failover(self) -> None:
+        client = _client()
+
+        def request(key_index: int) -> str:
+            raise RapidAPINetworkError("timeout")
+
+        with self.assertRaises(RapidAPINetworkError):
+            client._hedged(request, 1.0)
+        self.assertEqual(client.failovers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Concurrent writers and dedup lookups on one sharded account index."""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from wechat_sync.downloader import ArticleSummary
+from wechat_sync.index_store import IndexStore
+from wechat_sync.sync import IndexedArticles
+
+
+def _entry(article_id: str, title: str, published_at: str) -> dict[str, Any]:
+    return {"articleId": article_id, "title": title, "publishedAt": published_at}
+
+
+class SeededIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.path = self.root / "account.json"
+        seed = self.store()
+        index = seed.load()
+        index["account"] = {"slug": "account"}
+        index["articles"] = [
+            _entry("1", "old", "2026-05-01T08:00:00+08:00"),
+            _entry("2", "other", "2026-04-01T08:00:00+08:00"),
+        ]
+        seed.commit(index, lambda fresh: fresh)
+
+    def store(self) -> IndexStore:
+        return IndexStore(self.path, lock_root=self.root / "locks")
+
+    def titles(self) -> dict[str, str]:
+        index = self.store().load()
+        return {entry["articleId"]: entry["title"] for entry in index["articles"]}
+
+
+class TwoWriterTest(SeededIndexTest):
+    def test_shard_only_commit_is_merged_by_a_stale_writer(self) -> None:
+        sync, repair = self.store(), self.store()
+        sync_index = sync.load()
+        repair_index = repair.load()
+
+        # The repair changes one entry in place; the head's counts stay the same.
+        repair_index["articles"][0]["title"] = "new"
+        repair.commit(repair_index, lambda fresh: fresh)
+
+        def move_cursor(fresh: dict[str, Any]) -> dict[str, Any]:
+            fresh["cursor"] = "next"
+            return fresh
+
+        saved = sync.commit(move_cursor(sync_index), move_cursor)
+
+        self.assertEqual(sync.merges, 1)
+        self.assertEqual(saved["cursor"], "next")
+        self.assertEqual(self.titles(), {"1": "new", "2": "other"})
+
+    def test_additions_from_both_writers_are_kept(self) -> None:
+        first, second = self.store(), self.store()
+        first_index = first.load(lazy=True)
+        second_index = second.load(lazy=True)
+
+        def add(entry: dict[str, Any]) -> Any:
+            def reapply(fresh: dict[str, Any]) -> dict[str, Any]:
+                fresh["articles"].append(entry)
+                return fresh
+
+            return reapply
+
+        add_first = add(_entry("3", "first", "2026-06-01T08:00:00+08:00"))
+        add_second = add(_entry("4", "second", "2026-06-02T08:00:00+08:00"))
+        first.commit(add_first(first_index), add_first)
+        second.commit(add_second(second_index), add_second)
+
+        self.assertEqual(second.merges, 1)
+        self.assertEqual(sorted(self.titles()), ["1", "2", "3", "4"])
+
+
+class IndexedArticlesTest(SeededIndexTest):
+    def summary(self, article_id: str, published_at: str) -> ArticleSummary:
+        return ArticleSummary(
+            article_id=article_id,
+            title="retitled",
+            url=f"https://mp.weixin.qq.com/s/{article_id}",
+            cover_url="",
+            published_at=datetime.fromisoformat(published_at),
+        )
+
+    def test_id_archived_under_another_month_is_found(self) -> None:
+        store = self.store()
+        indexed = IndexedArticles(store, store.load(lazy=True))
+
+        self.assertIn(self.summary("2", "2026-06-15T08:00:00+08:00"), indexed)
+        self.assertNotIn(self.summary("3", "2026-06-15T08:00:00+08:00"), indexed)
+        self.assertEqual(indexed.ids, {"1", "2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
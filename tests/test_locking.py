@@ -0,0 +1,66 @@
+"""Run and index locks contended by a second holder."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from wechat_sync.locking import IndexLock, LockBusyError, RunLock, lock_wait_summary
+
+
+class LockTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+
+
+class RunLockTest(LockTest):
+    def test_second_holder_is_refused_with_the_first_holders_pid(self) -> None:
+        path = self.root / "sync.lock"
+        with RunLock(path):
+            with self.assertRaises(LockBusyError) as raised:
+                RunLock(path).acquire()
+        self.assertIn(f"PID {os.getpid()}", str(raised.exception))
+
+    def test_released_lock_can_be_taken_again(self) -> None:
+        path = self.root / "sync.lock"
+        with RunLock(path):
+            pass
+        with RunLock(path):
+            pass
+
+
+class IndexLockTest(LockTest):
+    def test_second_holder_waits_for_the_first_to_release(self) -> None:
+        first = IndexLock("account", self.root)
+        first.acquire()
+        second = IndexLock("account", self.root)
+        acquired = threading.Event()
+
+        def take() -> None:
+            with second:
+                acquired.set()
+
+        thread = threading.Thread(target=take)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        time.sleep(0.1)
+        first.release()
+        thread.join(5)
+
+        self.assertTrue(acquired.is_set())
+        self.assertGreaterEqual(second.waited, 0.1)
+        self.assertIn("account", lock_wait_summary() or "")
+
+    def test_locks_of_different_indexes_do_not_contend(self) -> None:
+        with IndexLock("first", self.root), IndexLock("second", self.root) as second:
+            self.assertLess(second.waited, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Token-bucket waits, throttling and quota pressure on a fake clock."""
+
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from wechat_sync import pacing
+from wechat_sync.pacing import MIN_RATE_FRACTION, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping moves the monotonic clock."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ClockTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = mock.patch.object(pacing, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TokenBucketTest(ClockTest):
+    def test_requests_past_the_burst_wait_for_the_next_token(self) -> None:
+        bucket = TokenBucket(per_minute=60, burst=2)
+        for _ in range(4):
+            bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [1.0, 1.0])
+        self.assertEqual(bucket.waited, 2.0)
+
+    def test_time_spent_on_the_previous_request_counts(self) -> None:
+        bucket = TokenBucket(per_minute=60)
+        bucket.acquire()
+        self.clock.now += 0.25
+        bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [0.75])
+
+    def test_unlimited_bucket_never_waits(self) -> None:
+        bucket = TokenBucket(per_minute=0)
+        for _ in range(10):
+            bucket.acquire()
+        bucket.tighten()
+
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(bucket.throttled, 0)
+
+    def test_tighten_halves_down_to_the_floor_and_recover_climbs_back(self) -> None:
+        bucket = TokenBucket(per_minute=64)
+        for _ in range(6):
+            bucket.tighten()
+        self.assertEqual(bucket.per_minute, 64 * MIN_RATE_FRACTION)
+        self.assertEqual(bucket.throttled, 6)
+
+        for _ in range(20):
+            bucket.recover()
+        self.assertEqual(bucket.per_minute, 64)
+
+    def test_tightened_rate_lengthens_the_wait(self) -> None:
+        bucket = TokenBucket(per_minute=60)
+        bucket.tighten()
+        bucket.acquire()
+        bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [2.0])
+
+
+class RateLimiterTest(ClockTest):
+    def test_429_tightens_and_success_recovers_one_endpoint(self) -> None:
+        limiter = RateLimiter({"detail": 30.0})
+        limiter.record("detail", 429)
+        self.assertEqual(limiter.bucket("detail").per_minute, 15.0)
+        self.assertEqual(limiter.bucket("list").per_minute, 30.0)
+
+        limiter.record("detail", 404)
+        self.assertEqual(limiter.bucket("detail").per_minute, 15.0)
+        limiter.record("detail", 200)
+        self.assertEqual(limiter.bucket("detail").per_minute, 18.0)
+
+    def test_only_an_hourly_window_running_low_tightens(self) -> None:
+        limiter = RateLimiter({"detail": 30.0})
+        limiter.record_quota("detail", remaining=50, limit=100, reset_seconds=600)
+        limiter.record_quota("detail", remaining=5, limit=100, reset_seconds=86400 * 30)
+        self.assertEqual(limiter.bucket("detail").throttled, 0)
+
+        limiter.record_quota("detail", remaining=5, limit=100, reset_seconds=600)
+        self.assertEqual(limiter.bucket("detail").throttled, 1)
+        self.assertEqual(limiter.bucket("detail").per_minute, 15.0)
+
+    def test_urls_pace_wechat_pages_apart_from_the_cdn(self) -> None:
+        limiter = RateLimiter({"article": 60.0, "cdn": 60.0})
+        limiter.record_url("https://mp.weixin.qq.com/s/abc", 429)
+
+        self.assertEqual(limiter.bucket("article").throttled, 1)
+        self.assertEqual(limiter.bucket("cdn").throttled, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Backoff and quarantine bookkeeping for pending articles that keep failing."""
+
+from __future__ import annotations
+
+import unittest
+from datetime import datetime, timedelta
+
+from wechat_sync.client import RapidAPIKeyError
+from wechat_sync.downloader import ArticleDownloadError, ArticleSummary
+from wechat_sync.sync import (
+    QUARANTINE_AFTER_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    SHANGHAI,
+    RetryState,
+    _failed_attempt,
+    _pending_record,
+    _retry_state,
+)
+
+
+NOW = datetime(2026, 6, 1, 8, 0, tzinfo=SHANGHAI)
+
+
+class FailedAttemptTest(unittest.TestCase):
+    def test_delay_doubles_up_to_the_cap(self) -> None:
+        retry = RetryState()
+        delays = []
+        for _ in range(QUARANTINE_AFTER_ATTEMPTS + 4):
+            retry = _failed_attempt(retry, ArticleDownloadError("图片下载失败"), NOW)
+            delays.append(retry.next_attempt_at - NOW)
+
+        self.assertEqual(
+            delays[:3],
+            [RETRY_BASE_DELAY, RETRY_BASE_DELAY * 2, RETRY_BASE_DELAY * 4],
+        )
+        self.assertEqual(delays[-1], RETRY_MAX_DELAY)
+        self.assertEqual(retry.attempts, QUARANTINE_AFTER_ATTEMPTS + 4)
+        self.assertEqual(retry.last_error, "ArticleDownloadError")
+
+    def test_exhausted_key_pool_does_not_count_against_the_article(self) -> None:
+        retry = _failed_attempt(RetryState(attempts=2), RapidAPIKeyError("quota"), NOW)
+
+        self.assertEqual(retry.attempts, 2)
+        self.assertIsNone(retry.next_attempt_at)
+        self.assertTrue(retry.eligible(NOW))
+
+    def test_article_waits_until_its_next_attempt(self) -> None:
+        retry = _failed_attempt(RetryState(), ArticleDownloadError("超时"), NOW)
+
+        self.assertFalse(retry.eligible(NOW))
+        self.assertTrue(retry.eligible(NOW + RETRY_BASE_DELAY))
+
+
+class PendingRecordTest(unittest.TestCase):
+    def test_retry_state_survives_the_index_round_trip(self) -> None:
+        article = ArticleSummary(
+            article_id="1",
+            title="标题",
+            url="https://mp.weixin.qq.com/s/1",
+            cover_url="",
+            published_at=NOW - timedelta(days=1),
+        )
+        retry = _failed_attempt(RetryState(), ArticleDownloadError("超时"), NOW)
+
+        self.assertEqual(_retry_state(_pending_record(article, retry)), retry)
+        self.assertEqual(_retry_state(_pending_record(article)), RetryState())
+
+
+if __name__ == "__main__":
+    unittest.main()
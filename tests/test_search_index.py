@@ -0,0 +1,79 @@
+"""Tokenization and concurrent writers on one search-index scope."""
+
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from wechat_sync.search_index import SearchDocument, SearchIndex, _shard_name, shard_of, terms
+
+
+def _document(key: str, text: str) -> SearchDocument:
+    return SearchDocument(
+        scope="scope",
+        key=key,
+        title=key,
+        description="",
+        date="2026.06.01",
+        href=f"/articles/{key}/",
+        kind="wechat",
+        source="account",
+        label="账号",
+        text=text,
+    )
+
+
+class TermsTest(unittest.TestCase):
+    def test_every_cjk_character_is_indexed_on_its_own(self) -> None:
+        # "涨" ends the run and starts no bigram.
+        self.assertEqual(terms("上涨。ETF"), {"上", "涨", "上涨", "etf"})
+
+
+class TwoWriterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        seed = self.index()
+        seed.upsert(_document("removed", "甲乙"))
+        seed.upsert(_document("kept", "丙丁"))
+        seed.flush()
+
+    def index(self) -> SearchIndex:
+        return SearchIndex(
+            self.root / "public",
+            autoflush=False,
+            state_root=self.root / "state",
+            lock_root=self.root / "locks",
+        )
+
+    def matches(self, term: str) -> list[str]:
+        scope = self.root / "public" / "scope"
+        documents = json.loads((scope / "docs.json").read_text(encoding="utf-8"))
+        shard = json.loads((scope / _shard_name(shard_of(term))).read_text(encoding="utf-8"))
+        return [documents[slot]["title"] for slot in shard.get(term, [])]
+
+    def test_stale_writer_replays_onto_the_other_writers_flush(self) -> None:
+        sync, importer = self.index(), self.index()
+        # Both load the scope before either flushes.
+        self.assertEqual(sync.keys("scope"), importer.keys("scope"))
+
+        importer.remove("scope", "removed")
+        importer.upsert(_document("imported", "戊己"))
+        importer.flush()
+        sync.upsert(_document("synced", "庚辛"))
+        sync.flush()
+
+        self.assertEqual(self.index().keys("scope"), {"kept", "imported", "synced"})
+        self.assertEqual(self.matches("甲乙"), [])
+        self.assertEqual(self.matches("丙丁"), ["kept"])
+        self.assertEqual(self.matches("戊己"), ["imported"])
+        self.assertEqual(self.matches("庚辛"), ["synced"])
+        manifest = json.loads((self.root / "public" / "manifest.json").read_text(encoding="utf-8"))
+        self.assertEqual(manifest["scopes"]["scope"]["documents"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
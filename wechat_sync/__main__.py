@@ -0,0 +1,58 @@
+"""Dispatch `python -m wechat_sync <command>` to the matching tool module."""
+
+from __future__ import annotations
+
+import importlib
+import sys
+from typing import Optional, Sequence
+
+
+PROG = "python -m wechat_sync"
+# Command name -> (module, summary). Modules are imported only when chosen, so
+# light commands never pay for requests, urllib3 or BeautifulSoup.
+COMMANDS: dict[str, tuple[str, str]] = {
+    "sync": ("sync", "同步已配置的公众号文章"),
+    "daemon": ("daemon", "常驻进程，按发文时段自适应轮询同步"),
+    "import-urls": ("import_urls", "按已知原文链接导入文章"),
+    "repair-mojibake": ("repair_mojibake", "重新下载并清理乱码文章"),
+    "validate": ("validate", "发布前归档完整性检查"),
+    "initialize": ("initialize", "初始化新公众号配置"),
+    "secrets": ("rapidapi_secrets", "维护和上传 RapidAPI Key 池"),
+    "search-index": ("search_index", "增量更新站内搜索分片索引"),
+    "sidecars": ("sidecars", "生成纯文本统计旁路文件"),
+    "compact": ("compaction", "重新压缩已归档文章正文"),
+    "rerender": ("rerender", "用原始归档离线重新生成文章"),
+    "image-dimensions": ("image_meta", "为已归档图片补充宽高和占位图"),
+    "assets": ("deferred_assets", "下载延后发布文章的图片"),
+    "migrate-indexes": ("index_store", "把账号索引拆分为按月分片"),
+    "benchmark": ("benchmark", "下载器与命令启动基准测试"),
+}
+
+
+def usage() -> str:
+    width = max(len(name) for name in COMMANDS)
+    lines = [f"用法：{PROG} <命令> [参数]", "", "命令："]
+    lines += [f"  {name:<{width}}  {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", f"查看命令参数：{PROG} <命令> --help"]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    arguments = list(sys.argv[1:] if argv is None else argv)
+    if not arguments or arguments[0] in {"-h", "--help"}:
+        print(usage(), file=sys.stdout if arguments else sys.stderr)
+        return 0 if arguments else 2
+
+    name, *command_arguments = arguments
+    entry = COMMANDS.get(name.replace("_", "-"))
+    if entry is None:
+        print(f"未知命令: {name}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(f"{__package__}.{entry[0]}")
+    # Each tool parses sys.argv itself; make its usage line show the dispatcher.
+    sys.argv = [f"{PROG} {name}", *command_arguments]
+    return module.main()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
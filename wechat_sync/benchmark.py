@@ -0,0 +1,472 @@
+"""Benchmark the downloader stages and command start-up against stored baselines."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import mimetypes
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import requests
+from bs4 import BeautifulSoup
+
+from .compaction import compact
+from .downloader import (
+    CSS_URL_RE,
+    DEFAULT_ASSET_ROOT,
+    DEFAULT_CONTENT_DIR,
+    ArticleSummary,
+    WeChatArticleDownloader,
+    _safe_article_id,
+)
+from .partial_assets import PartialAssets
+from .sidecars import split_markdown
+from .sync import _timestamp
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE_PATH = Path(__file__).resolve().parent / "benchmark-baseline.json"
+# Stub CDN host; asset URLs on it resolve to files under public/article-assets.
+STUB_ASSET_PREFIX = "https://mmbiz.qpic.cn/benchmark/"
+LOCAL_ASSET_RE = re.compile(r'(\s(?:src|href))="/article-assets/([^"]+)"')
+STAGES = ("parse", "sanitize", "localize", "compact", "decode", "render")
+# Stages below this share of the baseline total are too noisy to gate on.
+GATED_STAGE_SHARE = 0.05
+HEAVY_MODULES = ("requests", "urllib3", "bs4")
+STARTUP_SCRIPT = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - started)\n"
+    f"print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))\n"
+)
+# Interpreter start-up jitter dwarfs the relative tolerance for tiny imports.
+STARTUP_SLACK_MS = 10.0
+
+
+@dataclass(frozen=True)
+class BenchmarkArticle:
+    summary: ArticleSummary
+    source_name: str
+    title: str
+    description: str
+    cover_url: str
+    html: str
+
+
+class _LocalAssetDownloader(WeChatArticleDownloader):
+    """Serve stub CDN URLs from the archived asset directories."""
+
+    def __init__(self, asset_root: Path, source_root: Path) -> None:
+        super().__init__(
+            content_dir=asset_root / "markdown",
+            asset_root=asset_root,
+            sidecar_root=None,
+            raw_root=None,
+            partial_root=asset_root / ".partial",
+        )
+        self._source_root = source_root
+
+    def _get(self, url: str, referer: str) -> requests.Response:
+        if not url.startswith(STUB_ASSET_PREFIX):
+            raise ValueError(f"基准测试不会访问网络: {url}")
+        path = self._source_root / url.removeprefix(STUB_ASSET_PREFIX)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = path.read_bytes()
+        response.headers["Content-Type"] = (
+            mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        )
+        return response
+
+
+def _remote_asset(local_path: str) -> str:
+    return STUB_ASSET_PREFIX + local_path.removeprefix("/article-assets/")
+
+
+def _detail_html(body: str) -> str:
+    """Undo localization so the body looks like RapidAPI detail HTML again."""
+    body = LOCAL_ASSET_RE.sub(
+        lambda match: f'{match.group(1)}="" data-src="{STUB_ASSET_PREFIX}{match.group(2)}"',
+        body,
+    )
+    body = CSS_URL_RE.sub(
+        lambda match: (
+            f"url({match.group(1)}{_remote_asset(match.group(2))}{match.group(1)})"
+            if match.group(2).startswith("/article-assets/")
+            else match.group(0)
+        ),
+        body,
+    )
+    return (
+        "<html><body><div class=\"rich_media_content\" id=\"js_content\">"
+        f"{body}</div></body></html>"
+    )
+
+
+def load_corpus(
+    content_dir: Path = DEFAULT_CONTENT_DIR,
+    limit: int = 0,
+) -> list[BenchmarkArticle]:
+    articles: list[BenchmarkArticle] = []
+    for markdown_path in sorted(content_dir.glob("*.md")):
+        frontmatter, body = split_markdown(markdown_path.read_text(encoding="utf-8"))
+        start = body.find('<div class="wechat-article">')
+        end = body.rfind("</div>")
+        if start < 0 or end < start:
+            continue
+        body = body[start + len('<div class="wechat-article">') : end].strip()
+        cover = str(frontmatter.get("cover") or "")
+        articles.append(
+            BenchmarkArticle(
+                summary=ArticleSummary(
+                    article_id=str(frontmatter.get("articleId") or markdown_path.stem),
+                    title=str(frontmatter.get("title") or ""),
+                    url=str(frontmatter.get("sourceUrl") or ""),
+                    cover_url=_remote_asset(cover) if cover else "",
+                    published_at=_timestamp(frontmatter["publishedAt"]),
+                ),
+                source_name=str(frontmatter.get("source") or ""),
+                title=str(frontmatter.get("title") or ""),
+                description=str(frontmatter.get("description") or ""),
+                cover_url=_remote_asset(cover) if cover else "",
+                html=_detail_html(body),
+            )
+        )
+        if limit and len(articles) >= limit:
+            break
+    return articles
+
+
+def _timed(timings: dict[str, float], stage: str, function: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = function()
+    timings[stage] += time.perf_counter() - start
+    return result
+
+
+def _run_once(
+    articles: list[BenchmarkArticle],
+    downloader: _LocalAssetDownloader,
+    work_root: Path,
+) -> dict[str, float]:
+    """Replay the `_archive_content` stages for every article and time each one."""
+    timings = dict.fromkeys(STAGES, 0.0)
+    for article in articles:
+        article_key = _safe_article_id(article.summary.article_id, article.summary.url)
+        asset_dir = work_root / article_key
+        # Stage through a manifest as `_archive_content` does, so recording assets is timed.
+        downloader._partials[asset_dir] = PartialAssets(asset_dir)
+        soup = _timed(
+            timings,
+            "parse",
+            lambda: BeautifulSoup(article.html, "html.parser"),
+        )
+        content = soup.select_one("#js_content, .rich_media_content") or soup.body
+        _timed(timings, "sanitize", lambda: downloader._sanitize(content))
+
+        def localize() -> None:
+            downloader._localize_content_images(
+                content,
+                article.summary.url,
+                article_key,
+                asset_dir,
+            )
+            if article.cover_url:
+                downloader._download_asset(
+                    article.cover_url,
+                    "cover",
+                    article_key,
+                    asset_dir,
+                    article.summary.url,
+                )
+
+        _timed(timings, "localize", localize)
+        _timed(timings, "compact", lambda: compact(content))
+        body_html = _timed(timings, "decode", lambda: content.decode_contents().strip())
+        _timed(
+            timings,
+            "render",
+            lambda: downloader._render_markdown(
+                summary=article.summary,
+                source_name=article.source_name,
+                title=article.title,
+                description=article.description,
+                cover_path="",
+                body_html=body_html,
+            ),
+        )
+        downloader._partials.pop(asset_dir)
+        shutil.rmtree(asset_dir)
+    return timings
+
+
+def run_benchmark(
+    articles: list[BenchmarkArticle],
+    repeat: int = 3,
+    asset_root: Path = DEFAULT_ASSET_ROOT,
+) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="wechat-benchmark-") as work_directory:
+        work_root = Path(work_directory)
+        downloader = _LocalAssetDownloader(work_root, asset_root)
+        # Keep the fastest pass of each stage to damp scheduler noise.
+        best = dict.fromkeys(STAGES, float("inf"))
+        for _ in range(repeat):
+            for stage, seconds in _run_once(articles, downloader, work_root).items():
+                best[stage] = min(best[stage], seconds)
+
+        # A separate traced pass: tracemalloc slows allocation-heavy stages.
+        tracemalloc.start()
+        try:
+            _run_once(articles, downloader, work_root)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    total = sum(best.values())
+    return {
+        "articles": len(articles),
+        "articlesPerSecond": round(len(articles) / total, 2) if total else 0.0,
+        "peakMemoryMiB": round(peak / 1024 / 1024, 2),
+        "stages": {
+            stage: round(best[stage] / len(articles) * 1000, 3) if articles else 0.0
+            for stage in STAGES
+        },
+        "python": platform.python_version(),
+    }
+
+
+def regressions(
+    result: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float,
+) -> list[str]:
+    problems: list[str] = []
+    if result["articles"] != baseline.get("articles"):
+        problems.append(
+            f"语料篇数 {result['articles']} 与基线 {baseline.get('articles')} 不一致，"
+            "请用 --update-baseline 重新记录"
+        )
+        return problems
+    if result["articlesPerSecond"] < baseline["articlesPerSecond"] * (1 - tolerance):
+        problems.append(
+            f"吞吐量 {result['articlesPerSecond']:.1f} 篇/秒，"
+            f"低于基线 {baseline['articlesPerSecond']:.1f} 篇/秒"
+        )
+    if result["peakMemoryMiB"] > baseline["peakMemoryMiB"] * (1 + tolerance):
+        problems.append(
+            f"峰值内存 {result['peakMemoryMiB']:.1f} MiB，"
+            f"高于基线 {baseline['peakMemoryMiB']:.1f} MiB"
+        )
+    baseline_total = sum(baseline["stages"].values())
+    for stage, baseline_ms in baseline["stages"].items():
+        current_ms = result["stages"].get(stage, 0.0)
+        if (
+            baseline_total
+            and baseline_ms / baseline_total >= GATED_STAGE_SHARE
+            and current_ms > baseline_ms * (1 + tolerance)
+        ):
+            problems.append(
+                f"{stage} 阶段 {current_ms:.2f} ms/篇，高于基线 {baseline_ms:.2f} ms/篇"
+            )
+    return problems
+
+
+def _print_report(result: dict[str, Any], baseline: Optional[dict[str, Any]]) -> None:
+    total = sum(result["stages"].values())
+    print(f"{'阶段':<10}{'ms/篇':>10}{'占比':>8}{'基线 ms/篇':>14}")
+    for stage, milliseconds in result["stages"].items():
+        share = milliseconds / total * 100 if total else 0.0
+        reference = (
+            f"{baseline['stages'][stage]:.3f}"
+            if baseline and stage in baseline.get("stages", {})
+            else "-"
+        )
+        print(f"{stage:<10}{milliseconds:>10.3f}{share:>7.1f}%{reference:>14}")
+    print(
+        f"{result['articles']} 篇：{result['articlesPerSecond']:.1f} 篇/秒，"
+        f"峰值内存 {result['peakMemoryMiB']:.1f} MiB"
+    )
+
+
+def startup_times(repeat: int = 5) -> dict[str, dict[str, Any]]:
+    """Time a cold import of each dispatcher command's module in a fresh interpreter."""
+    from .__main__ import COMMANDS
+
+    modules = {"(dispatcher)": "__main__"}
+    modules.update((name, module) for name, (module, _) in COMMANDS.items())
+    results: dict[str, dict[str, Any]] = {}
+    for name, module in modules.items():
+        script = STARTUP_SCRIPT.format(module=f"{__package__}.{module}")
+        timings: list[float] = []
+        heavy: list[str] = []
+        for _ in range(repeat):
+            completed = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=PROJECT_ROOT,
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+            seconds, _, loaded = completed.stdout.strip().partition("\n")
+            timings.append(float(seconds))
+            heavy = loaded.split()
+        results[name] = {
+            "importMs": round(min(timings) * 1000, 1),
+            "heavyModules": heavy,
+        }
+    return results
+
+
+def startup_regressions(
+    result: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float,
+) -> list[str]:
+    problems: list[str] = []
+    for name, current in result.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        added = sorted(set(current["heavyModules"]) - set(reference["heavyModules"]))
+        if added:
+            problems.append(f"{name} 启动时新增导入 {', '.join(added)}")
+        limit = reference["importMs"] * (1 + tolerance) + STARTUP_SLACK_MS
+        if current["importMs"] > limit:
+            problems.append(
+                f"{name} 导入 {current['importMs']:.1f} ms，"
+                f"高于基线 {reference['importMs']:.1f} ms"
+            )
+    return problems
+
+
+def _print_startup_report(
+    result: dict[str, dict[str, Any]],
+    baseline: Optional[dict[str, dict[str, Any]]],
+) -> None:
+    print(f"{'命令':<18}{'导入 ms':>10}{'基线 ms':>10}  重量级依赖")
+    for name, current in result.items():
+        reference = (baseline or {}).get(name)
+        reference_ms = f"{reference['importMs']:.1f}" if reference else "-"
+        heavy = ", ".join(current["heavyModules"]) or "-"
+        print(f"{name:<18}{current['importMs']:>10.1f}{reference_ms:>10}  {heavy}")
+
+
+def _write_baseline(path: Path, payload: dict[str, Any]) -> None:
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"基线已更新: {path.relative_to(PROJECT_ROOT)}")
+
+
+def _report_problems(problems: list[str], tolerance: float) -> int:
+    if problems:
+        print("性能回退：", file=sys.stderr)
+        for problem in problems:
+            print(f"- {problem}", file=sys.stderr)
+        return 1
+    print(f"未超出基线 {tolerance:.0%} 容差")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="用已归档文章回放下载器解析、清洗、本地化和渲染阶段并与基线比较"
+    )
+    parser.add_argument("--content-dir", type=Path, default=DEFAULT_CONTENT_DIR)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="改为测量 python -m wechat_sync 各命令在新解释器中的导入耗时",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=0,
+        help="只使用最早的 N 篇文章；默认与基线篇数相同，无基线时使用全部文章",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="重复次数，取最快一次（默认 3）",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="允许相对基线变慢或变大的比例（默认 0.25）",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="把本次结果写为新的基线",
+    )
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    if args.limit < 0 or args.repeat < 1 or args.tolerance < 0:
+        print("--limit 不能小于 0，--repeat 必须大于 0，--tolerance 不能小于 0", file=sys.stderr)
+        return 2
+    stored: dict[str, Any] = {}
+    if args.baseline.exists():
+        stored = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    if args.startup:
+        try:
+            startup = startup_times(args.repeat)
+        except (OSError, subprocess.CalledProcessError) as error:
+            print(f"启动基准测试失败: {error}", file=sys.stderr)
+            return 1
+        startup_baseline = None if args.update_baseline else stored.get("startup")
+        _print_startup_report(startup, startup_baseline)
+        if args.update_baseline:
+            _write_baseline(args.baseline, {**stored, "startup": startup})
+            return 0
+        if startup_baseline is None:
+            print("尚无启动基线，使用 --startup --update-baseline 记录本次结果")
+            return 0
+        return _report_problems(
+            startup_regressions(startup, startup_baseline, args.tolerance),
+            args.tolerance,
+        )
+
+    baseline = None if args.update_baseline or "articles" not in stored else stored
+    limit = args.limit
+    if baseline is not None and not limit:
+        # The archive only grows; compare the same oldest articles as the baseline.
+        limit = int(baseline["articles"])
+    try:
+        articles = load_corpus(args.content_dir, limit)
+        if not articles:
+            print("没有可用于基准测试的文章", file=sys.stderr)
+            return 1
+        result = run_benchmark(articles, args.repeat)
+    except (OSError, ValueError) as error:
+        print(f"基准测试失败: {error}", file=sys.stderr)
+        return 1
+
+    _print_report(result, baseline)
+    if args.update_baseline:
+        _write_baseline(args.baseline, {**stored, **result})
+        return 0
+    if baseline is None:
+        print("尚无基线，使用 --update-baseline 记录本次结果")
+        return 0
+    return _report_problems(regressions(result, baseline, args.tolerance), args.tolerance)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
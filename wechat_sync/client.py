@@ -5,14 +5,23 @@ from __future__ import annotations
 import hashlib
 import json
 import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from datetime import date
 from pathlib import Path
-from typing import Any, Callable, Optional, Sequence, TypeVar
+from typing import Any, Callable, Collection, Optional, Sequence, TypeVar
 from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
 import requests
 
+from .hedging import HedgePolicy, LatencyHistory
+from .metrics import LatencyHistogram
+from .pacing import RateLimiter
+from .tracing import span
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_KEY_FILE = PROJECT_ROOT / "data" / "wechat" / "rapidapi-keys.json"
@@ -21,6 +30,7 @@ DEFAULT_API_URL = f"https://{DEFAULT_API_HOST}"
 HISTORY_PATH = "/api/weixin/get-account-history-articles/v2"
 DETAIL_PATH = "/api/weixin/get-article-detail/v4"
 SWITCHABLE_CODES = {100, 302, 303, 500, 600, 601, 602}
+ENDPOINT_LABELS = {HISTORY_PATH: "list", DETAIL_PATH: "detail"}
 ResponseValue = TypeVar("ResponseValue")
 
 
@@ -243,12 +253,30 @@ class RapidAPIClient:
         key_pool: APIKeyPool,
         timeout_seconds: int = 120,
         api_url: str = DEFAULT_API_URL,
+        rate_limiter: Optional[RateLimiter] = None,
+        latency_history: Optional[LatencyHistory] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
     ) -> None:
         self._keys = key_pool.keys
+        self._rate_limiter = rate_limiter
+        # With a latency history, timeouts follow observed latencies up to
+        # timeout_seconds instead of always waiting the full ceiling.
+        self.latency_history = latency_history
+        self._hedge_policy = hedge_policy
+        self.hedged_detail_requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
         self._timeout_seconds = timeout_seconds
         self._api_url = api_url.rstrip("/")
         # Spread scheduled runs across accounts instead of exhausting key 1 first.
         self._active_index = date.today().toordinal() % len(self._keys)
+        # Run statistics for the metrics exporter; key indexes, never key values.
+        self.request_latency: dict[str, LatencyHistogram] = {}
+        self.failovers: Counter[int] = Counter()
+        self.quota_remaining: dict[tuple[int, str], float] = {}
+        # Detail requests run on several threads; this guards the active key
+        # and every statistic above.
+        self._lock = threading.Lock()
         self._session = requests.Session()
         self._session.headers.update(
             {
@@ -278,20 +306,40 @@ class RapidAPIClient:
         form_encoded: bool = False,
     ) -> Any:
         request_arguments = {"data": params} if form_encoded else {"params": params}
-        try:
-            response = self._session.request(
-                method,
-                f"{self._api_url}{path}",
-                **request_arguments,
-                headers={"x-rapidapi-key": self._keys[key_index]},
-                timeout=self._timeout_seconds,
-            )
-        except requests.Timeout as error:
-            raise RapidAPINetworkError("RapidAPI 请求超时") from error
-        except requests.RequestException as error:
-            raise RapidAPINetworkError(
-                f"RapidAPI 网络请求失败: {type(error).__name__}"
-            ) from error
+        endpoint = path.rsplit("/", 1)[-1]
+        label = ENDPOINT_LABELS.get(path, endpoint)
+        with self._lock:
+            histogram = self.request_latency.setdefault(label, LatencyHistogram())
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(label)
+        timeout = (
+            self._timeout_seconds
+            if self.latency_history is None
+            else self.latency_history.timeout(label, self._timeout_seconds)
+        )
+        with span("rapidapi.request", endpoint=endpoint, key=key_index) as request_span:
+            started = time.perf_counter()
+            try:
+                response = self._session.request(
+                    method,
+                    f"{self._api_url}{path}",
+                    **request_arguments,
+                    headers={"x-rapidapi-key": self._keys[key_index]},
+                    timeout=timeout,
+                )
+            except requests.Timeout as error:
+                raise RapidAPINetworkError(f"RapidAPI 请求超时（{timeout:.0f} 秒）") from error
+            except requests.RequestException as error:
+                raise RapidAPINetworkError(
+                    f"RapidAPI 网络请求失败: {type(error).__name__}"
+                ) from error
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    histogram.observe(elapsed)
+            request_span.set(status=response.status_code, bytes=len(response.content))
+        if self.latency_history is not None and response.status_code == 200:
+            self.latency_history.observe(label, elapsed)
 
         quota_headers = [
             f"{name.removeprefix('x-ratelimit-')}={value}"
@@ -305,8 +353,26 @@ class RapidAPIClient:
                 )
             )
         ]
+        for header, value in response.headers.items():
+            name = header.lower()
+            if name.startswith("x-ratelimit-") and name.endswith("-remaining"):
+                try:
+                    remaining = float(value)
+                except ValueError:
+                    continue
+                quota = name.removeprefix("x-ratelimit-").removesuffix("-remaining")
+                with self._lock:
+                    self.quota_remaining[(key_index, quota)] = remaining
+                if self._rate_limiter is not None:
+                    try:
+                        limit = float(response.headers[f"x-ratelimit-{quota}-limit"])
+                        reset = float(response.headers[f"x-ratelimit-{quota}-reset"])
+                    except (KeyError, ValueError):
+                        continue
+                    self._rate_limiter.record_quota(label, remaining, limit, reset)
+        if self._rate_limiter is not None:
+            self._rate_limiter.record(label, response.status_code)
         if quota_headers:
-            endpoint = path.rsplit("/", 1)[-1]
             print(
                 f"RapidAPI {endpoint} 配额（Key {key_index + 1}/"
                 f"{self.key_count}）：{', '.join(quota_headers)}"
@@ -338,22 +404,31 @@ class RapidAPIClient:
             raise RapidAPIError(f"RapidAPI 业务错误 {code}: {message}")
         return payload
 
+    def _key_failed(self, key_index: int, error: RapidAPIKeyError) -> None:
+        with self._lock:
+            self.failovers[key_index] += 1
+        print(
+            f"RapidAPI Key 池第 {key_index + 1}/{self.key_count} 个不可用"
+            f"（{error}），尝试下一个"
+        )
+
     def _with_failover(
         self,
         request: Callable[[int], ResponseValue],
+        tried: Collection[int] = (),
+        last_error: Optional[RapidAPIError] = None,
     ) -> ResponseValue:
-        last_error: Optional[RapidAPIError] = None
         for key_index in self._key_order():
+            if key_index in tried:
+                continue
             try:
                 result = request(key_index)
             except RapidAPIKeyError as error:
                 last_error = error
-                print(
-                    f"RapidAPI Key 池第 {key_index + 1}/{self.key_count} 个不可用"
-                    f"（{error}），尝试下一个"
-                )
+                self._key_failed(key_index, error)
                 continue
-            self._active_index = key_index
+            with self._lock:
+                self._active_index = key_index
             return result
 
         if last_error is not None:
@@ -376,8 +451,9 @@ class RapidAPIClient:
 
     def fetch_article_detail(self, article_url: str) -> dict[str, Any]:
         """Fetch archive-ready HTML instead of triggering WeChat's link captcha."""
-        return self._with_failover(
-            lambda key_index: _extract_detail(
+
+        def request(key_index: int) -> dict[str, Any]:
+            return _extract_detail(
                 self._request_json(
                     key_index,
                     "GET",
@@ -385,4 +461,107 @@ class RapidAPIClient:
                     {"articleUrl": article_url},
                 )
             )
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return self._with_failover(request)
+        return self._hedged(request, hedge_delay)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self._hedge_policy is None or self.latency_history is None or self.key_count < 2:
+            return None
+        # No hedging until enough answers have been seen to know what is slow.
+        delay = self.latency_history.percentile("detail", self._hedge_policy.percentile)
+        if delay is None:
+            return None
+        return max(self._hedge_policy.min_delay_seconds, delay)
+
+    def _hedge_key(self, primary_key: int) -> Optional[int]:
+        if self._hedge_policy is None:
+            return None
+        allowance = max(1.0, self._hedge_policy.max_ratio * self.hedged_detail_requests)
+        if self.hedges_sent >= allowance:
+            return None
+        # A key that already failed over in this run is not a healthy second choice.
+        return next(
+            (
+                key_index
+                for key_index in self._key_order()
+                if key_index != primary_key and not self.failovers[key_index]
+            ),
+            None,
         )
+
+    def _hedged(
+        self,
+        request: Callable[[int], ResponseValue],
+        hedge_delay: float,
+    ) -> ResponseValue:
+        """Race one attempt on the active key against a late one on a healthy key.
+
+        Both attempts use a single key each, so the one left running after the
+        other answers cannot fail over and rotate keys behind the caller's back.
+        Failover to the untried keys starts only once every attempt has failed
+        on its key.
+        """
+        with self._lock:
+            self.hedged_detail_requests += 1
+            primary_key = self._active_index
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rapidapi-hedge")
+        primary = executor.submit(request, primary_key)
+        attempts: dict[Future[ResponseValue], int] = {primary: primary_key}
+        key_error: Optional[RapidAPIKeyError] = None
+        try:
+            finished, _ = wait([primary], timeout=hedge_delay)
+            hedge_key = None
+            if not finished:
+                with self._lock:
+                    hedge_key = self._hedge_key(primary_key)
+                    if hedge_key is not None:
+                        self.hedges_sent += 1
+            if hedge_key is None:
+                return self._first_answer(attempts, primary)
+
+            print(
+                f"RapidAPI 详情请求 {hedge_delay:.1f} 秒未返回，"
+                f"改用 Key {hedge_key + 1}/{self.key_count} 同时请求"
+            )
+            with span("rapidapi.hedge", key=hedge_key, delay=round(hedge_delay, 3)):
+                attempts[executor.submit(request, hedge_key)] = hedge_key
+                return self._first_answer(attempts, primary)
+        except RapidAPIKeyError as error:
+            key_error = error
+        finally:
+            # The slower attempt cannot be aborted; its answer is simply dropped.
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self._with_failover(request, tried=set(attempts.values()), last_error=key_error)
+
+    def _first_answer(
+        self,
+        attempts: dict[Future[ResponseValue], int],
+        primary: Future[ResponseValue],
+    ) -> ResponseValue:
+        """The first successful attempt; raises RapidAPIKeyError only if every key failed."""
+        waiting = set(attempts)
+        last_error: Optional[RapidAPIError] = None
+        key_error: Optional[RapidAPIKeyError] = None
+        while waiting:
+            finished, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    result = future.result()
+                except RapidAPIKeyError as error:
+                    key_error = error
+                    self._key_failed(attempts[future], error)
+                    continue
+                except RapidAPIError as error:
+                    last_error = error
+                    continue
+                if future is not primary:
+                    with self._lock:
+                        self.hedges_won += 1
+                return result
+        error = last_error or key_error
+        if error is None:
+            raise RapidAPIError("RapidAPI 详情请求没有返回结果")
+        raise error
@@ -0,0 +1,286 @@
+"""Strip WeChat editor noise from archived article bodies."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from bs4 import BeautifulSoup, Tag
+from bs4.element import Stylesheet
+
+from .search_index import SearchIndex, corpus_documents, synchronize_corpus
+from .sidecars import write_sidecar
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CONTENT_DIR = PROJECT_ROOT / "src" / "content" / "articles"
+BODY_START = '<div class="wechat-article">\n'
+BODY_END = "\n</div>\n"
+# Attributes only the WeChat editor and its tracking scripts ever read.
+EDITOR_ATTRIBUTES = {
+    "backgroundcolor",
+    "class",
+    "leaf",
+    "listlevel",
+    "mp-original-font-size",
+    "mp-original-line-height",
+    "nodeleaf",
+    "textalign",
+    "textstyle",
+}
+UNWRAPPABLE_TAGS = {"span", "font"}
+REMOVABLE_EMPTY_TAGS = {"span", "font", "section", "p", "strong", "b", "em", "i", "u"}
+HOIST_MIN_USES = 2
+CLASS_PREFIX = "wx-"
+# Unquoted `font-family` values in WeChat styles leak out as junk attribute names.
+ATTRIBUTE_NAME_RE = re.compile(r"[a-z_:][a-z0-9_:.-]*")
+HOISTED_RULE_RE = re.compile(r"\.wechat-article \.(wx-[0-9a-f]{6})\{([^}]*)\}")
+
+
+@dataclass(frozen=True)
+class CompactionStats:
+    bytes_before: int
+    bytes_after: int
+    hoisted_classes: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def _declarations(style: str) -> list[str]:
+    """Split a style attribute on semicolons outside quotes and parentheses."""
+    declarations: list[str] = []
+    current: list[str] = []
+    depth = 0
+    quote = ""
+    for character in style:
+        if quote:
+            if character == quote:
+                quote = ""
+        elif character in "'\"":
+            quote = character
+        elif character == "(":
+            depth += 1
+        elif character == ")":
+            depth = max(0, depth - 1)
+        elif character == ";" and depth == 0:
+            declarations.append("".join(current))
+            current = []
+            continue
+        current.append(character)
+    declarations.append("".join(current))
+
+    normalized: list[str] = []
+    for declaration in declarations:
+        name, separator, value = declaration.partition(":")
+        name = name.strip().lower()
+        value = value.strip()
+        # Word paste leftovers (mso-*) have no effect outside Microsoft Office.
+        if not separator or not name or not value or name.startswith("mso-"):
+            continue
+        normalized.append(f"{name}:{value}")
+    return normalized
+
+
+def _html_nodes(content: Tag) -> list[Tag]:
+    """Elements outside inline SVG, whose attributes and empty shapes matter."""
+    svg_descendants = {
+        id(node) for svg in content.find_all("svg") for node in svg.find_all(True)
+    }
+    return [node for node in content.find_all(True) if id(node) not in svg_descendants]
+
+
+def _expand_hoisted_styles(content: Tag) -> None:
+    """Turn classes from an earlier compaction back into inline styles."""
+    rules: dict[str, str] = {}
+    for style_node in content.find_all("style"):
+        css = style_node.get_text()
+        matches = HOISTED_RULE_RE.findall(css)
+        if not matches or HOISTED_RULE_RE.sub("", css).strip():
+            continue
+        for class_name, body in matches:
+            rules[class_name] = ";".join(
+                declaration.removesuffix("!important")
+                for declaration in _declarations(body)
+            )
+        style_node.decompose()
+    if not rules:
+        return
+    for node in content.find_all(class_=True):
+        classes = node.get("class") or []
+        hoisted = [name for name in classes if name in rules]
+        if not hoisted:
+            continue
+        node["style"] = ";".join(rules[name] for name in hoisted)
+        remaining = [name for name in classes if name not in rules]
+        if remaining:
+            node["class"] = remaining
+        else:
+            del node.attrs["class"]
+
+
+def _hoisted_css(styles: dict[str, str]) -> str:
+    rules = []
+    for style, class_name in sorted(styles.items(), key=lambda item: item[1]):
+        # Inline styles used to outrank the site's plain rules; keep that order.
+        body = ";".join(f"{declaration}!important" for declaration in _declarations(style))
+        rules.append(f".wechat-article .{class_name}{{{body}}}")
+    return "".join(rules)
+
+
+def _hoisting_saves_bytes(style: str, count: int) -> bool:
+    inline = count * len(f' style="{style}"')
+    classes = count * len(f' class="{CLASS_PREFIX}000000"')
+    rule = len(_hoisted_css({style: CLASS_PREFIX + "000000"}))
+    return classes + rule < inline
+
+
+def compact(content: Tag) -> CompactionStats:
+    """Compact a sanitized, localized article body in place."""
+    bytes_before = len(content.decode_contents().encode("utf-8"))
+    _expand_hoisted_styles(content)
+
+    nodes = _html_nodes(content)
+    for node in nodes:
+        for attribute in list(node.attrs):
+            name = attribute.lower()
+            if (
+                name.startswith("data-")
+                or name in EDITOR_ATTRIBUTES
+                or (node.name == "img" and name == "type")
+                or not ATTRIBUTE_NAME_RE.fullmatch(name)
+            ):
+                del node.attrs[attribute]
+        if "style" in node.attrs:
+            style = ";".join(_declarations(str(node["style"])))
+            if style:
+                node["style"] = style
+            else:
+                del node.attrs["style"]
+
+    # Leaves come last in document order, so reversing empties nested wrappers first.
+    for node in reversed(nodes):
+        if node.attrs or node.name not in REMOVABLE_EMPTY_TAGS:
+            continue
+        if node.find(True) is None and node.get_text() == "":
+            node.decompose()
+        elif node.name in UNWRAPPABLE_TAGS:
+            node.unwrap()
+
+    # Removed and unwrapped nodes are detached from the tree.
+    styled = [node for node in nodes if node.parent is not None and "style" in node.attrs]
+    uses = Counter(str(node["style"]) for node in styled)
+    hoisted = {
+        style: CLASS_PREFIX + hashlib.sha1(style.encode("utf-8")).hexdigest()[:6]
+        for style, count in uses.items()
+        if count >= HOIST_MIN_USES
+        and "!important" not in style
+        and "<" not in style
+        and _hoisting_saves_bytes(style, count)
+    }
+    if hoisted:
+        for node in styled:
+            class_name = hoisted.get(str(node["style"]))
+            if class_name is None:
+                continue
+            del node.attrs["style"]
+            node["class"] = class_name
+        # Appended last so `.wechat-article > :first-child` still hits real content.
+        style_node = Tag(name="style")
+        style_node.append(Stylesheet(_hoisted_css(hoisted)))
+        content.append(style_node)
+
+    bytes_after = len(content.decode_contents().encode("utf-8"))
+    return CompactionStats(bytes_before, bytes_after, len(hoisted))
+
+
+def compact_markdown(markdown: str) -> tuple[str, CompactionStats]:
+    """Compact the `wechat-article` body of one archived Markdown file."""
+    start = markdown.find(BODY_START)
+    end = markdown.rfind(BODY_END)
+    if start < 0 or end < start:
+        raise ValueError("缺少 wechat-article 正文容器")
+    body_start = start + len(BODY_START)
+    body = markdown[body_start:end]
+    soup = BeautifulSoup(f"<div>{body}</div>", "html.parser")
+    content = soup.div
+    stats = compact(content)
+    compacted = content.decode_contents().strip()
+    return markdown[:body_start] + compacted + markdown[end:], stats
+
+
+def recompact(
+    content_dir: Path = DEFAULT_CONTENT_DIR,
+    *,
+    dry_run: bool = False,
+) -> tuple[int, int, int]:
+    """Re-compact every archived article; return files changed, bytes before and after."""
+    changed = bytes_before = bytes_after = 0
+    for markdown_path in sorted(content_dir.glob("*.md")):
+        markdown = markdown_path.read_text(encoding="utf-8")
+        try:
+            compacted, _ = compact_markdown(markdown)
+        except ValueError as error:
+            print(f"- {markdown_path.name}: {error}", file=sys.stderr)
+            continue
+        before = len(markdown.encode("utf-8"))
+        after = len(compacted.encode("utf-8"))
+        bytes_before += before
+        bytes_after += after
+        if compacted == markdown:
+            continue
+        changed += 1
+        print(f"- {markdown_path.name}: {before / 1024:.1f} KiB → {after / 1024:.1f} KiB")
+        if dry_run:
+            continue
+        temporary_path = markdown_path.with_suffix(".md.tmp")
+        temporary_path.write_text(compacted, encoding="utf-8")
+        temporary_path.replace(markdown_path)
+        write_sidecar(markdown_path, compacted)
+    return changed, bytes_before, bytes_after
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="压缩已归档公众号文章正文中的冗余标记")
+    parser.add_argument("--content-dir", type=Path, default=DEFAULT_CONTENT_DIR)
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="只统计可节省的字节数，不写入文件",
+    )
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    try:
+        changed, bytes_before, bytes_after = recompact(
+            args.content_dir,
+            dry_run=args.dry_run,
+        )
+        if changed and not args.dry_run:
+            # Unwrapped spans can shift word boundaries in the extracted text.
+            index = SearchIndex(autoflush=False)
+            synchronize_corpus(index, corpus_documents())
+            index.flush()
+    except OSError as error:
+        print(f"正文压缩失败: {error}", file=sys.stderr)
+        return 1
+    saved = bytes_before - bytes_after
+    ratio = saved / bytes_before * 100 if bytes_before else 0.0
+    print(
+        f"{'可压缩' if args.dry_run else '已压缩'} {changed} 篇文章："
+        f"{bytes_before / 1024 / 1024:.1f} MiB → {bytes_after / 1024 / 1024:.1f} MiB，"
+        f"节省 {saved / 1024:.0f} KiB（{ratio:.1f}%）"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
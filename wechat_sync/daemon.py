@@ -0,0 +1,311 @@
+"""Keep syncing on a long-lived host, polling around each account's publish window."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import statistics
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from types import FrameType
+from typing import Any, Optional
+
+from .client import RapidAPIClient, RapidAPIError, load_api_key_pool
+from .downloader import WeChatArticleDownloader
+from .hedging import (
+    LatencyHistory,
+    add_hedge_arguments,
+    hedge_argument_error,
+    hedge_policy_from_args,
+)
+from .index_store import IndexStore
+from .locking import LockBusyError, RunLock
+from .pacing import add_rate_arguments, rate_argument_error, rate_limiter_from_args
+from .search_index import SearchIndex
+from .sync import (
+    INDEX_ROOT,
+    MAX_LIST_PAGES_PER_ACCOUNT,
+    PROJECT_ROOT,
+    SHANGHAI,
+    AccountConfig,
+    RequestBudget,
+    _load_accounts,
+    _timestamp,
+    synchronize,
+)
+
+
+DEFAULT_STATE_PATH = PROJECT_ROOT / "data" / "wechat" / "daemon-state.json"
+RECENT_ARTICLES = 60
+# A publish minute counts toward the window if it falls this far around now.
+WINDOW_LEAD = timedelta(minutes=30)
+WINDOW_LAG = timedelta(hours=2)
+MIN_WINDOW_HITS = 3
+# One list page plus one article detail is the cheapest useful cycle.
+MIN_CYCLE_REQUESTS = 2
+
+
+@dataclass(frozen=True)
+class PublishPattern:
+    minutes_of_day: tuple[int, ...]
+    articles_per_day: int
+    published_today: int
+
+    def in_window(self, now: datetime) -> bool:
+        current = now.hour * 60 + now.minute
+        lead = int(WINDOW_LEAD.total_seconds() // 60)
+        lag = int(WINDOW_LAG.total_seconds() // 60)
+        hits = sum(
+            1
+            for minute in self.minutes_of_day
+            # Modular distance so windows that cross midnight still match.
+            if (current - minute) % 1440 <= lag or (minute - current) % 1440 <= lead
+        )
+        return hits >= MIN_WINDOW_HITS
+
+    @property
+    def done_for_today(self) -> bool:
+        return self.published_today >= self.articles_per_day
+
+
+def publish_pattern(account: AccountConfig, today: date) -> PublishPattern:
+    """Learn when an account usually publishes from its archived articles."""
+    store = IndexStore(INDEX_ROOT / f"{account.slug}.json")
+    index = store.load(lazy=True)
+    # Newest month shards only, until they cover the articles the pattern uses.
+    for month in store.months:
+        if len(index["articles"]) >= RECENT_ARTICLES:
+            break
+        store.load_months(index, [month])
+    published = sorted(
+        (
+            _timestamp(entry["publishedAt"])
+            for entry in index.get("articles", [])
+            if isinstance(entry, dict) and entry.get("publishedAt")
+        ),
+        reverse=True,
+    )[:RECENT_ARTICLES]
+    per_day = Counter(value.date() for value in published if value.date() != today)
+    return PublishPattern(
+        minutes_of_day=tuple(value.hour * 60 + value.minute for value in published),
+        articles_per_day=max(1, round(statistics.median(per_day.values()))) if per_day else 1,
+        published_today=sum(1 for value in published if value.date() == today),
+    )
+
+
+class DaemonState:
+    """Daily request usage and last poll times, kept across restarts."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        payload: dict[str, Any] = {}
+        if path.exists():
+            try:
+                payload = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                payload = {}
+        self.day = str(payload.get("date") or "")
+        self.requests = int(payload.get("requests") or 0)
+        self.last_polled: dict[str, str] = dict(payload.get("lastPolledAt") or {})
+
+    def roll_over(self, today: date) -> None:
+        if self.day != today.isoformat():
+            self.day = today.isoformat()
+            self.requests = 0
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        temporary_path.write_text(
+            json.dumps(
+                {
+                    "date": self.day,
+                    "requests": self.requests,
+                    "lastPolledAt": self.last_polled,
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        temporary_path.replace(self.path)
+
+
+class SyncDaemon:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self._args = args
+        self._accounts = _load_accounts(set(args.account))
+        self._state = DaemonState(args.state)
+        self._lock = RunLock(args.lock)
+        self._stop = threading.Event()
+        # Warm for the whole process: HTTP keep-alive and key rotation. The
+        # limiter stays warm too, so a 429 tightens pacing for later cycles.
+        self._rate_limiter = rate_limiter_from_args(args)
+        self._client = RapidAPIClient(
+            load_api_key_pool(),
+            rate_limiter=self._rate_limiter,
+            latency_history=LatencyHistory(),
+            hedge_policy=hedge_policy_from_args(args),
+        )
+        print(
+            f"守护进程已启动：{len(self._accounts)} 个公众号，"
+            f"{self._client.key_count} 个 RapidAPI Key，每日请求预算 {args.daily_budget} 次"
+        )
+
+    def request_stop(self, signum: int, frame: Optional[FrameType]) -> None:
+        if self._stop.is_set():
+            raise KeyboardInterrupt
+        print(f"收到信号 {signal.Signals(signum).name}，完成当前文章后退出", file=sys.stderr)
+        self._stop.set()
+
+    def _interval(self, account: AccountConfig, now: datetime) -> timedelta:
+        pattern = publish_pattern(account, now.date())
+        if pattern.in_window(now) and not pattern.done_for_today:
+            return timedelta(minutes=self._args.active_interval)
+        return timedelta(minutes=self._args.idle_interval)
+
+    def _next_poll(self, account: AccountConfig, now: datetime) -> datetime:
+        last = self._state.last_polled.get(account.slug)
+        if not last:
+            return now
+        return _timestamp(last) + self._interval(account, now)
+
+    def _poll(self, account: AccountConfig, now: datetime) -> None:
+        remaining = self._args.daily_budget - self._state.requests
+        if remaining < MIN_CYCLE_REQUESTS:
+            return
+        try:
+            self._lock.acquire()
+        except LockBusyError as error:
+            print(f"[{account.name}] 跳过本轮: {error}", file=sys.stderr)
+            return
+        budget = RequestBudget(self._client, remaining)
+        # A fresh search index each cycle: imports, compaction or rerenders may
+        # have written it since the last one.
+        downloader = WeChatArticleDownloader(
+            search_index=SearchIndex(),
+            rate_limiter=self._rate_limiter,
+        )
+        try:
+            synchronize(
+                # Leave at least one request of the budget for an article detail.
+                max_pages=min(self._args.max_pages, remaining - 1),
+                selected_slugs={account.slug},
+                history_v2=False,
+                metrics_path=self._args.metrics_textfile,
+                client=self._client,
+                downloader=downloader,
+                stop_requested=self._stop.is_set,
+                request_budget=budget,
+            )
+        except (OSError, ValueError, RapidAPIError) as error:
+            print(f"[{account.name}] 本轮同步失败: {error}", file=sys.stderr)
+        finally:
+            self._lock.release()
+            self._state.requests += budget.used
+            self._state.last_polled[account.slug] = now.isoformat()
+            self._state.save()
+
+    def run(self) -> int:
+        while not self._stop.is_set():
+            now = datetime.now(tz=SHANGHAI)
+            self._state.roll_over(now.date())
+            for account in self._accounts:
+                if self._stop.is_set():
+                    break
+                if self._next_poll(account, now) <= now:
+                    self._poll(account, now)
+
+            if self._args.once:
+                break
+            now = datetime.now(tz=SHANGHAI)
+            if self._state.requests + MIN_CYCLE_REQUESTS > self._args.daily_budget:
+                tomorrow = datetime.combine(
+                    now.date() + timedelta(days=1),
+                    datetime.min.time(),
+                    tzinfo=SHANGHAI,
+                )
+                wake_at = tomorrow
+                print(f"今日请求预算已用 {self._state.requests} 次，暂停到 {tomorrow:%Y-%m-%d %H:%M}")
+            else:
+                wake_at = min(self._next_poll(account, now) for account in self._accounts)
+            self._stop.wait(max(1.0, (wake_at - now).total_seconds()))
+
+        self._state.save()
+        print("守护进程已退出，索引和 pending 队列已保存")
+        return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="在自有主机上常驻运行公众号增量同步")
+    parser.add_argument(
+        "--account",
+        action="append",
+        default=[],
+        help="只同步指定账号 slug；可重复使用，默认全部账号",
+    )
+    parser.add_argument(
+        "--active-interval",
+        type=float,
+        default=10,
+        help="处于该账号常见发文时段时的轮询间隔分钟数（默认 10）",
+    )
+    parser.add_argument(
+        "--idle-interval",
+        type=float,
+        default=180,
+        help="其他时段或当天文章已齐时的轮询间隔分钟数（默认 180）",
+    )
+    parser.add_argument(
+        "--daily-budget",
+        type=int,
+        default=30,
+        help="每个自然日（北京时间）最多发出的 RapidAPI 请求数（默认 30）",
+    )
+    parser.add_argument("--max-pages", type=int, default=1, help="每轮读取的列表页数")
+    parser.add_argument("--state", type=Path, default=DEFAULT_STATE_PATH)
+    parser.add_argument("--lock", type=Path, default=RunLock().path)
+    parser.add_argument(
+        "--metrics-textfile",
+        type=Path,
+        help="每轮结束时写入 Prometheus textfile 指标",
+    )
+    parser.add_argument("--once", action="store_true", help="只检查一轮到期账号后退出")
+    add_rate_arguments(parser)
+    add_hedge_arguments(parser)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    if not 1 <= args.max_pages <= MAX_LIST_PAGES_PER_ACCOUNT:
+        print(f"--max-pages 必须在 1 到 {MAX_LIST_PAGES_PER_ACCOUNT} 之间", file=sys.stderr)
+        return 2
+    if args.active_interval <= 0 or args.idle_interval < args.active_interval:
+        print("--active-interval 必须大于 0，且不能大于 --idle-interval", file=sys.stderr)
+        return 2
+    if args.daily_budget < MIN_CYCLE_REQUESTS:
+        print(f"--daily-budget 至少为 {MIN_CYCLE_REQUESTS}", file=sys.stderr)
+        return 2
+    argument_error = rate_argument_error(args) or hedge_argument_error(args)
+    if argument_error is not None:
+        print(argument_error, file=sys.stderr)
+        return 2
+    try:
+        daemon = SyncDaemon(args)
+    except (OSError, ValueError, RapidAPIError) as error:
+        print(f"守护进程启动失败: {error}", file=sys.stderr)
+        return 1
+    signal.signal(signal.SIGTERM, daemon.request_stop)
+    signal.signal(signal.SIGINT, daemon.request_stop)
+    return daemon.run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
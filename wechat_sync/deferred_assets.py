@@ -0,0 +1,160 @@
+"""Localize the images of articles that were published with deferred assets."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Any
+
+import requests
+
+from .downloader import (
+    ArticleDownloadError,
+    AssetRequest,
+    WeChatArticleDownloader,
+    _safe_article_id,
+)
+from .image_meta import placeholders_available
+from .index_store import IndexStore
+from .locking import LockBusyError, RunLock, lock_wait_summary
+from .pacing import add_rate_arguments, rate_argument_error, rate_limiter_from_args
+from .partial_assets import pending_asset_path
+from .profiling import add_profile_arguments, run_profiled
+from .sync import INDEX_ROOT, PROJECT_ROOT, AccountConfig, _load_accounts
+
+
+def pending_requests(entry: dict[str, Any]) -> list[AssetRequest]:
+    """The assets an index entry still waits for; malformed items are skipped."""
+    items = entry.get("pendingAssets")
+    if not isinstance(items, list):
+        return []
+    return [
+        AssetRequest(url=str(item["url"]), stem=str(item["stem"]), media=bool(item.get("media")))
+        for item in items
+        if isinstance(item, dict) and item.get("url") and item.get("stem")
+    ]
+
+
+def _localize_account(
+    account: AccountConfig,
+    downloader: WeChatArticleDownloader,
+) -> tuple[int, int, int]:
+    """Localize one account's pending assets; return articles done, assets fetched, failures."""
+    index_path = INDEX_ROOT / f"{account.slug}.json"
+    store = IndexStore(index_path)
+    index = store.load()
+    entries = index.get("articles")
+    if not isinstance(entries, list):
+        return 0, 0, 0
+    completed = fetched = failed = 0
+    for entry in list(entries):
+        if not isinstance(entry, dict):
+            continue
+        pending = pending_requests(entry)
+        if not pending:
+            continue
+        title = str(entry.get("title") or entry.get("articleId"))
+        source_url = str(entry.get("sourceUrl") or "")
+        try:
+            local_paths = downloader.localize_pending(
+                _safe_article_id(str(entry.get("articleId") or ""), source_url),
+                pending,
+                source_url,
+                PROJECT_ROOT / str(entry["markdownPath"]),
+            )
+        except (ArticleDownloadError, requests.RequestException, OSError) as error:
+            failed += 1
+            print(f"  失败 {title}: {error}", file=sys.stderr)
+            continue
+        replacements = {pending_asset_path(stem): path for stem, path in local_paths.items()}
+        article_id = entry.get("articleId")
+
+        def settle(fresh: dict[str, Any]) -> dict[str, Any]:
+            for candidate in fresh.get("articles") or []:
+                if isinstance(candidate, dict) and candidate.get("articleId") == article_id:
+                    cover = str(candidate.get("cover") or "")
+                    candidate["cover"] = replacements.get(cover, candidate.get("cover", ""))
+                    candidate.pop("pendingAssets", None)
+            return fresh
+
+        # Committed per article so an interrupted pass keeps what it finished.
+        index = store.commit(settle(index), settle)
+        completed += 1
+        fetched += len(pending)
+        print(f"[{account.name}] 已补齐 {title} 的 {len(pending)} 个资源")
+    return completed, fetched, failed
+
+
+def localize(
+    accounts: list[AccountConfig],
+    downloader: WeChatArticleDownloader,
+) -> tuple[int, int, int]:
+    completed = fetched = failed = 0
+    for account in accounts:
+        account_completed, account_fetched, account_failed = _localize_account(account, downloader)
+        completed += account_completed
+        fetched += account_fetched
+        failed += account_failed
+    return completed, fetched, failed
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="下载延后发布文章的图片并替换占位图")
+    parser.add_argument(
+        "--account",
+        action="append",
+        default=[],
+        help="只处理指定账号 slug；可重复使用，默认全部账号",
+    )
+    parser.add_argument(
+        "--image-placeholders",
+        action="store_true",
+        help="为补齐的图片写入模糊低清占位图（需要安装 Pillow）",
+    )
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    return run_profiled(args, lambda: _run(args))
+
+
+def _run(args: argparse.Namespace) -> int:
+    argument_error = rate_argument_error(args)
+    if argument_error is not None:
+        print(argument_error, file=sys.stderr)
+        return 2
+    if args.image_placeholders and not placeholders_available():
+        print("--image-placeholders 需要 Pillow：pip install Pillow", file=sys.stderr)
+        return 2
+    # Index entries are rewritten here, so this must not overlap a sync run.
+    run_lock = RunLock()
+    try:
+        run_lock.acquire()
+    except LockBusyError as error:
+        print(f"资源补齐未启动: {error}", file=sys.stderr)
+        return 1
+    try:
+        completed, fetched, failed = localize(
+            _load_accounts(set(args.account)),
+            WeChatArticleDownloader(
+                rate_limiter=rate_limiter_from_args(args),
+                image_placeholders=args.image_placeholders,
+            ),
+        )
+    except (OSError, ValueError) as error:
+        print(f"资源补齐失败: {error}", file=sys.stderr)
+        return 1
+    finally:
+        run_lock.release()
+    lock_waits = lock_wait_summary()
+    if lock_waits is not None:
+        print(lock_waits)
+    print(f"资源补齐完成：{completed} 篇文章，下载 {fetched} 个资源，失败 {failed} 篇")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
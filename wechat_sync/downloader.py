@@ -7,11 +7,12 @@ import json
 import mimetypes
 import re
 import shutil
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
-from urllib.parse import parse_qs, urljoin, urlparse
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs, parse_qsl, quote, urlencode, urljoin, urlparse, urlsplit
 from zoneinfo import ZoneInfo
 
 import requests
@@ -19,11 +20,37 @@ from bs4 import BeautifulSoup, Tag
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from .compaction import compact
+from .image_meta import apply_dimensions, size_images
+from .pacing import RateLimiter
+from .partial_assets import (
+    PART_SUFFIX,
+    PARTIAL_ASSET_ROOT,
+    PENDING_ASSET,
+    PartialAssets,
+    file_sha256,
+    pending_asset_path,
+)
+from .raw_archive import RAW_ARCHIVE_ROOT, raw_path, read_raw, write_raw
+from .search_index import SearchIndex
+from .sidecars import SIDECAR_ROOT, write_sidecar
+from .tracing import span
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_CONTENT_DIR = PROJECT_ROOT / "src" / "content" / "articles"
 DEFAULT_ASSET_ROOT = PROJECT_ROOT / "public" / "article-assets"
 MAX_ASSET_BYTES = 25 * 1024 * 1024
+# Audio and video are streamed to disk, so their cap is independent of MAX_ASSET_BYTES.
+MAX_MEDIA_BYTES = 512 * 1024 * 1024
+MEDIA_CHUNK_BYTES = 1024 * 1024
+# Media downloads that run alongside image localization in the in-process path.
+MEDIA_THREADS = 2
+MEDIA_TAGS = ["mpvoice", "mp-common-mpaudio", "mpvideo", "iframe", "audio", "video"]
+WECHAT_VOICE_URL = "https://res.wx.qq.com/voice/getvoice?mediaid="
+WECHAT_VIDEO_URL = "https://mp.weixin.qq.com/mp/videoplayer?action=get_mp_video_play_url"
+# Concurrent asset downloads per article when HTML work runs in a process pool.
+ASSET_THREADS = 4
 CSS_URL_RE = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)", re.IGNORECASE)
 PUBLISHED_AT_RE = re.compile(
     r"(?:var\s+(?:ct|create_time)\s*=|[\"'](?:ct|create_time)[\"']\s*:)"
@@ -31,12 +58,19 @@ PUBLISHED_AT_RE = re.compile(
     re.IGNORECASE,
 )
 SHANGHAI = ZoneInfo("Asia/Shanghai")
+WECHAT_CDN_SUFFIXES = (".qpic.cn", ".qlogo.cn")
+# Query parameters WeChat uses for format and referral hints on the same image.
+WECHAT_CDN_VARIANT_PARAMS = {"wx_fmt", "tp", "wxfrom", "from", "wx_lazy", "wx_co"}
 
 
 class ArticleDownloadError(RuntimeError):
     """The article or one of its required assets could not be downloaded."""
 
 
+class DuplicateArticleError(ArticleDownloadError):
+    """Another download already claimed the article this URL resolves to."""
+
+
 @dataclass(frozen=True)
 class ArticleSummary:
     article_id: str
@@ -46,6 +80,13 @@ class ArticleSummary:
     published_at: datetime
 
 
+@dataclass(frozen=True)
+class AssetRequest:
+    url: str
+    stem: str
+    media: bool = False
+
+
 @dataclass(frozen=True)
 class DownloadedArticle:
     article_id: str
@@ -57,12 +98,35 @@ class DownloadedArticle:
     body_html: str
     markdown_path: Path
     asset_count: int
+    bytes_saved: int = 0
+    pending_assets: tuple[AssetRequest, ...] = ()
+
+
+@dataclass(frozen=True)
+class AssetPlan:
+    assets: tuple[AssetRequest, ...]
+    cover_url: str
 
 
 def _canonical_url(url: str) -> str:
     return url.split("#", 1)[0].strip()
 
 
+def _asset_key(url: str) -> str:
+    """Identity of an asset URL; WeChat CDN variants of one image share a key."""
+    canonical = _canonical_url(url)
+    parsed = urlsplit(canonical)
+    host = parsed.hostname or ""
+    if not host.endswith(WECHAT_CDN_SUFFIXES):
+        return canonical
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name not in WECHAT_CDN_VARIANT_PARAMS
+    )
+    return parsed._replace(scheme="https", query=urlencode(query), fragment="").geturl()
+
+
 def _safe_article_id(article_id: str, url: str) -> str:
     safe_id = re.sub(r"[^A-Za-z0-9_-]", "", article_id).strip("-")
     if safe_id:
@@ -98,6 +162,73 @@ def _extension_for(response: requests.Response, url: str) -> str:
     return guessed or ".bin"
 
 
+def _media_request(node: Tag, article_url: str, stem_index: int) -> Optional[AssetRequest]:
+    """The audio or video behind a WeChat voice/video element or a plain <audio>/<video>."""
+    if node.name in {"mpvoice", "mp-common-mpaudio"}:
+        file_id = str(node.get("voice_encode_fileid") or "").strip()
+        if not file_id:
+            return None
+        return AssetRequest(
+            WECHAT_VOICE_URL + quote(file_id, safe=""),
+            f"audio-{stem_index:03d}",
+            media=True,
+        )
+    if node.name in {"audio", "video"}:
+        source = node if node.get("src") else node.find("source", src=True)
+        src = str(source.get("src") or "").strip() if source is not None else ""
+        if not src.startswith(("http://", "https://", "//")):
+            return None
+        return AssetRequest(
+            _absolute_url(src, article_url),
+            f"{node.name}-{stem_index:03d}",
+            media=True,
+        )
+    # WeChat-hosted video: <mpvideo> or the video_iframe player, both keyed by a wxv_ id.
+    src = str(node.get("data-src") or node.get("src") or "")
+    params = {**parse_qs(urlparse(article_url).query), **parse_qs(urlparse(src).query)}
+    vid = str(node.get("data-mpvid") or node.get("vid") or (params.get("vid") or [""])[0])
+    if not vid.startswith("wxv_"):
+        return None
+    query = {"vid": vid, "preview": "0"}
+    for name in ("__biz", "mid", "idx"):
+        if params.get(name):
+            query[name] = params[name][0]
+    return AssetRequest(
+        f"{WECHAT_VIDEO_URL}&{urlencode(sorted(query.items()))}",
+        f"video-{stem_index:03d}",
+        media=True,
+    )
+
+
+def _media_extension(response: requests.Response, url: str, stem: str) -> str:
+    content_type = response.headers.get("Content-Type", "").split(";", 1)[0].lower()
+    known_types = {
+        "audio/aac": ".aac",
+        "audio/mp4": ".m4a",
+        "audio/mpeg": ".mp3",
+        "audio/ogg": ".ogg",
+        "video/mp4": ".mp4",
+        "video/quicktime": ".mov",
+        "video/webm": ".webm",
+    }
+    if content_type in known_types:
+        return known_types[content_type]
+    suffix = Path(urlparse(url).path).suffix.lower()
+    if suffix in set(known_types.values()):
+        return suffix
+    return ".mp3" if stem.startswith("audio") else ".mp4"
+
+
+def _media_total(response: requests.Response, offset: int) -> int:
+    """Full size of a (possibly ranged) response, or 0 when the server does not say."""
+    content_range = response.headers.get("Content-Range", "")
+    if response.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else 0
+    length = int(response.headers.get("Content-Length", "0") or 0)
+    return offset + length if length else 0
+
+
 def _yaml_string(value: str) -> str:
     return json.dumps(value, ensure_ascii=False)
 
@@ -108,10 +239,33 @@ class WeChatArticleDownloader:
         content_dir: Path = DEFAULT_CONTENT_DIR,
         asset_root: Path = DEFAULT_ASSET_ROOT,
         timeout_seconds: int = 45,
+        rate_limiter: Optional[RateLimiter] = None,
+        search_index: Optional[SearchIndex] = None,
+        sidecar_root: Optional[Path] = SIDECAR_ROOT,
+        raw_root: Optional[Path] = RAW_ARCHIVE_ROOT,
+        html_pool: Optional[HtmlProcessPool] = None,
+        image_placeholders: bool = False,
+        partial_root: Path = PARTIAL_ASSET_ROOT,
+        defer_assets: bool = False,
     ) -> None:
         self._content_dir = content_dir
         self._asset_root = asset_root
         self._timeout_seconds = timeout_seconds
+        # Shared across threads and with the RapidAPI client to pace every host.
+        self._rate_limiter = rate_limiter
+        self._search_index = search_index
+        self._sidecar_root = sidecar_root
+        # Source payloads kept so `rerender` can rebuild articles offline.
+        self._raw_root = raw_root
+        # Parsing and rendering move to worker processes when a pool is given.
+        self._html_pool = html_pool
+        self._image_placeholders = image_placeholders
+        # Staging directories outlive failed attempts so retries fetch only what is missing.
+        self._partial_root = partial_root
+        self._partials: dict[Path, PartialAssets] = {}
+        # Publish text first and leave images to `localize_pending`.
+        self._defer_assets = defer_assets
+        self._deferred: dict[Path, list[AssetRequest]] = {}
         self._session = requests.Session()
         retry = Retry(
             total=3,
@@ -151,19 +305,14 @@ class WeChatArticleDownloader:
             )
 
         html = str(detail.get("html") or "").strip()
-        soup = BeautifulSoup(html, "html.parser")
-        content = soup.select_one("#js_content, .rich_media_content") or soup.body
-        if content is None:
-            raise ArticleDownloadError("RapidAPI 文章详情不包含可归档的正文节点")
-
-        return self._archive_content(
-            summary=summary,
-            source_name=source_name,
-            content=content,
-            title=str(detail.get("title") or summary.title).strip(),
-            description=str(detail.get("description") or "").strip(),
-            cover_url=str(detail.get("coverUrl") or summary.cover_url).strip(),
-        )
+        with span(
+            "downloader.detail",
+            article=summary.article_id,
+            bytes=len(html),
+        ) as detail_span:
+            downloaded = self._archive_content(summary, source_name, "detail", detail)
+            detail_span.set(assets=downloaded.asset_count)
+        return downloaded
 
     def download_url(
         self,
@@ -171,8 +320,13 @@ class WeChatArticleDownloader:
         source_name: str,
         *,
         verify_source: bool = True,
+        claim: Optional[Callable[[str], bool]] = None,
     ) -> DownloadedArticle:
-        """Inspect and download a known public WeChat article URL in one request."""
+        """Inspect and download a known public WeChat article URL in one request.
+
+        `claim` receives the resolved article ID before anything is written;
+        when it returns False the download stops with DuplicateArticleError.
+        """
         response = self._get(url, referer="https://mp.weixin.qq.com/")
         response.encoding = response.apparent_encoding or "utf-8"
         soup = BeautifulSoup(response.text, "html.parser")
@@ -194,6 +348,8 @@ class WeChatArticleDownloader:
         canonical_url = self._metadata(soup, "og:url") or response.url or url
         canonical_url = _canonical_url(canonical_url)
         article_id = self._article_id(canonical_url)
+        if claim is not None and not claim(article_id):
+            raise DuplicateArticleError(f"文章 {article_id} 已入库或正在导入")
         summary = ArticleSummary(
             article_id=article_id,
             title=title,
@@ -203,111 +359,409 @@ class WeChatArticleDownloader:
         )
         return self._download_response(summary, source_name, response)
 
-    def _download_response(
+    def rerender(self, record: dict[str, Any]) -> tuple[DownloadedArticle, str]:
+        """Rebuild one article from its raw archive, using only assets already on disk."""
+        summary = ArticleSummary(
+            article_id=str(record.get("articleId") or ""),
+            title=str(record.get("title") or ""),
+            url=str(record.get("url") or ""),
+            cover_url=str(record.get("coverUrl") or ""),
+            published_at=datetime.fromisoformat(str(record.get("publishedAt"))),
+        )
+        payload = record.get("payload")
+        if not isinstance(payload, dict):
+            raise ArticleDownloadError("原始归档缺少 payload")
+        content, title, description, cover_url = self._source_content(
+            summary,
+            str(record.get("origin") or ""),
+            payload,
+        )
+        article_key = _safe_article_id(summary.article_id, summary.url)
+        downloaded, markdown, _ = self._render_content(
+            summary=summary,
+            source_name=str(record.get("sourceName") or ""),
+            content=content,
+            title=title,
+            description=description,
+            cover_url=cover_url,
+            article_key=article_key,
+            asset_dir=self._asset_root / article_key,
+            archived=record,
+        )
+        return downloaded, markdown
+
+    def _source_content(
         self,
         summary: ArticleSummary,
-        source_name: str,
-        response: requests.Response,
-    ) -> DownloadedArticle:
-        response.encoding = response.apparent_encoding or "utf-8"
-        soup = BeautifulSoup(response.text, "html.parser")
+        origin: str,
+        payload: dict[str, Any],
+    ) -> tuple[Tag, str, str, str]:
+        """Parse an archived payload into its body node, title, description and cover."""
+        if origin == "detail":
+            return self._detail_content(summary, payload)
+        return self._page_content(summary, str(payload.get("html") or ""))
+
+    @staticmethod
+    def _detail_content(
+        summary: ArticleSummary,
+        detail: dict[str, Any],
+    ) -> tuple[Tag, str, str, str]:
+        soup = BeautifulSoup(str(detail.get("html") or "").strip(), "html.parser")
+        content = soup.select_one("#js_content, .rich_media_content") or soup.body
+        if content is None:
+            raise ArticleDownloadError("RapidAPI 文章详情不包含可归档的正文节点")
+        return (
+            content,
+            str(detail.get("title") or summary.title).strip(),
+            str(detail.get("description") or "").strip(),
+            str(detail.get("coverUrl") or summary.cover_url).strip(),
+        )
+
+    def _page_content(self, summary: ArticleSummary, html: str) -> tuple[Tag, str, str, str]:
+        soup = BeautifulSoup(html, "html.parser")
         content = soup.select_one("#js_content, .rich_media_content")
         if content is None:
             page_title = soup.title.get_text(" ", strip=True) if soup.title else ""
             raise ArticleDownloadError(
                 f"正文节点不存在，微信返回页面标题：{page_title or '未知'}"
             )
-        return self._archive_content(
-            summary=summary,
-            source_name=source_name,
-            content=content,
-            title=self._metadata(soup, "og:title") or summary.title,
-            description=self._metadata(soup, "og:description"),
-            cover_url=summary.cover_url or self._metadata(soup, "og:image"),
+        return (
+            content,
+            self._metadata(soup, "og:title") or summary.title,
+            self._metadata(soup, "og:description"),
+            summary.cover_url or self._metadata(soup, "og:image"),
         )
 
+    def _download_response(
+        self,
+        summary: ArticleSummary,
+        source_name: str,
+        response: requests.Response,
+    ) -> DownloadedArticle:
+        response.encoding = response.apparent_encoding or "utf-8"
+        return self._archive_content(summary, source_name, "page", {"html": response.text})
+
+    def _markdown_path(self, summary: ArticleSummary, article_key: str) -> Path:
+        return self._content_dir / f"{summary.published_at.date().isoformat()}-{article_key}.md"
+
     def _archive_content(
         self,
         summary: ArticleSummary,
         source_name: str,
-        content: Tag,
-        title: str,
-        description: str,
-        cover_url: str,
+        origin: str,
+        payload: dict[str, Any],
     ) -> DownloadedArticle:
         article_key = _safe_article_id(summary.article_id, summary.url)
         final_asset_dir = self._asset_root / article_key
-        temporary_asset_dir = self._asset_root / f".{article_key}.tmp"
-        markdown_path = (
-            self._content_dir
-            / f"{summary.published_at.date().isoformat()}-{article_key}.md"
-        )
-
-        shutil.rmtree(temporary_asset_dir, ignore_errors=True)
-        temporary_asset_dir.mkdir(parents=True, exist_ok=True)
+        temporary_asset_dir = self._partial_root / article_key
+        partial = PartialAssets(temporary_asset_dir)
+        self._partials[temporary_asset_dir] = partial
+        if self._defer_assets:
+            self._deferred[temporary_asset_dir] = []
 
         try:
-            visible_text = content.get_text(" ", strip=True)
-            has_background_image = any(
-                CSS_URL_RE.search(str(node.get("style", "")))
-                for node in content.find_all(style=True)
-            )
-            if (
-                not visible_text
-                and content.find(["img", "image"]) is None
-                and not has_background_image
-            ):
-                raise ArticleDownloadError("正文节点不包含文本或图片")
-
-            self._sanitize(content)
-            asset_count, usable_image_count = self._localize_content_images(
-                content,
-                summary.url,
-                article_key,
-                temporary_asset_dir,
-            )
-            if not visible_text and usable_image_count == 0:
-                raise ArticleDownloadError("纯图片正文未能解析出可用图片")
-            if not description:
-                description = (
-                    visible_text[:180]
-                    if visible_text
-                    else f"图片文章，共 {usable_image_count} 张正文图片。"
+            if self._html_pool is None:
+                content, title, description, cover_url = self._source_content(
+                    summary,
+                    origin,
+                    payload,
                 )
-
-            cover_path = ""
-            if cover_url:
-                cover_path = self._download_asset(
-                    _absolute_url(cover_url, summary.url),
-                    "cover",
+                downloaded, markdown, assets = self._render_content(
+                    summary=summary,
+                    source_name=source_name,
+                    content=content,
+                    title=title,
+                    description=description,
+                    cover_url=cover_url,
+                    article_key=article_key,
+                    asset_dir=temporary_asset_dir,
+                )
+            else:
+                downloaded, markdown, assets = self._render_staged(
+                    summary,
+                    source_name,
+                    origin,
+                    payload,
                     article_key,
                     temporary_asset_dir,
-                    summary.url,
                 )
-                asset_count += 1
-
-            body_html = content.decode_contents().strip()
-            if not body_html:
-                raise ArticleDownloadError("正文解析后为空")
+            markdown_path = downloaded.markdown_path
+            if self._defer_assets:
+                downloaded = replace(
+                    downloaded,
+                    pending_assets=tuple(
+                        sorted(self._deferred[temporary_asset_dir], key=lambda item: item.stem)
+                    ),
+                )
 
+            partial.finish(
+                {Path(path).name for path in [*assets.values(), downloaded.cover_path] if path}
+            )
             self._replace_directory(temporary_asset_dir, final_asset_dir)
             markdown_path.parent.mkdir(parents=True, exist_ok=True)
-            markdown = self._render_markdown(
-                summary=summary,
-                source_name=source_name,
-                title=title,
-                description=description,
-                cover_path=cover_path,
-                body_html=body_html,
-            )
             temporary_markdown = markdown_path.with_suffix(".md.tmp")
             temporary_markdown.write_text(markdown, encoding="utf-8")
             temporary_markdown.replace(markdown_path)
+            if self._sidecar_root is not None:
+                write_sidecar(markdown_path, markdown, root=self._sidecar_root)
+            if self._search_index is not None:
+                self._search_index.add_article(
+                    markdown_path,
+                    source_name,
+                    title=downloaded.title,
+                    description=downloaded.description,
+                    published_at=summary.published_at,
+                    body_html=downloaded.body_html,
+                )
+            if self._raw_root is not None:
+                write_raw(
+                    article_key,
+                    {
+                        "origin": origin,
+                        "payload": payload,
+                        "articleId": summary.article_id,
+                        "title": summary.title,
+                        "url": summary.url,
+                        "coverUrl": summary.cover_url,
+                        "publishedAt": summary.published_at.isoformat(),
+                        "sourceName": source_name,
+                        "assets": assets,
+                        "cover": downloaded.cover_path,
+                    },
+                    root=self._raw_root,
+                )
+        except Exception:
+            # On failure the staging directory stays for the next attempt.
+            partial.save()
+            raise
+        finally:
+            self._partials.pop(temporary_asset_dir, None)
+            self._deferred.pop(temporary_asset_dir, None)
+        return downloaded
+
+    def localize_pending(
+        self,
+        article_key: str,
+        pending: list[AssetRequest],
+        article_url: str,
+        markdown_path: Path,
+    ) -> dict[str, str]:
+        """Fetch the assets an article was published without and patch its Markdown.
+
+        Nothing under `public/` changes unless every pending asset arrives;
+        a failure keeps the staged files for the next attempt. Returns the
+        local path of each stem.
+        """
+        final_asset_dir = self._asset_root / article_key
+        temporary_asset_dir = self._partial_root / article_key
+        partial = PartialAssets(temporary_asset_dir)
+        self._partials[temporary_asset_dir] = partial
+        try:
+            local_paths = {
+                request.stem: (self._download_media if request.media else self._download_asset)(
+                    request.url,
+                    request.stem,
+                    article_key,
+                    temporary_asset_dir,
+                    article_url,
+                )
+                for request in pending
+            }
+            partial.finish({Path(path).name for path in local_paths.values()})
+            final_asset_dir.mkdir(parents=True, exist_ok=True)
+            for path in sorted(temporary_asset_dir.iterdir()):
+                shutil.move(path, final_asset_dir / path.name)
+            temporary_asset_dir.rmdir()
         except Exception:
-            shutil.rmtree(temporary_asset_dir, ignore_errors=True)
+            partial.save()
             raise
+        finally:
+            self._partials.pop(temporary_asset_dir, None)
 
-        return DownloadedArticle(
+        markdown = markdown_path.read_text(encoding="utf-8")
+        for stem, local_path in local_paths.items():
+            markdown = markdown.replace(pending_asset_path(stem), local_path)
+        markdown, _, _ = size_images(
+            markdown,
+            asset_root=self._asset_root,
+            placeholders=self._image_placeholders,
+        )
+        temporary_markdown = markdown_path.with_suffix(".md.tmp")
+        temporary_markdown.write_text(markdown, encoding="utf-8")
+        temporary_markdown.replace(markdown_path)
+        if self._sidecar_root is not None:
+            write_sidecar(markdown_path, markdown, root=self._sidecar_root)
+        if self._raw_root is not None and raw_path(article_key, self._raw_root).is_file():
+            record = read_raw(raw_path(article_key, self._raw_root))
+            placeholders = {pending_asset_path(stem): path for stem, path in local_paths.items()}
+            record["assets"] = {
+                key: placeholders.get(path, path)
+                for key, path in dict(record.get("assets") or {}).items()
+            }
+            record["cover"] = placeholders.get(str(record.get("cover") or ""), record.get("cover"))
+            record.pop("version", None)
+            write_raw(article_key, record, self._raw_root)
+        return local_paths
+
+    def _render_staged(
+        self,
+        summary: ArticleSummary,
+        source_name: str,
+        origin: str,
+        payload: dict[str, Any],
+        article_key: str,
+        asset_dir: Path,
+    ) -> tuple[DownloadedArticle, str, dict[str, str]]:
+        """Plan and render in the process pool, fetching assets on threads in between."""
+        assert self._html_pool is not None
+        plan = self._html_pool.plan(summary, origin, payload)
+        with span("downloader.localize", article=article_key) as localize_span:
+            with ThreadPoolExecutor(
+                max_workers=ASSET_THREADS,
+                thread_name_prefix="asset",
+            ) as executor:
+                fetches = [
+                    executor.submit(
+                        self._download_media if request.media else self._download_asset,
+                        request.url,
+                        request.stem,
+                        article_key,
+                        asset_dir,
+                        summary.url,
+                    )
+                    for request in plan.assets
+                ]
+                cover = (
+                    executor.submit(
+                        self._download_asset,
+                        plan.cover_url,
+                        "cover",
+                        article_key,
+                        asset_dir,
+                        summary.url,
+                    )
+                    if plan.cover_url
+                    and _asset_key(plan.cover_url)
+                    not in {_asset_key(request.url) for request in plan.assets}
+                    else None
+                )
+                assets = {
+                    _asset_key(request.url): fetch.result()
+                    for request, fetch in zip(plan.assets, fetches)
+                }
+                cover_path = cover.result() if cover is not None else ""
+            localize_span.set(assets=len(fetches) + (cover is not None))
+        downloaded, markdown = self._html_pool.render(
+            summary,
+            source_name,
+            origin,
+            payload,
+            asset_dir,
+            {"assets": assets, "cover": cover_path},
+            self._image_placeholders,
+        )
+        # Workers render against their own default directories.
+        downloaded = replace(downloaded, markdown_path=self._markdown_path(summary, article_key))
+        return downloaded, markdown, assets
+
+    def _render_content(
+        self,
+        summary: ArticleSummary,
+        source_name: str,
+        content: Tag,
+        title: str,
+        description: str,
+        cover_url: str,
+        article_key: str,
+        asset_dir: Path,
+        archived: Optional[dict[str, Any]] = None,
+    ) -> tuple[DownloadedArticle, str, dict[str, str]]:
+        """Sanitize, localize and render one article body.
+
+        With `archived` (a raw archive record) every asset must already be on
+        disk under `asset_dir`; nothing is fetched.
+        """
+        visible_text = self._require_content(content)
+        self._sanitize(content)
+        archived_assets = (
+            None
+            if archived is None
+            else {_asset_key(url): path for url, path in dict(archived.get("assets") or {}).items()}
+        )
+        media = self._media_requests(content, summary.url)
+        with span("downloader.localize", article=article_key) as localize_span:
+            with ThreadPoolExecutor(
+                max_workers=MEDIA_THREADS,
+                thread_name_prefix="media",
+            ) as executor:
+                # Audio and video stream in the background while images are fetched here.
+                media_fetches = [
+                    executor.submit(
+                        self._asset,
+                        request.url,
+                        request.stem,
+                        article_key,
+                        asset_dir,
+                        summary.url,
+                        archived_assets,
+                        media=True,
+                    )
+                    for _, request in media
+                ]
+                asset_count, usable_image_count, assets = self._localize_content_images(
+                    content,
+                    summary.url,
+                    article_key,
+                    asset_dir,
+                    archived_assets,
+                )
+                for (node, request), fetch in zip(media, media_fetches):
+                    local_path = fetch.result()
+                    self._replace_media(node, request, local_path)
+                    assets[_asset_key(request.url)] = local_path
+                    asset_count += 1
+            localize_span.set(assets=asset_count, images=usable_image_count, media=len(media))
+        if not visible_text and usable_image_count == 0 and not media:
+            raise ArticleDownloadError("纯图片正文未能解析出可用图片")
+        if not description:
+            description = (
+                visible_text[:180]
+                if visible_text
+                else f"图片文章，共 {usable_image_count} 张正文图片。"
+            )
+
+        cover_path = ""
+        if cover_url:
+            cover_key = _asset_key(_absolute_url(cover_url, summary.url))
+            # The cover is usually one of the body images; reuse that copy.
+            cover_path = assets.get(cover_key, "")
+            if not cover_path:
+                cover_path = self._asset(
+                    _absolute_url(cover_url, summary.url),
+                    "cover",
+                    article_key,
+                    asset_dir,
+                    summary.url,
+                    None if archived is None else {cover_key: str(archived.get("cover") or "")},
+                )
+                asset_count += 1
+
+        with span("downloader.compact", article=article_key) as compact_span:
+            compaction = compact(content)
+            compact_span.set(bytesSaved=compaction.bytes_saved)
+        body_html = content.decode_contents().strip()
+        if not body_html:
+            raise ArticleDownloadError("正文解析后为空")
+
+        markdown = self._render_markdown(
+            summary=summary,
+            source_name=source_name,
+            title=title,
+            description=description,
+            cover_path=cover_path,
+            body_html=body_html,
+        )
+        downloaded = DownloadedArticle(
             article_id=summary.article_id,
             title=title,
             source_url=_canonical_url(summary.url),
@@ -315,9 +769,11 @@ class WeChatArticleDownloader:
             published_at=summary.published_at,
             cover_path=cover_path,
             body_html=body_html,
-            markdown_path=markdown_path,
+            markdown_path=self._markdown_path(summary, article_key),
             asset_count=asset_count,
+            bytes_saved=compaction.bytes_saved,
         )
+        return downloaded, markdown, assets
 
     @staticmethod
     def _article_id(url: str) -> str:
@@ -362,12 +818,16 @@ class WeChatArticleDownloader:
         return ""
 
     def _get(self, url: str, referer: str) -> requests.Response:
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire_url(url)
         response = self._session.get(
             url,
             headers={"Referer": referer},
             timeout=self._timeout_seconds,
             stream=False,
         )
+        if self._rate_limiter is not None:
+            self._rate_limiter.record_url(url, response.status_code)
         if response.status_code != 200:
             raise ArticleDownloadError(f"下载失败 HTTP {response.status_code}: {url}")
         return response
@@ -401,12 +861,20 @@ class WeChatArticleDownloader:
         article_url: str,
         article_key: str,
         asset_dir: Path,
-    ) -> tuple[int, int]:
+        archived: Optional[dict[str, str]] = None,
+    ) -> tuple[int, int, dict[str, str]]:
+        # Keyed by _asset_key, so URL variants of one image share a download.
         downloaded: dict[str, str] = {}
+        if archived is not None:
+            # Older raw archives key their assets by the exact URL.
+            archived = {_asset_key(url): path for url, path in archived.items()}
         asset_count = 0
         usable_image_count = 0
+        # One walk of the body; bs4's name and attribute filters cost far more than the walk.
+        nodes = content.find_all(True)
+        dropped: set[int] = set()
         for image_index, image in enumerate(
-            content.find_all(["img", "image"]),
+            (node for node in nodes if node.name in {"img", "image"}),
             start=1,
         ):
             raw_url = str(
@@ -418,6 +886,7 @@ class WeChatArticleDownloader:
                 or ""
             ).strip()
             if not raw_url:
+                dropped.add(id(image))
                 image.decompose()
                 continue
             if raw_url.startswith("data:"):
@@ -425,16 +894,18 @@ class WeChatArticleDownloader:
                 image["loading"] = "lazy"
                 continue
             asset_url = _absolute_url(raw_url, article_url)
-            local_path = downloaded.get(asset_url)
+            key = _asset_key(asset_url)
+            local_path = downloaded.get(key)
             if local_path is None:
-                local_path = self._download_asset(
+                local_path = self._asset(
                     asset_url,
                     f"image-{image_index:03d}",
                     article_key,
                     asset_dir,
                     article_url,
+                    archived,
                 )
-                downloaded[asset_url] = local_path
+                downloaded[key] = local_path
                 asset_count += 1
             if image.name == "image":
                 image["href"] = local_path
@@ -446,10 +917,19 @@ class WeChatArticleDownloader:
             image.attrs.pop("srcset", None)
             image.attrs.pop("data-srcset", None)
             image["loading"] = "lazy"
+            if image.name == "img":
+                apply_dimensions(
+                    image,
+                    asset_dir / Path(local_path).name,
+                    placeholder=self._image_placeholders,
+                )
             usable_image_count += 1
 
         background_index = 0
-        for node in content.find_all(style=True):
+        for node in nodes:
+            # Images dropped above are gone; apply_dimensions may have added or removed a style.
+            if id(node) in dropped or "style" not in node.attrs:
+                continue
             style = str(node.get("style", ""))
 
             def replace_background(match: re.Match[str]) -> str:
@@ -461,23 +941,63 @@ class WeChatArticleDownloader:
                 if not raw_url or raw_url.startswith("#"):
                     return match.group(0)
                 asset_url = _absolute_url(raw_url, article_url)
-                local_path = downloaded.get(asset_url)
+                key = _asset_key(asset_url)
+                local_path = downloaded.get(key)
                 if local_path is None:
                     background_index += 1
-                    local_path = self._download_asset(
+                    local_path = self._asset(
                         asset_url,
                         f"background-{background_index:03d}",
                         article_key,
                         asset_dir,
                         article_url,
+                        archived,
                     )
-                    downloaded[asset_url] = local_path
+                    downloaded[key] = local_path
                     asset_count += 1
                 usable_image_count += 1
                 return f"url('{local_path}')"
 
             node["style"] = CSS_URL_RE.sub(replace_background, style)
-        return asset_count, usable_image_count
+        return asset_count, usable_image_count, downloaded
+
+    @staticmethod
+    def _require_content(content: Tag) -> str:
+        """Reject bodies with neither text nor images; return the visible text."""
+        visible_text = content.get_text(" ", strip=True)
+        has_background_image = any(
+            CSS_URL_RE.search(str(node.get("style", "")))
+            for node in content.find_all(style=True)
+        )
+        if (
+            not visible_text
+            and content.find(["img", "image", *MEDIA_TAGS]) is None
+            and not has_background_image
+        ):
+            raise ArticleDownloadError("正文节点不包含文本、图片或音视频")
+        return visible_text
+
+    def _asset(
+        self,
+        url: str,
+        stem: str,
+        article_key: str,
+        asset_dir: Path,
+        article_url: str,
+        archived: Optional[dict[str, str]],
+        *,
+        media: bool = False,
+    ) -> str:
+        """Download an asset, or reuse the copy a raw archive recorded for it."""
+        if archived is None:
+            download = self._download_media if media else self._download_asset
+            return download(url, stem, article_key, asset_dir, article_url)
+        local_path = archived.get(_asset_key(url), "")
+        if local_path.startswith(PENDING_ASSET):
+            return local_path
+        if not local_path or not (asset_dir / Path(local_path).name).is_file():
+            raise ArticleDownloadError(f"离线重渲染缺少已归档的资源: {url}")
+        return local_path
 
     def _download_asset(
         self,
@@ -487,25 +1007,154 @@ class WeChatArticleDownloader:
         asset_dir: Path,
         article_url: str,
     ) -> str:
-        response = self._get(url, referer=article_url)
-        content_length = int(response.headers.get("Content-Length", "0") or 0)
-        if content_length > MAX_ASSET_BYTES or len(response.content) > MAX_ASSET_BYTES:
-            raise ArticleDownloadError(f"图片超过 25 MiB 限制: {url}")
-        if not response.content:
-            raise ArticleDownloadError(f"图片内容为空: {url}")
-
-        extension = _extension_for(response, url)
+        key = _asset_key(url)
+        partial = self._partials.get(asset_dir)
+        if partial is not None:
+            filename = partial.reuse(stem, key)
+            if filename is not None:
+                return f"/article-assets/{article_key}/{filename}"
+        deferred = self._deferred.get(asset_dir)
+        if deferred is not None:
+            deferred.append(AssetRequest(url, stem))
+            return pending_asset_path(stem)
+        with span("downloader.asset", article=article_key, stem=stem) as asset_span:
+            response = self._get(url, referer=article_url)
+            content_length = int(response.headers.get("Content-Length", "0") or 0)
+            asset_span.set(bytes=len(response.content))
+            if content_length > MAX_ASSET_BYTES or len(response.content) > MAX_ASSET_BYTES:
+                raise ArticleDownloadError(f"图片超过 25 MiB 限制: {url}")
+            if not response.content:
+                raise ArticleDownloadError(f"图片内容为空: {url}")
+
+            extension = _extension_for(response, url)
+            filename = f"{stem}{extension}"
+            destination = asset_dir / filename
+            destination.write_bytes(response.content)
+        if partial is not None:
+            partial.record(
+                stem, url, key, filename, hashlib.sha256(response.content).hexdigest()
+            )
+        return f"/article-assets/{article_key}/{filename}"
+
+    @staticmethod
+    def _media_requests(content: Tag, article_url: str) -> list[tuple[Tag, AssetRequest]]:
+        requests_by_node: list[tuple[Tag, AssetRequest]] = []
+        counts = {"audio": 0, "video": 0}
+        for node in content.find_all(MEDIA_TAGS):
+            kind = "audio" if node.name in {"mpvoice", "mp-common-mpaudio", "audio"} else "video"
+            request = _media_request(node, article_url, counts[kind] + 1)
+            if request is not None:
+                counts[kind] += 1
+                requests_by_node.append((node, request))
+        return requests_by_node
+
+    @staticmethod
+    def _replace_media(node: Tag, request: AssetRequest, local_path: str) -> None:
+        """Swap a WeChat player element for a native <audio>/<video> on the local file."""
+        kind = request.stem.split("-", 1)[0]
+        attrs = {
+            "controls": "",
+            "preload": "none" if kind == "audio" else "metadata",
+            "src": local_path,
+        }
+        title = str(node.get("name") or node.get("title") or "").strip()
+        if title:
+            attrs["title"] = title
+        if kind == "video":
+            attrs["playsinline"] = ""
+        node.replace_with(BeautifulSoup("", "html.parser").new_tag(kind, attrs=attrs))
+
+    def _download_media(
+        self,
+        url: str,
+        stem: str,
+        article_key: str,
+        asset_dir: Path,
+        article_url: str,
+    ) -> str:
+        """Stream audio or video to disk, resuming an earlier partial file with a Range request."""
+        key = _asset_key(url)
+        partial = self._partials.get(asset_dir)
+        if partial is not None:
+            filename = partial.reuse(stem, key)
+            if filename is not None:
+                return f"/article-assets/{article_key}/{filename}"
+        deferred = self._deferred.get(asset_dir)
+        if deferred is not None:
+            deferred.append(AssetRequest(url, stem, media=True))
+            return pending_asset_path(stem)
+
+        # The key hash keeps a stem reused for different media from resuming the wrong file.
+        part_name = f"{stem}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]}"
+        part_path = asset_dir / f"{part_name}{PART_SUFFIX}"
+        with span("downloader.media", article=article_key, stem=stem) as media_span:
+            source_url = self._media_url(url, article_url)
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            headers = {"Referer": article_url}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire_url(source_url)
+            with self._session.get(
+                source_url,
+                headers=headers,
+                timeout=self._timeout_seconds,
+                stream=True,
+            ) as response:
+                if self._rate_limiter is not None:
+                    self._rate_limiter.record_url(source_url, response.status_code)
+                if response.status_code == 416 and offset:
+                    # The partial file no longer lines up with the source; start over.
+                    part_path.unlink()
+                    raise ArticleDownloadError(f"音视频断点失效，下次重新下载: {url}")
+                if response.status_code == 200:
+                    offset = 0
+                elif response.status_code != 206 or not offset:
+                    raise ArticleDownloadError(f"下载失败 HTTP {response.status_code}: {url}")
+                media_span.set(resumedBytes=offset)
+                if _media_total(response, offset) > MAX_MEDIA_BYTES:
+                    raise ArticleDownloadError(f"音视频超过 512 MiB 限制: {url}")
+                digest = file_sha256(part_path) if offset else hashlib.sha256()
+                with part_path.open("ab" if offset else "wb") as file:
+                    for chunk in response.iter_content(MEDIA_CHUNK_BYTES):
+                        offset += len(chunk)
+                        if offset > MAX_MEDIA_BYTES:
+                            raise ArticleDownloadError(f"音视频超过 512 MiB 限制: {url}")
+                        file.write(chunk)
+                        digest.update(chunk)
+                extension = _media_extension(response, source_url, stem)
+            media_span.set(bytes=offset)
+            if not offset:
+                raise ArticleDownloadError(f"音视频内容为空: {url}")
+
         filename = f"{stem}{extension}"
-        destination = asset_dir / filename
-        destination.write_bytes(response.content)
+        part_path.replace(asset_dir / filename)
+        if partial is not None:
+            partial.record(stem, url, key, filename, digest.hexdigest())
+            # Media is too large to fetch twice; persist it before the batch ends.
+            partial.save()
         return f"/article-assets/{article_key}/{filename}"
 
+    def _media_url(self, url: str, article_url: str) -> str:
+        """Resolve WeChat's video player lookup to a playable file URL."""
+        if not url.startswith(WECHAT_VIDEO_URL):
+            return url
+        try:
+            payload = self._get(url, referer=article_url).json()
+        except ValueError as error:
+            raise ArticleDownloadError(f"微信视频地址解析失败: {url}") from error
+        for item in payload.get("url_info") or [] if isinstance(payload, dict) else []:
+            if isinstance(item, dict) and item.get("url"):
+                return str(item["url"])
+        raise ArticleDownloadError(f"微信视频没有可下载的地址: {url}")
+
     @staticmethod
     def _replace_directory(source: Path, destination: Path) -> None:
         if destination.exists():
             shutil.rmtree(destination)
         destination.parent.mkdir(parents=True, exist_ok=True)
-        source.replace(destination)
+        # A rename when both sides share a filesystem, a copy otherwise.
+        shutil.move(source, destination)
 
     @staticmethod
     def _render_markdown(
@@ -533,3 +1182,142 @@ class WeChatArticleDownloader:
             "",
         ]
         return "\n".join(fields)
+
+
+class _AssetPlanner(WeChatArticleDownloader):
+    """Walk an article's assets exactly as localization would, without fetching."""
+
+    def plan(
+        self,
+        summary: ArticleSummary,
+        origin: str,
+        payload: dict[str, Any],
+    ) -> AssetPlan:
+        self._requests: list[AssetRequest] = []
+        content, _, _, cover_url = self._source_content(summary, origin, payload)
+        self._require_content(content)
+        self._sanitize(content)
+        self._localize_content_images(
+            content,
+            summary.url,
+            _safe_article_id(summary.article_id, summary.url),
+            Path(),
+        )
+        self._requests.extend(request for _, request in self._media_requests(content, summary.url))
+        return AssetPlan(
+            assets=tuple(self._requests),
+            cover_url=_absolute_url(cover_url, summary.url) if cover_url else "",
+        )
+
+    def _download_asset(
+        self,
+        url: str,
+        stem: str,
+        article_key: str,
+        asset_dir: Path,
+        article_url: str,
+    ) -> str:
+        self._requests.append(AssetRequest(url, stem))
+        return f"/article-assets/{article_key}/{stem}"
+
+
+# The worker-side downloader of an HtmlProcessPool, built by the pool initializer.
+_pool_worker: Optional[_AssetPlanner] = None
+
+
+def _start_pool_worker() -> None:
+    global _pool_worker
+    _pool_worker = _AssetPlanner(sidecar_root=None, raw_root=None)
+
+
+def _plan_in_worker(
+    summary: ArticleSummary,
+    origin: str,
+    payload: dict[str, Any],
+) -> AssetPlan:
+    assert _pool_worker is not None
+    return _pool_worker.plan(summary, origin, payload)
+
+
+def _render_in_worker(
+    summary: ArticleSummary,
+    source_name: str,
+    origin: str,
+    payload: dict[str, Any],
+    asset_dir: Path,
+    archived: dict[str, Any],
+    image_placeholders: bool,
+) -> tuple[DownloadedArticle, str]:
+    assert _pool_worker is not None
+    _pool_worker._image_placeholders = image_placeholders
+    content, title, description, cover_url = _pool_worker._source_content(
+        summary,
+        origin,
+        payload,
+    )
+    downloaded, markdown, _ = _pool_worker._render_content(
+        summary=summary,
+        source_name=source_name,
+        content=content,
+        title=title,
+        description=description,
+        cover_url=cover_url,
+        article_key=_safe_article_id(summary.article_id, summary.url),
+        asset_dir=asset_dir,
+        archived=archived,
+    )
+    return downloaded, markdown
+
+
+class HtmlProcessPool:
+    """Worker processes for the CPU-bound half of archiving.
+
+    Parsing, sanitizing, compaction and rendering hold the GIL. Running them here
+    keeps article threads free to fetch details and assets meanwhile.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_start_pool_worker,
+        )
+
+    def plan(
+        self,
+        summary: ArticleSummary,
+        origin: str,
+        payload: dict[str, Any],
+    ) -> AssetPlan:
+        """Parse and sanitize the body; list the assets it needs."""
+        return self._executor.submit(_plan_in_worker, summary, origin, payload).result()
+
+    def render(
+        self,
+        summary: ArticleSummary,
+        source_name: str,
+        origin: str,
+        payload: dict[str, Any],
+        asset_dir: Path,
+        archived: dict[str, Any],
+        image_placeholders: bool = False,
+    ) -> tuple[DownloadedArticle, str]:
+        """Rewrite the body against downloaded assets and render its Markdown."""
+        return self._executor.submit(
+            _render_in_worker,
+            summary,
+            source_name,
+            origin,
+            payload,
+            asset_dir,
+            archived,
+            image_placeholders,
+        ).result()
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> HtmlProcessPool:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
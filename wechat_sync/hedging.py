@@ -0,0 +1,126 @@
+"""Latency history, adaptive timeouts and the hedging policy for RapidAPI calls."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_LATENCY_PATH = PROJECT_ROOT / "data" / "wechat" / "rapidapi-latency.json"
+LATENCY_SAMPLES = 200
+MIN_SAMPLES = 20
+# Timeouts wait for three times the slowest percent of recent answers, within
+# [MIN_TIMEOUT_SECONDS, the client's configured ceiling].
+TIMEOUT_PERCENTILE = 0.99
+TIMEOUT_MULTIPLIER = 3.0
+MIN_TIMEOUT_SECONDS = 15.0
+
+
+class LatencyHistory:
+    """Recent successful request latencies per endpoint, kept across runs."""
+
+    def __init__(self, path: Optional[Path] = DEFAULT_LATENCY_PATH) -> None:
+        self.path = path
+        self._samples: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+        if path is None or not path.exists():
+            return
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            return
+        for endpoint, values in (payload.get("endpoints") or {}).items():
+            if isinstance(values, list):
+                self._samples[str(endpoint)] = deque(
+                    (float(value) for value in values if isinstance(value, (int, float))),
+                    maxlen=LATENCY_SAMPLES,
+                )
+
+    def observe(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=LATENCY_SAMPLES)).append(
+                round(seconds, 3)
+            )
+
+    def percentile(self, endpoint: str, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def timeout(self, endpoint: str, ceiling: float) -> float:
+        slowest = self.percentile(endpoint, TIMEOUT_PERCENTILE)
+        if slowest is None:
+            return ceiling
+        return min(ceiling, max(MIN_TIMEOUT_SECONDS, slowest * TIMEOUT_MULTIPLIER))
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            payload = {
+                "version": 1,
+                "endpoints": {
+                    endpoint: list(samples) for endpoint, samples in self._samples.items()
+                },
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        temporary_path.write_text(json.dumps(payload) + "\n", encoding="utf-8")
+        temporary_path.replace(self.path)
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """When a detail request may be duplicated on a second key."""
+
+    # Hedge once the primary is slower than this share of recent answers.
+    percentile: float = 0.9
+    # Hedged requests allowed per detail request (at least one per run).
+    max_ratio: float = 0.1
+    min_delay_seconds: float = 2.0
+
+
+def add_hedge_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("详情请求对冲")
+    group.add_argument(
+        "--hedge-detail",
+        action="store_true",
+        help="详情请求超过近期耗时分位数仍未返回时，用另一个健康 Key 重复发出，先返回者生效",
+    )
+    group.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=HedgePolicy.percentile * 100,
+        help="触发对冲的近期耗时分位数（默认 90）",
+    )
+    group.add_argument(
+        "--hedge-max-ratio",
+        type=float,
+        default=HedgePolicy.max_ratio,
+        help="对冲请求数占详情请求数的上限（默认 0.1，每次运行至少允许 1 次）",
+    )
+
+
+def hedge_policy_from_args(args: argparse.Namespace) -> Optional[HedgePolicy]:
+    if not args.hedge_detail:
+        return None
+    return HedgePolicy(
+        percentile=args.hedge_percentile / 100,
+        max_ratio=args.hedge_max_ratio,
+    )
+
+
+def hedge_argument_error(args: argparse.Namespace) -> Optional[str]:
+    if not 50 <= args.hedge_percentile < 100:
+        return "--hedge-percentile 必须在 50 到 100 之间"
+    if not 0 <= args.hedge_max_ratio <= 1:
+        return "--hedge-max-ratio 必须在 0 到 1 之间"
+    return None
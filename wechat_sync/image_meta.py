@@ -0,0 +1,284 @@
+"""Intrinsic image sizes from header bytes, and optional blurred placeholders."""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import struct
+import sys
+from pathlib import Path
+from typing import Optional
+
+from bs4 import BeautifulSoup, Tag
+
+from .compaction import BODY_END, BODY_START, DEFAULT_CONTENT_DIR, _declarations
+from .sidecars import write_sidecar
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ASSET_ROOT = PROJECT_ROOT / "public" / "article-assets"
+ASSET_PREFIX = "/article-assets/"
+HEADER_BYTES = 64 * 1024
+# JPEG start-of-frame markers; C4, C8 and CC share the range but are not frames.
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# EXIF orientations that rotate the image by 90 degrees when displayed.
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+PLACEHOLDER_WIDTH = 16
+# Placeholders are the only data URIs this module writes into a background.
+PLACEHOLDER_DECLARATION = "background:url(data:"
+
+
+def _jpeg_orientation(segment: bytes) -> int:
+    """Read the orientation tag from an APP1 Exif segment, 1 if absent."""
+    if not segment.startswith(b"Exif\0\0") or len(segment) < 14:
+        return 1
+    tiff = segment[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return 1
+    try:
+        (offset,) = struct.unpack_from(f"{order}I", tiff, 4)
+        (count,) = struct.unpack_from(f"{order}H", tiff, offset)
+        for entry in range(count):
+            tag, _, _, value = struct.unpack_from(f"{order}HHIH", tiff, offset + 2 + entry * 12)
+            if tag == 0x0112:
+                return value
+    except struct.error:
+        return 1
+    return 1
+
+
+def _jpeg_size(data: bytes) -> Optional[tuple[int, int]]:
+    position = 2
+    orientation = 1
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in {0x01, *range(0xD0, 0xD8)}:
+            position += 2
+            continue
+        (length,) = struct.unpack_from(">H", data, position + 2)
+        if marker == 0xE1:
+            orientation = _jpeg_orientation(data[position + 4 : position + 2 + length])
+        if marker in JPEG_SOF_MARKERS:
+            if position + 9 > len(data):
+                return None
+            height, width = struct.unpack_from(">HH", data, position + 5)
+            if orientation in ROTATED_ORIENTATIONS:
+                width, height = height, width
+            return width, height
+        position += 2 + length
+    return None
+
+
+def _webp_size(data: bytes) -> Optional[tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack_from("<HH", data, 26)
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and data[20:21] == b"\x2f":
+        (bits,) = struct.unpack_from("<I", data, 21)
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def image_size(data: bytes) -> Optional[tuple[int, int]]:
+    """Return (width, height) from the first bytes of a PNG, GIF, JPEG, WebP or AVIF."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and len(data) >= 24:
+        return struct.unpack_from(">II", data, 16)
+    if data[:6] in {b"GIF87a", b"GIF89a"} and len(data) >= 10:
+        return struct.unpack_from("<HH", data, 6)
+    if data.startswith(b"\xff\xd8"):
+        return _jpeg_size(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        return _webp_size(data)
+    if data[4:12] in {b"ftypavif", b"ftypavis"}:
+        # The image spatial extents property holds the primary item's size.
+        position = data.find(b"ispe")
+        if position >= 0 and position + 16 <= len(data):
+            return struct.unpack_from(">II", data, position + 8)
+    return None
+
+
+def read_image_size(path: Path) -> Optional[tuple[int, int]]:
+    """Read just enough of an image file to know its size; nothing is decoded."""
+    try:
+        with path.open("rb") as file:
+            header = file.read(HEADER_BYTES)
+            size = image_size(header)
+            if size is None and header.startswith(b"\xff\xd8"):
+                # Large Exif or ICC segments can push the frame header further in.
+                size = image_size(header + file.read())
+    except OSError:
+        return None
+    if size is None or min(size) <= 0:
+        return None
+    return size
+
+
+def placeholder_uri(path: Path) -> Optional[str]:
+    """A tiny blurred WebP of the image as a data URI, or None without Pillow."""
+    try:
+        from PIL import Image, ImageFilter
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as image:
+            if image.mode in {"RGBA", "LA", "PA"} or "transparency" in image.info:
+                # The placeholder would show through transparent pixels.
+                return None
+            image.draft("RGB", (PLACEHOLDER_WIDTH * 4, PLACEHOLDER_WIDTH * 4))
+            preview = image.convert("RGB")
+            preview.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+            preview = preview.filter(ImageFilter.GaussianBlur(1))
+            buffer = io.BytesIO()
+            preview.save(buffer, format="WEBP", quality=30)
+    except (OSError, ValueError):
+        return None
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def placeholders_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def apply_dimensions(image: Tag, path: Path, *, placeholder: bool = False) -> bool:
+    """Give a localized <img> its intrinsic width/height; return whether it changed."""
+    size = read_image_size(path)
+    if size is None:
+        return False
+    before = dict(image.attrs)
+    image["width"] = str(size[0])
+    image["height"] = str(size[1])
+    # The attributes size the box; leftover WeChat inline sizes would override them.
+    declarations = [
+        declaration
+        for declaration in _declarations(str(image.get("style", "")))
+        if declaration.partition(":")[0] not in {"width", "height"}
+        and not declaration.startswith(PLACEHOLDER_DECLARATION)
+    ]
+    if placeholder:
+        uri = placeholder_uri(path)
+        if uri is not None:
+            declarations.append(f"background:url({uri}) center/cover no-repeat")
+    if declarations:
+        image["style"] = ";".join(declarations)
+    else:
+        image.attrs.pop("style", None)
+    return image.attrs != before
+
+
+def _asset_file(src: str, asset_root: Path) -> Optional[Path]:
+    if not src.startswith(ASSET_PREFIX):
+        return None
+    path = (asset_root / src[len(ASSET_PREFIX) :]).resolve()
+    return path if path.is_relative_to(asset_root.resolve()) else None
+
+
+def size_images(
+    markdown: str,
+    *,
+    asset_root: Path = ASSET_ROOT,
+    placeholders: bool = False,
+) -> tuple[str, int, int]:
+    """Size every local image in an article body; return the Markdown, sized, unsized."""
+    start = markdown.find(BODY_START)
+    end = markdown.rfind(BODY_END)
+    if start < 0 or end < start:
+        return markdown, 0, 0
+    body_start = start + len(BODY_START)
+    soup = BeautifulSoup(f"<div>{markdown[body_start:end]}</div>", "html.parser")
+    content = soup.div
+    sized = unsized = 0
+    touched = False
+    for image in content.find_all("img"):
+        path = _asset_file(str(image.get("src", "")), asset_root)
+        if path is None:
+            continue
+        if read_image_size(path) is None:
+            unsized += 1
+            continue
+        sized += 1
+        touched = apply_dimensions(image, path, placeholder=placeholders) or touched
+    if not touched:
+        return markdown, sized, unsized
+    return markdown[:body_start] + content.decode_contents().strip() + markdown[end:], sized, unsized
+
+
+def backfill(
+    content_dir: Path = DEFAULT_CONTENT_DIR,
+    *,
+    placeholders: bool = False,
+    dry_run: bool = False,
+) -> tuple[int, int, int]:
+    """Add dimensions to archived articles; return files changed, images sized, unsized."""
+    changed = sized = unsized = 0
+    for markdown_path in sorted(content_dir.glob("*.md")):
+        markdown = markdown_path.read_text(encoding="utf-8")
+        updated, article_sized, article_unsized = size_images(markdown, placeholders=placeholders)
+        sized += article_sized
+        unsized += article_unsized
+        if updated == markdown:
+            continue
+        changed += 1
+        if dry_run:
+            continue
+        temporary_path = markdown_path.with_suffix(".md.tmp")
+        temporary_path.write_text(updated, encoding="utf-8")
+        temporary_path.replace(markdown_path)
+        write_sidecar(markdown_path, updated)
+    return changed, sized, unsized
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="为已归档文章的本地图片补充宽高属性")
+    parser.add_argument("--content-dir", type=Path, default=DEFAULT_CONTENT_DIR)
+    parser.add_argument(
+        "--placeholders",
+        action="store_true",
+        help="同时写入模糊低清占位图（需要安装 Pillow）",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="只统计会变化的文章，不写入文件",
+    )
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    if args.placeholders and not placeholders_available():
+        print("--placeholders 需要 Pillow：pip install Pillow", file=sys.stderr)
+        return 2
+    try:
+        changed, sized, unsized = backfill(
+            args.content_dir,
+            placeholders=args.placeholders,
+            dry_run=args.dry_run,
+        )
+    except OSError as error:
+        print(f"图片尺寸回填失败: {error}", file=sys.stderr)
+        return 1
+    print(
+        f"{'将更新' if args.dry_run else '已更新'} {changed} 篇文章，"
+        f"识别尺寸 {sized} 张图片，无法识别 {unsized} 张"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
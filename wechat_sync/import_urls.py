@@ -4,14 +4,28 @@ from __future__ import annotations
 
 import argparse
 import html
+import json
 import re
 import sys
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, Optional
 
-from .downloader import DownloadedArticle, WeChatArticleDownloader
+from .downloader import DownloadedArticle, DuplicateArticleError, WeChatArticleDownloader
+from .index_store import IndexStore
+from .locking import lock_wait_summary
+from .pacing import (
+    RateLimiter,
+    add_rate_arguments,
+    rate_argument_error,
+    rate_limiter_from_args,
+)
+from .profiling import add_profile_arguments, run_profiled
+from .search_index import SearchIndex
 from .sync import (
     INDEX_ROOT,
     PROJECT_ROOT,
@@ -19,11 +33,12 @@ from .sync import (
     AccountConfig,
     _load_accounts,
     _load_json,
-    _save_index,
     _url_key,
 )
 
 
+DEFAULT_CHECKPOINT_ROOT = PROJECT_ROOT / "data" / "wechat" / "import-checkpoints"
+FINISHED_STATUSES = {"imported", "skipped"}
 WECHAT_URL_RE = re.compile(
     r"https?://mp\.weixin\.qq\.com/s"
     r"(?:/[A-Za-z0-9_-]+(?:\?[^\s)>\]\"']+)?|\?[^\s)>\]\"']+)"
@@ -62,7 +77,7 @@ def _index_entry(downloaded: DownloadedArticle) -> dict[str, Any]:
     }
 
 
-def _save_imported_article(
+def _apply_imported_article(
     index_path: Path,
     index: dict[str, Any],
     downloaded: DownloadedArticle,
@@ -73,30 +88,103 @@ def _save_imported_article(
     entries.append(_index_entry(downloaded))
     entries.sort(key=lambda entry: str(entry.get("publishedAt", "")), reverse=True)
 
-    raw_pending = index.get("pendingArticles", [])
-    if isinstance(raw_pending, list):
-        downloaded_url = _url_key(downloaded.source_url)
-        index["pendingArticles"] = [
+    downloaded_url = _url_key(downloaded.source_url)
+    for queue in ("pendingArticles", "quarantinedArticles"):
+        raw_queue = index.get(queue, [])
+        if not isinstance(raw_queue, list):
+            continue
+        index[queue] = [
             item
-            for item in raw_pending
+            for item in raw_queue
             if not isinstance(item, dict)
             or (
                 str(item.get("articleId", "")).strip() != downloaded.article_id
                 and _url_key(str(item.get("url", ""))) != downloaded_url
             )
         ]
+
+
+def _commit_index(
+    store: IndexStore,
+    index: dict[str, Any],
+    pending: list[DownloadedArticle],
+) -> dict[str, Any]:
+    """Write `index`, replaying `pending` onto the file if another writer got there first."""
+
+    def reapply(fresh: dict[str, Any]) -> dict[str, Any]:
+        fresh_ids = {
+            str(entry.get("articleId", "")).strip()
+            for entry in fresh.get("articles") or []
+            if isinstance(entry, dict)
+        }
+        for downloaded in pending:
+            if downloaded.article_id not in fresh_ids:
+                _apply_imported_article(store.path, fresh, downloaded)
+        fresh["updatedAt"] = datetime.now(tz=SHANGHAI).isoformat()
+        return fresh
+
     index["updatedAt"] = datetime.now(tz=SHANGHAI).isoformat()
-    _save_index(index_path, index)
+    return store.commit(index, reapply)
+
+
+class ImportCheckpoint:
+    """Record each URL outcome so an interrupted import can resume."""
+
+    def __init__(self, path: Path, account_slug: str, *, resume: bool) -> None:
+        self._path = path
+        self._account_slug = account_slug
+        self._outcomes: dict[str, dict[str, str]] = {}
+        if resume and path.exists():
+            payload = _load_json(path)
+            if str(payload.get("account", "")) != account_slug:
+                raise ValueError(f"断点文件 {path} 不属于公众号 {account_slug}")
+            raw_outcomes = payload.get("urls", {})
+            if isinstance(raw_outcomes, dict):
+                self._outcomes = {
+                    str(key): value
+                    for key, value in raw_outcomes.items()
+                    if isinstance(value, dict)
+                }
+
+    def finished(self, url: str) -> bool:
+        outcome = self._outcomes.get(_url_key(url), {})
+        return outcome.get("status") in FINISHED_STATUSES
+
+    def record(self, url: str, status: str, **details: str) -> None:
+        self._outcomes[_url_key(url)] = {
+            "status": status,
+            **details,
+            "updatedAt": datetime.now(tz=SHANGHAI).isoformat(),
+        }
+
+    def save(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self._path.with_suffix(".json.tmp")
+        temporary_path.write_text(
+            json.dumps(
+                {"version": 1, "account": self._account_slug, "urls": self._outcomes},
+                ensure_ascii=False,
+                indent=2,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        temporary_path.replace(self._path)
 
 
 def import_urls(
     account: AccountConfig,
     urls: list[str],
     *,
-    delay_seconds: float,
+    rate_limiter: RateLimiter,
+    workers: int = 1,
+    commit_every: int = 1,
+    checkpoint_path: Optional[Path] = None,
+    resume: bool = False,
 ) -> tuple[int, int, int]:
     index_path = INDEX_ROOT / f"{account.slug}.json"
-    index = _load_json(index_path)
+    store = IndexStore(index_path)
+    index = store.load()
     entries = index.get("articles", [])
     if not isinstance(entries, list):
         raise ValueError(f"{index_path.name} 的 articles 字段不是数组")
@@ -107,7 +195,10 @@ def import_urls(
     ).strip() != account.slug:
         raise ValueError(f"{index_path.name} 与公众号 {account.slug} 不匹配")
 
-    indexed_ids = {
+    # Article IDs indexed or being downloaded. A short /s/<id> link and a long
+    # __biz/mid/idx link differ by URL key but resolve to the same ID, so the
+    # ID is claimed before a worker writes the article's files.
+    claimed = {
         str(entry.get("articleId", "")).strip()
         for entry in entries
         if isinstance(entry, dict) and str(entry.get("articleId", "")).strip()
@@ -117,39 +208,137 @@ def import_urls(
         for entry in entries
         if isinstance(entry, dict) and str(entry.get("sourceUrl", "")).strip()
     }
-    downloader = WeChatArticleDownloader()
+    checkpoint = ImportCheckpoint(
+        checkpoint_path or DEFAULT_CHECKPOINT_ROOT / f"{account.slug}.json",
+        account.slug,
+        resume=resume,
+    )
+    search_index = SearchIndex(autoflush=False)
+    local = threading.local()
+    claim_lock = threading.Lock()
+
+    def claim(article_id: str) -> bool:
+        with claim_lock:
+            if article_id in claimed:
+                return False
+            claimed.add(article_id)
+        local.claimed = article_id
+        return True
+
+    def download(url: str) -> DownloadedArticle:
+        downloader = getattr(local, "downloader", None)
+        if downloader is None:
+            downloader = WeChatArticleDownloader(
+                rate_limiter=rate_limiter,
+                search_index=search_index,
+            )
+            local.downloader = downloader
+        local.claimed = None
+        try:
+            return downloader.download_url(url, account.name, claim=claim)
+        except Exception:
+            # Hand the ID back so another link to the article can still import it.
+            if local.claimed is not None:
+                with claim_lock:
+                    claimed.discard(local.claimed)
+            raise
+
     succeeded = 0
     skipped = 0
     failed = 0
+    failure_kinds: Counter[str] = Counter()
+    uncommitted: list[tuple[str, DownloadedArticle]] = []
+    started = time.monotonic()
 
+    def commit() -> None:
+        nonlocal index
+        if not uncommitted:
+            return
+        index = _commit_index(store, index, [downloaded for _, downloaded in uncommitted])
+        search_index.flush()
+        for url, downloaded in uncommitted:
+            checkpoint.record(url, "imported", articleId=downloaded.article_id)
+        uncommitted.clear()
+        checkpoint.save()
+
+    queued: list[tuple[int, str]] = []
+    queued_keys: set[str] = set()
     for position, url in enumerate(urls, start=1):
-        if _url_key(url) in indexed_urls:
+        if checkpoint.finished(url):
+            skipped += 1
+            print(f"[{position}/{len(urls)}] 断点记录已完成，跳过 {url}")
+        elif _url_key(url) in indexed_urls:
             skipped += 1
+            checkpoint.record(url, "skipped", reason="indexed")
             print(f"[{position}/{len(urls)}] 已入库，跳过 {url}")
-            continue
+        elif _url_key(url) in queued_keys:
+            skipped += 1
+            print(f"[{position}/{len(urls)}] 链接重复，跳过 {url}")
+        else:
+            queued_keys.add(_url_key(url))
+            queued.append((position, url))
+    checkpoint.save()
 
-        print(f"[{position}/{len(urls)}] 导入 {url}")
-        try:
-            downloaded = downloader.download_url(url, account.name)
-            if downloaded.article_id in indexed_ids:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download, url): (position, url)
+            for position, url in queued
+        }
+        for future in as_completed(futures):
+            position, url = futures[future]
+            try:
+                downloaded = future.result()
+            except DuplicateArticleError as error:
                 skipped += 1
-                print(f"  文章 ID 已入库，跳过 {downloaded.article_id}")
+                checkpoint.record(url, "skipped", reason="duplicate-id")
+                checkpoint.save()
+                print(f"[{position}/{len(urls)}] {error}，跳过 {url}")
+                continue
+            except Exception as error:
+                failed += 1
+                failure_kinds[type(error).__name__] += 1
+                checkpoint.record(url, "failed", error=str(error))
+                checkpoint.save()
+                print(f"[{position}/{len(urls)}] 失败 {url}: {error}", file=sys.stderr)
+                continue
+
+            try:
+                _apply_imported_article(index_path, index, downloaded)
+            except ValueError as error:
+                failed += 1
+                failure_kinds[type(error).__name__] += 1
+                checkpoint.record(url, "failed", error=str(error))
+                checkpoint.save()
+                print(f"[{position}/{len(urls)}] 失败 {url}: {error}", file=sys.stderr)
                 continue
-            _save_imported_article(index_path, index, downloaded)
-        except Exception as error:
-            failed += 1
-            print(f"  失败: {error}", file=sys.stderr)
-        else:
             succeeded += 1
-            indexed_ids.add(downloaded.article_id)
             indexed_urls.add(_url_key(downloaded.source_url))
+            uncommitted.append((url, downloaded))
             print(
-                f"  已保存 {downloaded.markdown_path.relative_to(PROJECT_ROOT)}，"
-                f"本地资源 {downloaded.asset_count} 个"
+                f"[{position}/{len(urls)}] 已保存 "
+                f"{downloaded.markdown_path.relative_to(PROJECT_ROOT)}，"
+                f"本地资源 {downloaded.asset_count} 个，"
+                f"正文压缩节省 {downloaded.bytes_saved / 1024:.1f} KiB"
             )
-        if position < len(urls) and delay_seconds:
-            time.sleep(delay_seconds)
+            if len(uncommitted) >= commit_every:
+                commit()
+        commit()
 
+    elapsed = max(time.monotonic() - started, 1e-9)
+    attempted = succeeded + failed
+    print(
+        f"导入耗时 {elapsed:.1f} 秒，处理 {attempted} 篇，"
+        f"吞吐 {attempted * 60 / elapsed:.1f} 篇/分钟"
+    )
+    print(f"请求节奏：{rate_limiter.summary()}")
+    lock_waits = lock_wait_summary()
+    if lock_waits is not None:
+        print(lock_waits)
+    if failure_kinds:
+        summary = "，".join(
+            f"{kind} {count} 篇" for kind, count in failure_kinds.most_common()
+        )
+        print(f"失败分类：{summary}", file=sys.stderr)
     return succeeded, skipped, failed
 
 
@@ -167,14 +356,45 @@ def build_parser() -> argparse.ArgumentParser:
         type=Path,
         help="包含微信原文链接的 UTF-8 文本或 Markdown 文件",
     )
-    parser.add_argument("--delay", type=float, default=2.0, help="文章间隔秒数")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="并发导入的文章数（默认 1，即串行）",
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=10,
+        help="每成功导入多少篇写入一次索引（默认 10）",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help="记录每个链接结果的断点文件，默认 data/wechat/import-checkpoints/<slug>.json",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="跳过断点文件中已导入或已跳过的链接，只处理剩余和失败的链接",
+    )
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
     return parser
 
 
 def main() -> int:
     args = build_parser().parse_args()
-    if args.delay < 0:
-        print("--delay 不能小于 0", file=sys.stderr)
+    return run_profiled(args, lambda: _run(args))
+
+
+def _run(args: argparse.Namespace) -> int:
+    rate_error = rate_argument_error(args)
+    if rate_error is not None:
+        print(rate_error, file=sys.stderr)
+        return 2
+    if args.workers < 1 or args.commit_every < 1:
+        print("--workers 和 --commit-every 必须大于 0", file=sys.stderr)
         return 2
     try:
         values = _load_input_values(args.url, args.input)
@@ -185,7 +405,11 @@ def main() -> int:
         succeeded, skipped, failed = import_urls(
             account,
             urls,
-            delay_seconds=args.delay,
+            rate_limiter=rate_limiter_from_args(args),
+            workers=args.workers,
+            commit_every=args.commit_every,
+            checkpoint_path=args.checkpoint,
+            resume=args.resume,
         )
     except (OSError, ValueError) as error:
         print(f"导入失败: {error}", file=sys.stderr)
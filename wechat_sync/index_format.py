@@ -0,0 +1,7 @@
+"""Version of the account index layout, importable without the index store.
+
+Kept free of dependencies so light commands such as `initialize` can stamp
+new heads without loading the locking and tracing machinery.
+"""
+
+INDEX_VERSION = 6
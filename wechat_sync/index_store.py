@@ -0,0 +1,296 @@
+"""Account indexes sharded by publication month, shared by concurrent writers.
+
+`indexes/<slug>.json` is a small head file holding the account, cursors,
+pending and quarantine queues and, under `shards`, the article count of each
+month. The articles themselves live in `indexes/<slug>/<YYYY-MM>.json`, so a
+daily sync reads and rewrites only the months it touches. Heads from before
+sharding still carry an `articles` array; they load as-is and are split into
+shards on their first commit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from .index_format import INDEX_VERSION
+from .locking import INDEX_LOCK_ROOT, IndexLock
+from .tracing import span
+
+
+INDEX_ROOT = Path(__file__).resolve().parent / "indexes"
+# Entries whose publishedAt has no usable YYYY-MM prefix.
+UNDATED_SHARD = "undated"
+MONTH_RE = re.compile(r"^\d{4}-(?:0[1-9]|1[0-2])$")
+
+
+def article_month(entry: dict[str, Any]) -> str:
+    """Shard an index entry belongs to: the YYYY-MM of its publishedAt."""
+    month = str(entry.get("publishedAt") or "")[:7]
+    return month if MONTH_RE.match(month) else UNDATED_SHARD
+
+
+def _newest_first(months: Iterable[str]) -> list[str]:
+    return sorted(months, key=lambda month: (month != UNDATED_SHARD, month), reverse=True)
+
+
+def _sort_entries(entries: list[dict[str, Any]]) -> None:
+    entries.sort(key=lambda entry: str(entry.get("publishedAt", "")), reverse=True)
+
+
+def _dumps(payload: dict[str, Any]) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+
+
+def _parse(path: Path, payload: bytes) -> dict[str, Any]:
+    if not payload:
+        return {}
+    index = json.loads(payload.decode("utf-8"))
+    if not isinstance(index, dict):
+        raise ValueError(f"配置文件不是 JSON 对象: {path}")
+    return index
+
+
+def _read(path: Path) -> bytes:
+    return path.read_bytes() if path.exists() else b""
+
+
+def _write(path: Path, payload: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_suffix(".json.tmp")
+    temporary_path.write_bytes(payload)
+    temporary_path.replace(path)
+
+
+class IndexStore:
+    """One account index, loaded whole or month by month and committed under its lock.
+
+    `load` remembers a digest of the head it read. Every commit bumps the
+    head's `generation`, so the head changes even when only shards did, and a
+    changed digest means another writer committed in between: the head and
+    every month this store has loaded are then read again and handed to
+    `reapply`, which replays this writer's changes onto them. Only shards
+    whose bytes change are written; months never loaded are left alone.
+    """
+
+    def __init__(self, path: Path, lock_root: Path = INDEX_LOCK_ROOT) -> None:
+        self.path = path
+        self.shard_root = path.with_suffix("")
+        self._lock_root = lock_root
+        self._digest = ""
+        self._generation = 0
+        self._shards: dict[str, int] = {}
+        self._loaded: set[str] = set()
+        self.merges = 0
+
+    @property
+    def months(self) -> list[str]:
+        """Months that have a shard on disk, newest first."""
+        return _newest_first(self._shards)
+
+    @property
+    def article_count(self) -> int:
+        return sum(self._shards.values())
+
+    def load(self, *, lazy: bool = False) -> dict[str, Any]:
+        """Read the head and, unless `lazy`, every shard it lists.
+
+        A lazy index starts with an empty `articles` list; `load_months` adds
+        shards to it on demand.
+        """
+        payload = _read(self.path)
+        self._digest = hashlib.sha256(payload).hexdigest()
+        index, self._shards, self._loaded = self._assemble(
+            _parse(self.path, payload),
+            lazy=lazy,
+        )
+        self._generation = int(index.get("generation", 0))
+        return index
+
+    def load_months(self, index: dict[str, Any], months: Iterable[str]) -> list[dict[str, Any]]:
+        """Add the entries of shards not loaded yet to `index` and return them."""
+        added: list[dict[str, Any]] = []
+        for month in set(months) - self._loaded:
+            self._loaded.add(month)
+            if month in self._shards:
+                added.extend(self._read_shard(month))
+        if added:
+            entries = index.setdefault("articles", [])
+            entries.extend(added)
+            _sort_entries(entries)
+        return added
+
+    def commit(
+        self,
+        index: dict[str, Any],
+        reapply: Callable[[dict[str, Any]], dict[str, Any]],
+    ) -> dict[str, Any]:
+        with IndexLock(self.path.stem, self._lock_root) as lock, span(
+            "index.commit",
+            index=self.path.stem,
+        ) as commit_span:
+            current = _read(self.path)
+            merged = hashlib.sha256(current).hexdigest() != self._digest
+            if merged:
+                self.merges += 1
+                fresh, self._shards, loaded = self._assemble(
+                    _parse(self.path, current),
+                    lazy=True,
+                )
+                seen, self._loaded = self._loaded, loaded
+                self._generation = int(fresh.get("generation", 0))
+                # Reread exactly the months this writer has seen.
+                self.load_months(fresh, seen)
+                index = reapply(fresh)
+            written, shards = self._write_shards(index)
+            self._generation += 1
+            head = {key: value for key, value in index.items() if key != "articles"}
+            head["version"] = INDEX_VERSION
+            head["generation"] = self._generation
+            head["shards"] = {month: self._shards[month] for month in self.months}
+            payload = _dumps(head)
+            _write(self.path, payload)
+            written += len(payload)
+            self._digest = hashlib.sha256(payload).hexdigest()
+            commit_span.set(
+                waitSeconds=round(lock.waited, 3),
+                merged=merged,
+                shards=shards,
+                bytes=written,
+            )
+        return index
+
+    def stray_shards(self) -> list[Path]:
+        """Shard files on disk that the head does not list."""
+        if not self.shard_root.is_dir():
+            return []
+        return sorted(
+            path for path in self.shard_root.glob("*.json") if path.stem not in self._shards
+        )
+
+    def _assemble(
+        self,
+        head: dict[str, Any],
+        *,
+        lazy: bool,
+    ) -> tuple[dict[str, Any], dict[str, int], set[str]]:
+        index = {key: value for key, value in head.items() if key != "shards"}
+        raw_shards = head.get("shards")
+        if raw_shards is None:
+            # Unsharded head: every article is already here, so every month is loaded.
+            entries = index.setdefault("articles", [])
+            if not isinstance(entries, list):
+                raise ValueError(f"{self.path.name} 的 articles 字段不是数组")
+            shards: dict[str, int] = {}
+            for entry in entries:
+                if isinstance(entry, dict):
+                    month = article_month(entry)
+                    shards[month] = shards.get(month, 0) + 1
+            return index, shards, set(shards)
+        if not isinstance(raw_shards, dict):
+            raise ValueError(f"{self.path.name} 的 shards 字段不是对象")
+        shards = {str(month): int(count) for month, count in raw_shards.items()}
+        entries = [] if lazy else [
+            entry for month in _newest_first(shards) for entry in self._read_shard(month)
+        ]
+        _sort_entries(entries)
+        index["articles"] = entries
+        return index, shards, set() if lazy else set(shards)
+
+    def _read_shard(self, month: str) -> list[dict[str, Any]]:
+        path = self.shard_root / f"{month}.json"
+        shard = _parse(path, path.read_bytes())
+        entries = shard.get("articles")
+        if shard.get("month") != month or not isinstance(entries, list):
+            raise ValueError(f"索引分片结构无效: {path.name}")
+        for entry in entries:
+            if not isinstance(entry, dict) or article_month(entry) != month:
+                raise ValueError(f"索引分片 {path.name} 包含其他月份的文章")
+        return entries
+
+    def _write_shards(self, index: dict[str, Any]) -> tuple[int, int]:
+        """Write the months of `index` whose shard changed; return bytes and files written."""
+        entries = index.get("articles", [])
+        if not isinstance(entries, list):
+            raise ValueError(f"{self.path.name} 的 articles 字段不是数组")
+        grouped: dict[str, list[dict[str, Any]]] = {}
+        for entry in entries:
+            if isinstance(entry, dict):
+                grouped.setdefault(article_month(entry), []).append(entry)
+        # A month this writer never loaded may still hold entries on disk; keep them.
+        for month in (grouped.keys() - self._loaded) & self._shards.keys():
+            known = {str(entry.get("articleId", "")) for entry in grouped[month]}
+            grouped[month].extend(
+                entry
+                for entry in self._read_shard(month)
+                if str(entry.get("articleId", "")) not in known
+            )
+        written = files = 0
+        for month in self._loaded | grouped.keys():
+            path = self.shard_root / f"{month}.json"
+            month_entries = grouped.get(month, [])
+            if not month_entries:
+                if month in self._shards:
+                    path.unlink(missing_ok=True)
+                    self._shards.pop(month)
+                    files += 1
+                continue
+            _sort_entries(month_entries)
+            payload = _dumps({"month": month, "articles": month_entries})
+            if payload != _read(path):
+                _write(path, payload)
+                written += len(payload)
+                files += 1
+            self._shards[month] = len(month_entries)
+        self._loaded |= grouped.keys()
+        return written, files
+
+
+def migrate(index_path: Path) -> bool:
+    """Split an unsharded index into month shards; return whether anything changed."""
+    if "shards" in _parse(index_path, _read(index_path)):
+        return False
+    store = IndexStore(index_path)
+    store.commit(store.load(), lambda fresh: fresh)
+    return True
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="把账号索引拆分为头文件和按发布月份的分片")
+    parser.add_argument(
+        "--account",
+        action="append",
+        default=[],
+        help="只处理指定账号 slug；可重复使用，默认全部索引",
+    )
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    selected = set(args.account)
+    paths = [
+        path
+        for path in sorted(INDEX_ROOT.glob("*.json"))
+        if not selected or path.stem in selected
+    ]
+    for path in paths:
+        try:
+            changed = migrate(path)
+        except (OSError, ValueError) as error:
+            print(f"索引迁移失败 {path.name}: {error}", file=sys.stderr)
+            return 1
+        store = IndexStore(path)
+        store.load(lazy=True)
+        label = "已拆分" if changed else "无需改动"
+        print(f"{path.stem}: {label}，{len(store.months)} 个月份分片，{store.article_count} 篇文章")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
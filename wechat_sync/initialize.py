@@ -9,6 +9,8 @@ from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse
 
+from .index_format import INDEX_VERSION
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_ACCOUNT_FILE = PROJECT_ROOT / "wechat_sync" / "accounts.json"
@@ -107,7 +109,7 @@ def main() -> int:
             index_path.write_text(
                 json.dumps(
                     {
-                        "version": 4,
+                        "version": INDEX_VERSION,
                         "account": {
                             "slug": args.slug,
                             "name": args.name,
@@ -118,7 +120,8 @@ def main() -> int:
                         "backfillComplete": False,
                         "backfillNextPage": 1,
                         "pendingArticles": [],
-                        "articles": [],
+                        "quarantinedArticles": [],
+                        "shards": {},
                     },
                     ensure_ascii=False,
                     indent=2,
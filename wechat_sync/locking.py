@@ -0,0 +1,135 @@
+"""Advisory file locks that keep sync runs and index writers from overlapping."""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import TracebackType
+from typing import Optional
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_RUN_LOCK = PROJECT_ROOT / "data" / "wechat" / "sync.lock"
+# Outside wechat_sync/indexes so lock files are never committed with the indexes.
+INDEX_LOCK_ROOT = PROJECT_ROOT / "data" / "wechat" / "locks"
+
+
+class LockBusyError(RuntimeError):
+    """Another process already holds the lock."""
+
+
+class RunLock:
+    """Non-blocking exclusive flock; the kernel releases it if the holder dies."""
+
+    def __init__(self, path: Path = DEFAULT_RUN_LOCK) -> None:
+        self.path = path
+        self._handle: Optional[int] = None
+
+    def acquire(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        handle = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            holder = os.read(handle, 64).decode("ascii", "ignore").strip()
+            os.close(handle)
+            raise LockBusyError(
+                f"另一个同步进程正在运行（{self.path}，PID {holder or '未知'}）"
+            ) from None
+        os.ftruncate(handle, 0)
+        os.write(handle, f"{os.getpid()}\n".encode("ascii"))
+        self._handle = handle
+
+    def release(self) -> None:
+        if self._handle is None:
+            return
+        fcntl.flock(self._handle, fcntl.LOCK_UN)
+        os.close(self._handle)
+        self._handle = None
+
+    def __enter__(self) -> RunLock:
+        self.acquire()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.release()
+
+
+@dataclass
+class LockWaits:
+    acquisitions: int = 0
+    total_seconds: float = 0.0
+    longest_seconds: float = 0.0
+
+
+_waits: dict[str, LockWaits] = {}
+_waits_lock = threading.Lock()
+
+
+class IndexLock:
+    """Blocking exclusive flock for one account index; records how long it waited.
+
+    flock is per open file description, so threads of one process contend
+    for it exactly like separate processes do.
+    """
+
+    def __init__(self, name: str, root: Path = INDEX_LOCK_ROOT) -> None:
+        self.name = name
+        self.path = root / f"{name}.lock"
+        self.waited = 0.0
+        self._handle: Optional[int] = None
+
+    def acquire(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        handle = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        started = time.monotonic()
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        self.waited = time.monotonic() - started
+        self._handle = handle
+        with _waits_lock:
+            waits = _waits.setdefault(self.name, LockWaits())
+            waits.acquisitions += 1
+            waits.total_seconds += self.waited
+            waits.longest_seconds = max(waits.longest_seconds, self.waited)
+
+    def release(self) -> None:
+        if self._handle is None:
+            return
+        fcntl.flock(self._handle, fcntl.LOCK_UN)
+        os.close(self._handle)
+        self._handle = None
+
+    def __enter__(self) -> IndexLock:
+        self.acquire()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.release()
+
+
+def lock_wait_summary() -> Optional[str]:
+    """One line describing index lock waits so far in this process, if any lock was taken."""
+    with _waits_lock:
+        waits = {name: LockWaits(**vars(item)) for name, item in _waits.items()}
+    if not waits:
+        return None
+    parts = [
+        f"{name} {item.acquisitions} 次，共等待 {item.total_seconds:.2f} 秒"
+        f"（最长 {item.longest_seconds:.2f} 秒）"
+        for name, item in sorted(waits.items())
+    ]
+    return "索引锁：" + "；".join(parts)
@@ -0,0 +1,186 @@
+"""Describe which archive files a sync run added, changed or removed."""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from zoneinfo import ZoneInfo
+
+from .index_store import IndexStore
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+INDEX_ROOT = Path(__file__).resolve().parent / "indexes"
+DEFAULT_MANIFEST_PATH = PROJECT_ROOT / "data" / "wechat" / "change-manifest.json"
+WATCHED_ROOTS = {
+    "markdown": PROJECT_ROOT / "src" / "content" / "articles",
+    "sidecars": PROJECT_ROOT / "src" / "sidecars" / "articles",
+    "assets": PROJECT_ROOT / "public" / "article-assets",
+    "searchIndex": PROJECT_ROOT / "public" / "search-index",
+    "indexes": INDEX_ROOT,
+}
+MANIFEST_VERSION = 1
+SHANGHAI = ZoneInfo("Asia/Shanghai")
+FileState = tuple[int, int]
+
+
+def _snapshot(root: Path) -> dict[str, FileState]:
+    files: dict[str, FileState] = {}
+    if not root.exists():
+        return files
+    for path in root.rglob("*"):
+        relative = path.relative_to(root)
+        # Temporary asset directories and atomic-write files are never published.
+        if any(part.startswith(".") for part in relative.parts) or path.suffix == ".tmp":
+            continue
+        if path.is_file():
+            stat = path.stat()
+            files[path.relative_to(PROJECT_ROOT).as_posix()] = (
+                stat.st_size,
+                stat.st_mtime_ns,
+            )
+    return files
+
+
+def _markdown_key(markdown_path: str) -> str:
+    """Strip the YYYY-MM-DD- prefix the downloader puts before the asset key."""
+    return Path(markdown_path).stem.split("-", 3)[-1]
+
+
+def _indexed_articles(index_root: Path = INDEX_ROOT) -> dict[str, dict[str, str]]:
+    """Map each indexed Markdown path to its article ID, account and month."""
+    articles: dict[str, dict[str, str]] = {}
+    for index_path in sorted(index_root.glob("*.json")):
+        try:
+            entries = IndexStore(index_path).load()["articles"]
+        except (OSError, ValueError):
+            continue
+        for entry in entries:
+            if not isinstance(entry, dict) or not entry.get("markdownPath"):
+                continue
+            articles[str(entry["markdownPath"])] = {
+                "articleId": str(entry.get("articleId", "")),
+                "account": index_path.stem,
+                "publishedMonth": str(entry.get("publishedAt", ""))[:7],
+                "assetDirectory": _markdown_key(str(entry["markdownPath"])),
+            }
+    return articles
+
+
+def _asset_key(relative_path: str) -> str:
+    parts = relative_path.split("/")
+    return parts[2] if len(parts) > 3 else ""
+
+
+class ChangeTracker:
+    """Snapshot the archive before a run and diff it afterwards."""
+
+    def __init__(self, roots: dict[str, Path] = WATCHED_ROOTS) -> None:
+        self._roots = roots
+        self._before = {name: _snapshot(root) for name, root in roots.items()}
+        self._articles_before = _indexed_articles()
+
+    def manifest(self) -> dict[str, Any]:
+        files: dict[str, dict[str, list[str]]] = {}
+        for name, root in self._roots.items():
+            before = self._before[name]
+            after = _snapshot(root)
+            files[name] = {
+                "added": sorted(after.keys() - before.keys()),
+                "changed": sorted(
+                    path
+                    for path in after.keys() & before.keys()
+                    if after[path] != before[path]
+                ),
+                "removed": sorted(before.keys() - after.keys()),
+            }
+
+        articles_after = _indexed_articles()
+        article_changes: list[dict[str, str]] = []
+        for status, paths in files["markdown"].items():
+            for markdown_path in paths:
+                known = articles_after.get(markdown_path) or self._articles_before.get(
+                    markdown_path, {}
+                )
+                article_changes.append(
+                    {
+                        "status": status,
+                        "articleId": known.get("articleId", ""),
+                        "account": known.get("account", ""),
+                        "publishedMonth": known.get("publishedMonth")
+                        or Path(markdown_path).name[:7],
+                        "markdownPath": markdown_path,
+                    }
+                )
+
+        # Asset-only changes (for example a re-localized image) still affect a page.
+        changed_keys = {_markdown_key(item["markdownPath"]) for item in article_changes}
+        for paths in files["assets"].values():
+            for asset_path in paths:
+                key = _asset_key(asset_path)
+                if not key or key in changed_keys:
+                    continue
+                changed_keys.add(key)
+                known = next(
+                    (
+                        (markdown_path, value)
+                        for markdown_path, value in articles_after.items()
+                        if value["assetDirectory"] == key
+                    ),
+                    None,
+                )
+                if known is None:
+                    continue
+                markdown_path, value = known
+                article_changes.append(
+                    {
+                        "status": "changed",
+                        "articleId": value["articleId"],
+                        "account": value["account"],
+                        "publishedMonth": value["publishedMonth"],
+                        "markdownPath": markdown_path,
+                    }
+                )
+
+        article_changes.sort(key=lambda item: (item["markdownPath"], item["status"]))
+        return {
+            "version": MANIFEST_VERSION,
+            "generatedAt": datetime.now(tz=SHANGHAI).isoformat(),
+            "files": files,
+            "articles": article_changes,
+            "accounts": sorted(
+                {item["account"] for item in article_changes if item["account"]}
+            ),
+            "publishedMonths": sorted(
+                {item["publishedMonth"] for item in article_changes if item["publishedMonth"]}
+            ),
+            "searchScopes": sorted(
+                {
+                    path.split("/")[2]
+                    for paths in files["searchIndex"].values()
+                    for path in paths
+                    if path.count("/") >= 3
+                }
+            ),
+        }
+
+    def write(self, path: Path = DEFAULT_MANIFEST_PATH) -> dict[str, Any]:
+        manifest = self.manifest()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(path.name + ".tmp")
+        temporary_path.write_text(
+            json.dumps(manifest, ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+        temporary_path.replace(path)
+        return manifest
+
+
+def changed_file_count(manifest: dict[str, Any]) -> int:
+    return sum(
+        len(paths)
+        for groups in manifest.get("files", {}).values()
+        for paths in groups.values()
+    )
@@ -0,0 +1,186 @@
+"""Render sync-run metrics in the Prometheus textfile exposition format."""
+
+from __future__ import annotations
+
+import bisect
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        position = bisect.bisect_left(self.buckets, seconds)
+        if position < len(self.counts):
+            self.counts[position] += 1
+        self.count += 1
+        self.total += seconds
+
+    def lines(self, name: str, labels: dict[str, str]) -> list[str]:
+        lines: list[str] = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(
+                f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}"
+            )
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {self.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(self.total)}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+@dataclass(frozen=True)
+class AccountMetrics:
+    slug: str
+    archived: int
+    failed: int
+    sync_error: bool
+    pending: int
+    quarantined: int
+    backfill_complete: bool
+    backfill_next_page: int
+    backfill_has_offset: bool
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _family(
+    name: str,
+    kind: str,
+    description: str,
+    samples: Iterable[tuple[dict[str, str], float]],
+) -> list[str]:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+    return lines
+
+
+def render_textfile(
+    accounts: list[AccountMetrics],
+    request_latency: dict[str, LatencyHistogram],
+    failovers: dict[int, int],
+    quota_remaining: dict[tuple[int, str], float],
+    key_count: int,
+    started_at: float,
+    finished_at: float,
+) -> str:
+    lines: list[str] = []
+    lines += _family(
+        "wechat_sync_articles_archived",
+        "gauge",
+        "Articles archived by the last sync run.",
+        (({"account": item.slug}, item.archived) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_articles_failed",
+        "gauge",
+        "Articles that failed in the last sync run and stay pending.",
+        (({"account": item.slug}, item.failed) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_account_error",
+        "gauge",
+        "Whether the account sync aborted with an error (1) or not (0).",
+        (({"account": item.slug}, int(item.sync_error)) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_pending_articles",
+        "gauge",
+        "Articles queued in pendingArticles after the run.",
+        (({"account": item.slug}, item.pending) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_quarantined_articles",
+        "gauge",
+        "Articles moved to quarantinedArticles after repeated failures.",
+        (({"account": item.slug}, item.quarantined) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_backfill_complete",
+        "gauge",
+        "Whether history backfill has reached the last V2 page.",
+        (({"account": item.slug}, int(item.backfill_complete)) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_backfill_next_page",
+        "gauge",
+        "Approximate history page the next backfill resumes from.",
+        (({"account": item.slug}, item.backfill_next_page) for item in accounts),
+    )
+    lines += _family(
+        "wechat_sync_backfill_cursor_present",
+        "gauge",
+        "Whether a V2 backfill offset cursor is saved.",
+        (({"account": item.slug}, int(item.backfill_has_offset)) for item in accounts),
+    )
+
+    latency_name = "wechat_sync_rapidapi_request_duration_seconds"
+    lines += [
+        f"# HELP {latency_name} RapidAPI request latency by endpoint.",
+        f"# TYPE {latency_name} histogram",
+    ]
+    for endpoint, histogram in sorted(request_latency.items()):
+        lines += histogram.lines(latency_name, {"endpoint": endpoint})
+
+    lines += _family(
+        "wechat_sync_rapidapi_failovers",
+        "gauge",
+        "Times a key was skipped for auth, quota or rate-limit errors in the last run.",
+        (
+            ({"key": str(index + 1)}, failovers.get(index, 0))
+            for index in range(key_count)
+        ),
+    )
+    lines += _family(
+        "wechat_sync_rapidapi_ratelimit_remaining",
+        "gauge",
+        "Last x-ratelimit-*-remaining header seen for each key.",
+        (
+            ({"key": str(index + 1), "quota": quota}, value)
+            for (index, quota), value in sorted(quota_remaining.items())
+        ),
+    )
+    lines += _family(
+        "wechat_sync_last_run_timestamp_seconds",
+        "gauge",
+        "Unix time the last sync run finished.",
+        [({}, round(finished_at, 3))],
+    )
+    lines += _family(
+        "wechat_sync_last_run_duration_seconds",
+        "gauge",
+        "Wall-clock duration of the last sync run.",
+        [({}, round(finished_at - started_at, 3))],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: Path, text: str) -> None:
+    """Replace the file atomically so the node_exporter never reads half a run."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f".{path.name}.{int(time.time())}.tmp")
+    temporary_path.write_text(text, encoding="utf-8")
+    temporary_path.replace(path)
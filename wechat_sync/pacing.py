@@ -0,0 +1,181 @@
+"""Per-endpoint token buckets that pace RapidAPI, WeChat page and CDN requests."""
+
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+
+# RapidAPI history V2, RapidAPI detail V4, mp.weixin.qq.com pages, media CDN.
+ENDPOINTS = ("list", "detail", "article", "cdn")
+DEFAULT_PER_MINUTE = {"list": 30.0, "detail": 30.0, "article": 30.0, "cdn": 600.0}
+# The CDN serves a whole article's images back to back; the other hosts answer
+# bursts with 429s or WeChat's captcha page.
+DEFAULT_BURST = {"list": 1.0, "detail": 1.0, "article": 1.0, "cdn": 10.0}
+# A throttled bucket halves its rate down to this fraction of the configured
+# rate, then wins back this fraction per successful request.
+MIN_RATE_FRACTION = 1 / 16
+RECOVERY_FRACTION = 0.1
+# Tighten once a key has less than this share of a quota window left. Monthly
+# quotas are left to key failover; only windows resetting within the hour are
+# a pacing signal.
+QUOTA_PRESSURE = 0.1
+QUOTA_WINDOW_SECONDS = 3600
+ARTICLE_HOSTS = {"mp.weixin.qq.com"}
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: float = 1.0) -> None:
+        self.configured = per_minute
+        self.per_minute = per_minute
+        self.burst = max(1.0, burst)
+        self.waited = 0.0
+        self.throttled = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.configured <= 0
+
+    def acquire(self) -> None:
+        """Block until a token is free; time spent on the previous request counts."""
+        if self.unlimited:
+            return
+        with self._lock:
+            now = time.monotonic()
+            rate = self.per_minute / 60
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is this caller's place in the queue.
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def tighten(self) -> None:
+        if self.unlimited:
+            return
+        with self._lock:
+            self.throttled += 1
+            self.per_minute = max(
+                self.configured * MIN_RATE_FRACTION,
+                self.per_minute / 2,
+            )
+
+    def recover(self) -> None:
+        if self.unlimited or self.per_minute >= self.configured:
+            return
+        with self._lock:
+            self.per_minute = min(
+                self.configured,
+                self.per_minute + self.configured * RECOVERY_FRACTION,
+            )
+
+
+class RateLimiter:
+    """One token bucket per endpoint, shared by every thread of a run."""
+
+    def __init__(
+        self,
+        per_minute: Optional[dict[str, float]] = None,
+        burst: Optional[dict[str, float]] = None,
+    ) -> None:
+        rates = {**DEFAULT_PER_MINUTE, **(per_minute or {})}
+        bursts = {**DEFAULT_BURST, **(burst or {})}
+        self._buckets = {
+            endpoint: TokenBucket(rates[endpoint], bursts[endpoint])
+            for endpoint in ENDPOINTS
+        }
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        return self._buckets[endpoint]
+
+    def acquire(self, endpoint: str) -> None:
+        self._buckets[endpoint].acquire()
+
+    def acquire_url(self, url: str) -> None:
+        self.acquire(endpoint_for_url(url))
+
+    def record(self, endpoint: str, status_code: int) -> None:
+        if status_code == 429:
+            self._buckets[endpoint].tighten()
+        elif status_code < 400:
+            self._buckets[endpoint].recover()
+
+    def record_url(self, url: str, status_code: int) -> None:
+        self.record(endpoint_for_url(url), status_code)
+
+    def record_quota(
+        self,
+        endpoint: str,
+        remaining: float,
+        limit: float,
+        reset_seconds: float,
+    ) -> None:
+        if (
+            0 < reset_seconds <= QUOTA_WINDOW_SECONDS
+            and limit > 0
+            and remaining < limit * QUOTA_PRESSURE
+        ):
+            self._buckets[endpoint].tighten()
+
+    def summary(self) -> str:
+        parts = []
+        for endpoint, bucket in self._buckets.items():
+            if bucket.unlimited:
+                continue
+            rate = f"{bucket.per_minute:g}/{bucket.configured:g}"
+            detail = f"{endpoint} {rate} 次/分钟，等待 {bucket.waited:.1f} 秒"
+            if bucket.throttled:
+                detail += f"，收紧 {bucket.throttled} 次"
+            parts.append(detail)
+        return "；".join(parts)
+
+
+def endpoint_for_url(url: str) -> str:
+    return "article" if urlsplit(url).netloc.lower() in ARTICLE_HOSTS else "cdn"
+
+
+def add_rate_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("请求速率")
+    for endpoint, label in (
+        ("list", "RapidAPI 历史文章 V2"),
+        ("detail", "RapidAPI 文章详情 V4"),
+        ("article", "mp.weixin.qq.com 文章页"),
+        ("cdn", "微信图片和媒体 CDN"),
+    ):
+        group.add_argument(
+            f"--{endpoint}-rpm",
+            type=float,
+            default=DEFAULT_PER_MINUTE[endpoint],
+            help=f"{label} 每分钟最多发起的请求数，0 表示不限速"
+            f"（默认 {DEFAULT_PER_MINUTE[endpoint]:g}）",
+        )
+    group.add_argument(
+        "--delay",
+        type=float,
+        help="兼容旧参数：等价于把列表、详情和文章页速率都设为每分钟 60/DELAY 次",
+    )
+
+
+def rate_limiter_from_args(args: argparse.Namespace) -> RateLimiter:
+    per_minute = {endpoint: getattr(args, f"{endpoint}_rpm") for endpoint in ENDPOINTS}
+    if args.delay is not None:
+        delay_rate = 60 / args.delay if args.delay > 0 else 0.0
+        per_minute.update(list=delay_rate, detail=delay_rate, article=delay_rate)
+    return RateLimiter(per_minute)
+
+
+def rate_argument_error(args: argparse.Namespace) -> Optional[str]:
+    if args.delay is not None and args.delay < 0:
+        return "--delay 不能小于 0"
+    for endpoint in ENDPOINTS:
+        if getattr(args, f"{endpoint}_rpm") < 0:
+            return f"--{endpoint}-rpm 不能小于 0"
+    return None
@@ -0,0 +1,126 @@
+"""Assets already fetched for an article whose localization has not finished."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PARTIAL_ASSET_ROOT = PROJECT_ROOT / "data" / "wechat" / "partial-assets"
+MANIFEST_NAME = ".partial.json"
+# Media streamed into `<stem>.part` resumes from that file with an HTTP Range request.
+PART_SUFFIX = ".part"
+# Stands in for images not yet localized; the fragment names the asset stem.
+PENDING_ASSET = "/pending-image.svg"
+
+
+def file_sha256(path: Path) -> hashlib._Hash:
+    """A sha256 fed with the file's bytes, ready to be updated further."""
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        # Chunked, because staged media can run to hundreds of MiB.
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest
+
+
+def _digest(path: Path) -> str:
+    return file_sha256(path).hexdigest()
+
+
+def pending_asset_path(stem: str) -> str:
+    return f"{PENDING_ASSET}#{stem}"
+
+
+class PartialAssets:
+    """Manifest of the files in one staging directory, keyed by asset stem.
+
+    Each entry records the source URL, its canonical asset key, the file name
+    and a SHA-256 digest. Files without a valid entry are removed on load,
+    except unfinished `.part` downloads, so the directory never holds a
+    completed file the manifest cannot vouch for. Entries are kept in memory
+    and written by `save`, which callers run when an attempt fails.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._path = directory / MANIFEST_NAME
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+        try:
+            entries = json.loads(self._path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entries = {}
+        self._entries: dict[str, dict[str, str]] = {
+            stem: entry
+            for stem, entry in (entries.items() if isinstance(entries, dict) else [])
+            if isinstance(entry, dict) and self._intact(entry)
+        }
+        self._prune({entry["file"] for entry in self._entries.values()}, keep_parts=True)
+        self._dirty = False
+
+    @property
+    def count(self) -> int:
+        return len(self._entries)
+
+    def reuse(self, stem: str, key: str) -> Optional[str]:
+        """File name of the asset fetched earlier for this stem and key, if any."""
+        with self._lock:
+            entry = self._entries.get(stem)
+        if entry is None or entry.get("key") != key:
+            return None
+        return entry["file"]
+
+    def record(self, stem: str, url: str, key: str, filename: str, sha256: str) -> None:
+        """Remember a file just written to the staging directory, hashed as it was written."""
+        entry = {"url": url, "key": key, "file": filename, "sha256": sha256}
+        with self._lock:
+            previous = self._entries.get(stem)
+            self._entries[stem] = entry
+            self._dirty = True
+        if previous is not None and previous["file"] != filename:
+            (self.directory / previous["file"]).unlink(missing_ok=True)
+
+    def save(self) -> None:
+        """Write the manifest if an entry was recorded since the last save."""
+        with self._lock:
+            if self._dirty:
+                self._write()
+                self._dirty = False
+
+    def finish(self, keep: set[str]) -> None:
+        """Drop the manifest and any file not in `keep` before the directory is published."""
+        with self._lock:
+            self._prune(keep)
+            self._path.unlink(missing_ok=True)
+            self._dirty = False
+
+    def _intact(self, entry: dict[str, str]) -> bool:
+        filename = str(entry.get("file") or "")
+        path = self.directory / filename
+        if not filename or "/" in filename or not path.is_file():
+            return False
+        try:
+            return _digest(path) == entry.get("sha256")
+        except OSError:
+            return False
+
+    def _prune(self, keep: set[str], *, keep_parts: bool = False) -> None:
+        for path in self.directory.iterdir():
+            if path.name == MANIFEST_NAME or path.name in keep:
+                continue
+            if keep_parts and path.suffix == PART_SUFFIX:
+                continue
+            path.unlink(missing_ok=True)
+
+    def _write(self) -> None:
+        temporary_path = self._path.with_name(self._path.name + ".tmp")
+        temporary_path.write_text(
+            json.dumps(self._entries, ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+            encoding="utf-8",
+        )
+        temporary_path.replace(self._path)
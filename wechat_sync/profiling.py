@@ -0,0 +1,100 @@
+"""Shared --profile option for the wechat_sync command-line entry points."""
+
+from __future__ import annotations
+
+import argparse
+import io
+import sys
+from pathlib import Path
+from typing import Callable
+
+
+PROFILE_MODES = ("cpu", "alloc")
+ALLOCATION_FRAMES = 10
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("性能分析")
+    group.add_argument(
+        "--profile",
+        type=Path,
+        help="在分析器下运行命令并把结果写入该文件，同时生成同名 .txt 热点摘要",
+    )
+    group.add_argument(
+        "--profile-mode",
+        choices=PROFILE_MODES,
+        default="cpu",
+        help="cpu 使用 cProfile 记录函数耗时；alloc 使用 tracemalloc 记录内存分配位置",
+    )
+    group.add_argument(
+        "--profile-top",
+        type=int,
+        default=25,
+        help="摘要中列出的热点数量（默认 25）",
+    )
+
+
+def _cpu_profile(path: Path, top: int, command: Callable[[], int]) -> tuple[int, str]:
+    # Imported here: every CLI loads this module, but few runs are profiled.
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(command)
+    finally:
+        profiler.create_stats()
+        profiler.dump_stats(path)
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output).strip_dirs()
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    return result, output.getvalue()
+
+
+def _allocation_profile(path: Path, top: int, command: Callable[[], int]) -> tuple[int, str]:
+    import tracemalloc
+
+    tracemalloc.start(ALLOCATION_FRAMES)
+    try:
+        result = command()
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot.dump(str(path))
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        )
+    )
+    lines = [f"峰值已分配内存 {peak / 1024 / 1024:.1f} MiB；结束时仍存活的最大分配位置："]
+    for position, statistic in enumerate(snapshot.statistics("traceback")[:top], start=1):
+        frame = statistic.traceback[-1]
+        lines.append(
+            f"{position:>3}. {statistic.size / 1024:>10.1f} KiB  "
+            f"{statistic.count:>8} 块  {frame.filename}:{frame.lineno}"
+        )
+        callers = list(statistic.traceback)[-3:-1]
+        lines.extend(
+            f"       ← {caller.filename}:{caller.lineno}" for caller in reversed(callers)
+        )
+    return result, "\n".join(lines) + "\n"
+
+
+def run_profiled(args: argparse.Namespace, command: Callable[[], int]) -> int:
+    """Run `command` directly, or under the profiler chosen by --profile-mode."""
+    if args.profile is None:
+        return command()
+    args.profile.parent.mkdir(parents=True, exist_ok=True)
+    top = max(1, args.profile_top)
+    if args.profile_mode == "alloc":
+        result, summary = _allocation_profile(args.profile, top, command)
+    else:
+        result, summary = _cpu_profile(args.profile, top, command)
+    summary_path = args.profile.with_name(args.profile.name + ".txt")
+    summary_path.write_text(summary, encoding="utf-8")
+    print(summary, file=sys.stderr)
+    print(f"性能分析结果已写入 {args.profile}，摘要 {summary_path}", file=sys.stderr)
+    return result
@@ -0,0 +1,47 @@
+"""Compressed copies of the source payload behind every archived article."""
+
+from __future__ import annotations
+
+import gzip
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RAW_ARCHIVE_ROOT = PROJECT_ROOT / "data" / "wechat" / "raw"
+RAW_VERSION = 1
+RAW_SUFFIX = ".json.gz"
+
+
+def raw_path(article_key: str, root: Path = RAW_ARCHIVE_ROOT) -> Path:
+    return root / f"{article_key}{RAW_SUFFIX}"
+
+
+def write_raw(article_key: str, record: dict[str, Any], root: Path = RAW_ARCHIVE_ROOT) -> None:
+    """Store one article's payload, replacing any earlier copy atomically."""
+    path = raw_path(article_key, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # mtime=0 keeps the bytes stable when the payload has not changed.
+    payload = gzip.compress(
+        json.dumps({"version": RAW_VERSION, **record}, ensure_ascii=False).encode("utf-8"),
+        compresslevel=9,
+        mtime=0,
+    )
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_bytes(payload)
+    temporary_path.replace(path)
+
+
+def read_raw(path: Path) -> dict[str, Any]:
+    try:
+        payload = json.loads(gzip.decompress(path.read_bytes()).decode("utf-8"))
+    except (OSError, EOFError, ValueError) as error:
+        raise ValueError(f"{path.name} 不是有效的原始归档: {error}") from error
+    if not isinstance(payload, dict) or payload.get("version") != RAW_VERSION:
+        raise ValueError(f"{path.name} 的原始归档版本不受支持")
+    return payload
+
+
+def raw_paths(root: Path = RAW_ARCHIVE_ROOT) -> Iterator[Path]:
+    yield from sorted(root.glob(f"*{RAW_SUFFIX}"))
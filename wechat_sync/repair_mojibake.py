@@ -5,7 +5,6 @@ from __future__ import annotations
 import argparse
 import re
 import shutil
-import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any
@@ -18,13 +17,22 @@ from .downloader import (
     DownloadedArticle,
     WeChatArticleDownloader,
 )
+from .index_store import IndexStore
+from .locking import lock_wait_summary
+from .pacing import (
+    RateLimiter,
+    add_rate_arguments,
+    rate_argument_error,
+    rate_limiter_from_args,
+)
+from .profiling import add_profile_arguments, run_profiled
+from .search_index import SearchIndex
+from .sidecars import remove_sidecar
 from .sync import (
     INDEX_ROOT,
     PROJECT_ROOT,
     SHANGHAI,
     _load_accounts,
-    _load_json,
-    _save_index,
     _timestamp,
 )
 
@@ -98,6 +106,7 @@ def _remove_entry_files(entry: dict[str, Any]) -> None:
     markdown_path = _entry_path(entry)
     if markdown_path.is_file() and markdown_path.is_relative_to(DEFAULT_CONTENT_DIR):
         markdown_path.unlink()
+        remove_sidecar(markdown_path)
 
     cover = str(entry.get("cover") or "")
     if cover.startswith("/article-assets/"):
@@ -106,10 +115,11 @@ def _remove_entry_files(entry: dict[str, Any]) -> None:
             shutil.rmtree(asset_dir)
 
 
-def repair_account(slug: str, delay_seconds: float) -> tuple[int, int]:
+def repair_account(slug: str, rate_limiter: RateLimiter) -> tuple[int, int]:
     account = _load_accounts({slug})[0]
     index_path = INDEX_ROOT / f"{slug}.json"
-    index = _load_json(index_path)
+    store = IndexStore(index_path)
+    index = store.load()
     entries = index.get("articles")
     if not isinstance(entries, list):
         raise ValueError(f"{index_path.name} 的 articles 必须是数组")
@@ -136,8 +146,12 @@ def repair_account(slug: str, delay_seconds: float) -> tuple[int, int]:
             )
         replacements[str(entry["articleId"])] = replacement
 
-    client = RapidAPIClient(load_api_key_pool())
-    downloader = WeChatArticleDownloader()
+    client = RapidAPIClient(load_api_key_pool(), rate_limiter=rate_limiter)
+    search_index = SearchIndex()
+    downloader = WeChatArticleDownloader(
+        search_index=search_index,
+        rate_limiter=rate_limiter,
+    )
     refreshed: dict[str, dict[str, Any]] = {}
     replacement_ids = {str(entry["articleId"]) for entry in replacements.values()}
     for position, article_id in enumerate(sorted(replacement_ids), start=1):
@@ -148,26 +162,28 @@ def repair_account(slug: str, delay_seconds: float) -> tuple[int, int]:
         downloaded = downloader.download_detail(summary, account.name, detail)
         refreshed[article_id] = _replacement_entry(downloaded)
 
-        if position < len(replacement_ids) and delay_seconds:
-            time.sleep(delay_seconds)
-
     corrupt_ids = {str(entry["articleId"]) for entry in corrupt}
-    next_entries: list[dict[str, Any]] = []
-    for entry in entries:
-        if not isinstance(entry, dict):
-            continue
-        article_id = str(entry.get("articleId") or "")
-        if article_id in corrupt_ids:
-            continue
-        next_entries.append(refreshed.get(article_id, entry))
+
+    def rebuild(base: dict[str, Any]) -> dict[str, Any]:
+        next_entries: list[dict[str, Any]] = []
+        for entry in base.get("articles") or []:
+            if not isinstance(entry, dict):
+                continue
+            article_id = str(entry.get("articleId") or "")
+            if article_id in corrupt_ids:
+                continue
+            next_entries.append(refreshed.get(article_id, entry))
+        next_entries.sort(key=lambda entry: str(entry.get("publishedAt", "")), reverse=True)
+        base["articles"] = next_entries
+        base["updatedAt"] = datetime.now(tz=SHANGHAI).isoformat()
+        return base
 
     for entry in corrupt:
         _remove_entry_files(entry)
+        search_index.remove_article(_entry_path(entry), account.name)
 
-    next_entries.sort(key=lambda entry: str(entry.get("publishedAt", "")), reverse=True)
-    index["articles"] = next_entries
-    index["updatedAt"] = datetime.now(tz=SHANGHAI).isoformat()
-    _save_index(index_path, index)
+    # Another writer may have committed meanwhile; rebuild is replayed on its copy.
+    store.commit(rebuild(index), rebuild)
     print(
         f"[{account.name}] 重新下载 {len(refreshed)} 篇，"
         f"删除乱码重复条目 {len(corrupt)} 篇"
@@ -178,20 +194,29 @@ def repair_account(slug: str, delay_seconds: float) -> tuple[int, int]:
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="重新下载并清理乱码公众号文章")
     parser.add_argument("--account", required=True, help="目标公众号 slug")
-    parser.add_argument("--delay", type=float, default=2.0, help="文章间隔秒数")
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
     return parser
 
 
 def main() -> int:
     args = build_parser().parse_args()
-    if args.delay < 0:
-        print("--delay 不能小于 0")
+    return run_profiled(args, lambda: _run(args))
+
+
+def _run(args: argparse.Namespace) -> int:
+    rate_error = rate_argument_error(args)
+    if rate_error is not None:
+        print(rate_error)
         return 2
     try:
-        repair_account(args.account, args.delay)
+        repair_account(args.account, rate_limiter_from_args(args))
     except (OSError, ValueError, RuntimeError) as error:
         print(f"乱码修复失败: {error}")
         return 1
+    lock_waits = lock_wait_summary()
+    if lock_waits is not None:
+        print(lock_waits)
     return 0
 
 
@@ -0,0 +1,225 @@
+"""Rebuild archived articles from their raw payloads without touching the network."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from .downloader import (
+    DEFAULT_ASSET_ROOT,
+    DEFAULT_CONTENT_DIR,
+    ArticleDownloadError,
+    WeChatArticleDownloader,
+)
+from .profiling import add_profile_arguments, run_profiled
+from .raw_archive import RAW_ARCHIVE_ROOT, raw_paths, read_raw
+from .search_index import SearchIndex
+from .sidecars import write_sidecar
+from .sync import PROJECT_ROOT, _load_accounts
+
+
+@dataclass(frozen=True)
+class RenderedArticle:
+    raw_name: str
+    markdown_path: Optional[Path] = None
+    markdown: str = ""
+    source_name: str = ""
+    title: str = ""
+    description: str = ""
+    published_at: Optional[datetime] = None
+    body_html: str = ""
+    error: str = ""
+
+
+@dataclass(frozen=True)
+class RenderFilter:
+    source_names: frozenset[str] = frozenset()
+    article_ids: frozenset[str] = frozenset()
+    since: Optional[date] = None
+
+    def matches(self, record: dict[str, Any]) -> bool:
+        if self.source_names and str(record.get("sourceName") or "") not in self.source_names:
+            return False
+        if self.article_ids and str(record.get("articleId") or "") not in self.article_ids:
+            return False
+        if self.since is not None:
+            published_at = datetime.fromisoformat(str(record.get("publishedAt")))
+            if published_at.date() < self.since:
+                return False
+        return True
+
+
+# One offline downloader per worker process, built by the pool initializer.
+_downloader: Optional[WeChatArticleDownloader] = None
+_filter = RenderFilter()
+
+
+def _start_worker(
+    content_dir: Path,
+    asset_root: Path,
+    render_filter: RenderFilter,
+) -> None:
+    global _downloader, _filter
+    # Writes stay in the parent; workers only parse and render.
+    _downloader = WeChatArticleDownloader(
+        content_dir=content_dir,
+        asset_root=asset_root,
+        sidecar_root=None,
+        raw_root=None,
+    )
+    _filter = render_filter
+
+
+def _render(path: Path) -> Optional[RenderedArticle]:
+    assert _downloader is not None
+    try:
+        record = read_raw(path)
+        if not _filter.matches(record):
+            return None
+        downloaded, markdown = _downloader.rerender(record)
+    except (ArticleDownloadError, KeyError, ValueError) as error:
+        return RenderedArticle(raw_name=path.name, error=str(error))
+    return RenderedArticle(
+        raw_name=path.name,
+        markdown_path=downloaded.markdown_path,
+        markdown=markdown,
+        source_name=str(record.get("sourceName") or ""),
+        title=downloaded.title,
+        description=downloaded.description,
+        published_at=downloaded.published_at,
+        body_html=downloaded.body_html,
+    )
+
+
+def rerender(
+    render_filter: RenderFilter,
+    *,
+    raw_root: Path = RAW_ARCHIVE_ROOT,
+    content_dir: Path = DEFAULT_CONTENT_DIR,
+    asset_root: Path = DEFAULT_ASSET_ROOT,
+    workers: int = 1,
+    dry_run: bool = False,
+) -> tuple[int, int, int]:
+    """Re-render matching raw archives; return articles changed, unchanged and failed."""
+    changed = unchanged = failed = 0
+    search_index = SearchIndex(autoflush=False)
+    paths = list(raw_paths(raw_root))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_start_worker,
+        initargs=(content_dir, asset_root, render_filter),
+    ) as executor:
+        for rendered in executor.map(_render, paths, chunksize=8):
+            if rendered is None:
+                continue
+            if rendered.error or rendered.markdown_path is None:
+                failed += 1
+                print(f"- {rendered.raw_name}: {rendered.error}", file=sys.stderr)
+                continue
+            markdown_path = rendered.markdown_path
+            if (
+                markdown_path.exists()
+                and markdown_path.read_text(encoding="utf-8") == rendered.markdown
+            ):
+                unchanged += 1
+                continue
+            changed += 1
+            print(f"- {markdown_path.relative_to(PROJECT_ROOT)}")
+            if dry_run:
+                continue
+            markdown_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = markdown_path.with_suffix(".md.tmp")
+            temporary_path.write_text(rendered.markdown, encoding="utf-8")
+            temporary_path.replace(markdown_path)
+            write_sidecar(markdown_path, rendered.markdown)
+            assert rendered.published_at is not None
+            search_index.add_article(
+                markdown_path,
+                rendered.source_name,
+                title=rendered.title,
+                description=rendered.description,
+                published_at=rendered.published_at,
+                body_html=rendered.body_html,
+            )
+    search_index.flush()
+    return changed, unchanged, failed
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="用本地原始归档离线重新生成文章 Markdown")
+    parser.add_argument(
+        "--account",
+        action="append",
+        default=[],
+        help="只处理指定账号 slug；可重复使用，默认全部账号",
+    )
+    parser.add_argument(
+        "--article",
+        action="append",
+        default=[],
+        help="只处理指定文章 ID；可重复使用",
+    )
+    parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        help="只处理该日期（YYYY-MM-DD）及之后发布的文章",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="并行渲染的进程数（默认 CPU 核数）",
+    )
+    parser.add_argument("--raw-root", type=Path, default=RAW_ARCHIVE_ROOT)
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="只列出输出会变化的文章，不写入文件",
+    )
+    add_profile_arguments(parser)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    return run_profiled(args, lambda: _run(args))
+
+
+def _run(args: argparse.Namespace) -> int:
+    if args.workers < 1:
+        print("--workers 必须大于 0", file=sys.stderr)
+        return 2
+    try:
+        source_names = (
+            frozenset(account.name for account in _load_accounts(set(args.account)))
+            if args.account
+            else frozenset()
+        )
+        changed, unchanged, failed = rerender(
+            RenderFilter(
+                source_names=source_names,
+                article_ids=frozenset(args.article),
+                since=args.since,
+            ),
+            raw_root=args.raw_root,
+            workers=args.workers,
+            dry_run=args.dry_run,
+        )
+    except (OSError, ValueError) as error:
+        print(f"重新渲染失败: {error}", file=sys.stderr)
+        return 1
+    print(
+        f"{'将更新' if args.dry_run else '已更新'} {changed} 篇，"
+        f"输出未变化 {unchanged} 篇，失败 {failed} 篇"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
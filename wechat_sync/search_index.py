@@ -0,0 +1,603 @@
+"""Build the sharded full-text search index served to the site search dialog."""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import heapq
+import json
+import re
+import sys
+import threading
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo
+
+from .locking import INDEX_LOCK_ROOT, IndexLock
+from .sidecars import fresh_sidecar, plain_text, split_markdown
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CONFIG_PATH = Path(__file__).resolve().parent / "accounts.json"
+CONTENT_ROOT = PROJECT_ROOT / "src" / "content"
+DEFAULT_INDEX_ROOT = PROJECT_ROOT / "public" / "search-index"
+# Builder bookkeeping (keys, fingerprints, buckets) is committed but never deployed.
+DEFAULT_STATE_ROOT = PROJECT_ROOT / "data" / "search-index"
+LEGACY_STATE_NAME = "_state.json"
+# Taken inside a scope's lock whenever manifest.json is rewritten.
+MANIFEST_LOCK_NAME = "search-manifest"
+SHARD_NAME_RE = re.compile(r"[0-9a-f]{2}")
+INDEX_VERSION = 2
+# Shards are keyed by the first code point of a term, so every term sharing a
+# prefix character lives in one file and single-character queries stay cheap.
+SHARD_COUNT = 64
+# Result rows show one or two lines of description; the full text is indexed.
+DESCRIPTION_PREVIEW_CHARS = 100
+SHANGHAI = ZoneInfo("Asia/Shanghai")
+TOKEN_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+
+@dataclass(frozen=True)
+class SearchDocument:
+    scope: str
+    key: str
+    title: str
+    description: str
+    date: str
+    href: str
+    kind: str
+    source: str
+    label: str
+    text: str
+
+    def metadata(self) -> dict[str, str]:
+        return {
+            "title": self.title,
+            "description": self.description[:DESCRIPTION_PREVIEW_CHARS],
+            "date": self.date,
+            "href": self.href,
+            "kind": self.kind,
+            "source": self.source,
+            "label": self.label,
+        }
+
+    def fingerprint(self) -> str:
+        payload = json.dumps(
+            [INDEX_VERSION, self.metadata(), self.description, self.text],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def normalize(value: str) -> str:
+    return unicodedata.normalize("NFKC", value).lower()
+
+
+def terms(value: str) -> set[str]:
+    """Split text into CJK unigrams, bigrams and Latin tokens, matching the client.
+
+    Every CJK character is also indexed on its own so that a one-character
+    query finds it at the end of a run, where it starts no bigram.
+    """
+    found: set[str] = set()
+    for match in TOKEN_RE.finditer(normalize(value)):
+        token = match.group(0)
+        if not CJK_RE.match(token):
+            found.add(token)
+            continue
+        found.update(token)
+        found.update(token[offset : offset + 2] for offset in range(len(token) - 1))
+    return found
+
+
+def shard_of(term: str) -> int:
+    return ord(term[0]) % SHARD_COUNT
+
+
+def _shard_name(bucket: int) -> str:
+    return f"{bucket:02x}.json"
+
+
+def _write_json(path: Path, payload: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n",
+        encoding="utf-8",
+    )
+    temporary_path.replace(path)
+
+
+def _read_json(path: Path, default: Any) -> Any:
+    if not path.exists():
+        return default
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def content_id(path: Path) -> str:
+    """Approximate the id Astro's glob loader derives from a file name."""
+    return path.stem.lower()
+
+
+def _display_date(value: Any) -> str:
+    try:
+        published_at = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return ""
+    if published_at.tzinfo is not None:
+        published_at = published_at.astimezone(SHANGHAI)
+    return published_at.strftime("%Y.%m.%d")
+
+
+def account_slugs(config_path: Path = CONFIG_PATH) -> dict[str, str]:
+    payload = _read_json(config_path, {})
+    accounts = payload.get("accounts", []) if isinstance(payload, dict) else []
+    return {
+        str(item.get("name", "")).strip(): str(item.get("slug", "")).strip()
+        for item in accounts
+        if isinstance(item, dict) and item.get("name") and item.get("slug")
+    }
+
+
+def article_scope(source_slug: str) -> str:
+    return f"wechat-{source_slug}"
+
+
+def article_document(
+    markdown_path: Path,
+    source_slug: str,
+    *,
+    title: str,
+    description: str,
+    published_at: Any,
+    source_name: str,
+    text: str,
+) -> SearchDocument:
+    return SearchDocument(
+        scope=article_scope(source_slug),
+        key=markdown_path.stem,
+        title=title,
+        description=description,
+        date=_display_date(published_at),
+        href=f"/articles/{content_id(markdown_path)}/",
+        kind="wechat",
+        source=source_slug,
+        label=source_name,
+        text=text,
+    )
+
+
+def _read_document(path: Path) -> tuple[dict[str, Any], str]:
+    """Return frontmatter and plain text, preferring an up-to-date sidecar."""
+    markdown = path.read_text(encoding="utf-8")
+    frontmatter, body = split_markdown(markdown)
+    sidecar = fresh_sidecar(path, markdown)
+    return frontmatter, sidecar["text"] if sidecar else plain_text(body)
+
+
+def _article_documents(root: Path, slugs: dict[str, str]) -> Iterator[SearchDocument]:
+    for path in sorted(root.glob("*.md")):
+        frontmatter, text = _read_document(path)
+        source_name = str(frontmatter.get("source", ""))
+        yield article_document(
+            path,
+            slugs.get(source_name, "wechat"),
+            title=str(frontmatter.get("title", "")),
+            description=str(frontmatter.get("description", "")),
+            published_at=frontmatter.get("publishedAt", ""),
+            source_name=source_name,
+            text=text,
+        )
+
+
+def _report_documents(root: Path) -> Iterator[SearchDocument]:
+    for path in sorted(root.glob("*.md")):
+        frontmatter, text = _read_document(path)
+        yield SearchDocument(
+            scope="report",
+            key=path.stem,
+            title=str(frontmatter.get("title", "")),
+            description=str(frontmatter.get("description", "")),
+            date=_display_date(frontmatter.get("publishedAt", "")),
+            href=f"/reports/{frontmatter.get('reportId', path.stem)}/",
+            kind="report",
+            source="",
+            label=str(frontmatter.get("category", "")),
+            text=text,
+        )
+
+
+def _note_documents(root: Path) -> Iterator[SearchDocument]:
+    for path in sorted(root.glob("*.md")):
+        frontmatter, text = _read_document(path)
+        yield SearchDocument(
+            scope="note",
+            key=path.stem,
+            title=str(frontmatter.get("title", "")),
+            description=str(frontmatter.get("description", "")),
+            date=_display_date(frontmatter.get("publishedAt", "")),
+            href=f"/notes/{content_id(path)}/",
+            kind="note",
+            source="",
+            label="投资随笔",
+            text=text,
+        )
+
+
+def corpus_documents(content_root: Path = CONTENT_ROOT) -> Iterator[SearchDocument]:
+    yield from _article_documents(content_root / "articles", account_slugs())
+    yield from _report_documents(content_root / "reports")
+    yield from _note_documents(content_root / "notes")
+
+
+def _document_terms(document: SearchDocument) -> set[str]:
+    return terms(
+        " ".join(
+            (
+                document.date,
+                document.label,
+                document.title,
+                document.description,
+                document.text,
+            )
+        )
+    )
+
+
+class _Scope:
+    """One scope's document table, bookkeeping and lazily loaded shards.
+
+    Slots freed by removed documents are reused by the next upsert; any
+    still empty at flush time are compacted away, so docs.json never ships
+    null rows to the browser.
+
+    Every flush bumps `generation` in the state file. Upserts and removals
+    since the last flush are kept in `pending`, so a writer that finds the
+    generation moved can replay them onto a freshly loaded scope.
+    """
+
+    def __init__(self, root: Path, name: str, state_root: Path) -> None:
+        self.root = root / name
+        self.name = name
+        self.state_path = state_root / f"{name}.json"
+        self.documents: list[Optional[dict[str, str]]] = _read_json(
+            self.root / "docs.json", []
+        )
+        # State used to live next to the shards under public/; move it on the next flush.
+        self.legacy_state_path = self.root / LEGACY_STATE_NAME
+        state = self._read_state()
+        self.generation = int(state.get("generation", 0))
+        # Latest change per key since the last flush; None marks a removal.
+        self.pending: dict[str, Optional[SearchDocument]] = {}
+        self.keys: dict[str, int] = {
+            str(key): int(value) for key, value in state.get("keys", {}).items()
+        }
+        self.fingerprints: dict[str, str] = dict(state.get("fingerprints", {}))
+        self.buckets: dict[str, list[int]] = {
+            str(key): list(value) for key, value in state.get("buckets", {}).items()
+        }
+        self.shards: dict[int, dict[str, list[int]]] = {}
+        self.dirty_shards: set[int] = set()
+        self.free_slots = [slot for slot, item in enumerate(self.documents) if item is None]
+        heapq.heapify(self.free_slots)
+        self.dirty = bool(self.free_slots) or self.legacy_state_path.exists()
+
+    def _read_state(self) -> dict[str, Any]:
+        if self.state_path.exists() or not self.legacy_state_path.exists():
+            return _read_json(self.state_path, {})
+        return _read_json(self.legacy_state_path, {})
+
+    def stale(self) -> bool:
+        """Whether another writer flushed this scope since it was loaded."""
+        return int(self._read_state().get("generation", 0)) != self.generation
+
+    def replay(self, pending: dict[str, Optional[SearchDocument]]) -> None:
+        for key, document in pending.items():
+            if document is None:
+                self.remove(key)
+            else:
+                self.upsert(document)
+
+    def shard(self, bucket: int) -> dict[str, list[int]]:
+        if bucket not in self.shards:
+            self.shards[bucket] = _read_json(self.root / _shard_name(bucket), {})
+        return self.shards[bucket]
+
+    def remove(self, key: str) -> bool:
+        slot = self.keys.pop(key, None)
+        if slot is None:
+            return False
+        for bucket in self.buckets.pop(key, []):
+            shard = self.shard(bucket)
+            for term in [term for term, postings in shard.items() if slot in postings]:
+                postings = [value for value in shard[term] if value != slot]
+                if postings:
+                    shard[term] = postings
+                else:
+                    del shard[term]
+            self.dirty_shards.add(bucket)
+        self.documents[slot] = None
+        heapq.heappush(self.free_slots, slot)
+        self.fingerprints.pop(key, None)
+        self.pending[key] = None
+        self.dirty = True
+        return True
+
+    def upsert(self, document: SearchDocument) -> bool:
+        fingerprint = document.fingerprint()
+        if self.fingerprints.get(document.key) == fingerprint:
+            return False
+        self.remove(document.key)
+        if self.free_slots:
+            slot = heapq.heappop(self.free_slots)
+            self.documents[slot] = document.metadata()
+        else:
+            slot = len(self.documents)
+            self.documents.append(document.metadata())
+        self.keys[document.key] = slot
+        self.fingerprints[document.key] = fingerprint
+        buckets: set[int] = set()
+        for term in _document_terms(document):
+            bucket = shard_of(term)
+            bisect.insort(self.shard(bucket).setdefault(term, []), slot)
+            buckets.add(bucket)
+        self.buckets[document.key] = sorted(buckets)
+        self.dirty_shards.update(buckets)
+        self.pending[document.key] = document
+        self.dirty = True
+        return True
+
+    def _compact(self) -> None:
+        """Renumber slots densely; every shard's postings are rewritten."""
+        renumbered: dict[int, int] = {}
+        documents: list[Optional[dict[str, str]]] = []
+        for slot, item in enumerate(self.documents):
+            if item is not None:
+                renumbered[slot] = len(documents)
+                documents.append(item)
+        for bucket in self._bucket_files():
+            shard = self.shard(bucket)
+            for term, postings in shard.items():
+                shard[term] = [renumbered[slot] for slot in postings]
+            self.dirty_shards.add(bucket)
+        self.documents = documents
+        self.keys = {key: renumbered[slot] for key, slot in self.keys.items()}
+        self.free_slots = []
+
+    def _bucket_files(self) -> set[int]:
+        on_disk = {
+            int(path.stem, 16)
+            for path in self.root.glob("*.json")
+            if SHARD_NAME_RE.fullmatch(path.stem)
+        }
+        return on_disk | set(self.shards)
+
+    def flush(self) -> None:
+        if not self.dirty:
+            return
+        if self.free_slots:
+            self._compact()
+        for bucket in sorted(self.dirty_shards):
+            shard = self.shards[bucket]
+            path = self.root / _shard_name(bucket)
+            if shard:
+                _write_json(path, dict(sorted(shard.items())))
+            elif path.exists():
+                path.unlink()
+        _write_json(self.root / "docs.json", self.documents)
+        self.generation += 1
+        _write_json(
+            self.state_path,
+            {
+                "generation": self.generation,
+                "keys": dict(sorted(self.keys.items())),
+                "fingerprints": dict(sorted(self.fingerprints.items())),
+                "buckets": dict(sorted(self.buckets.items())),
+            },
+        )
+        self.legacy_state_path.unlink(missing_ok=True)
+        self.dirty_shards.clear()
+        self.pending.clear()
+        self.dirty = False
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "documents": len(self.keys),
+            "shards": sorted(
+                int(path.stem, 16)
+                for path in self.root.glob("*.json")
+                if SHARD_NAME_RE.fullmatch(path.stem)
+            ),
+        }
+
+
+class SearchIndex:
+    """Incrementally maintained inverted index under public/search-index.
+
+    Several processes may write one scope. Each flush holds that scope's
+    `IndexLock`; if another writer flushed in between, the scope is read
+    again and this writer's pending changes are replayed onto it, as
+    `IndexStore.commit` does for account indexes.
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_INDEX_ROOT,
+        *,
+        autoflush: bool = True,
+        state_root: Path = DEFAULT_STATE_ROOT,
+        lock_root: Path = INDEX_LOCK_ROOT,
+    ) -> None:
+        self._root = root
+        self._state_root = state_root
+        self._lock_root = lock_root
+        self._autoflush = autoflush
+        self._scopes: dict[str, _Scope] = {}
+        self._slugs: Optional[dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def _scope(self, name: str) -> _Scope:
+        if name not in self._scopes:
+            self._scopes[name] = _Scope(self._root, name, self._state_root)
+        return self._scopes[name]
+
+    def scope_names(self) -> list[str]:
+        manifest = _read_json(self._root / "manifest.json", {})
+        names = set(manifest.get("scopes", {})) | set(self._scopes)
+        return sorted(names)
+
+    def keys(self, scope: str) -> set[str]:
+        with self._lock:
+            return set(self._scope(scope).keys)
+
+    def upsert(self, document: SearchDocument) -> bool:
+        with self._lock:
+            changed = self._scope(document.scope).upsert(document)
+            if changed and self._autoflush:
+                self._flush()
+            return changed
+
+    def remove(self, scope: str, key: str) -> bool:
+        with self._lock:
+            changed = self._scope(scope).remove(key)
+            if changed and self._autoflush:
+                self._flush()
+            return changed
+
+    def add_article(
+        self,
+        markdown_path: Path,
+        source_name: str,
+        *,
+        title: str,
+        description: str,
+        published_at: datetime,
+        body_html: str,
+    ) -> bool:
+        """Index a freshly archived WeChat article under its account scope."""
+        if self._slugs is None:
+            self._slugs = account_slugs()
+        document = article_document(
+            markdown_path,
+            self._slugs.get(source_name, "wechat"),
+            title=title,
+            description=description,
+            published_at=published_at.isoformat(),
+            source_name=source_name,
+            text=plain_text(body_html),
+        )
+        return self.upsert(document)
+
+    def remove_article(self, markdown_path: Path, source_name: str) -> bool:
+        if self._slugs is None:
+            self._slugs = account_slugs()
+        scope = article_scope(self._slugs.get(source_name, "wechat"))
+        return self.remove(scope, markdown_path.stem)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        for name, scope in list(self._scopes.items()):
+            if not scope.dirty:
+                continue
+            with IndexLock(f"search-{name}", self._lock_root):
+                if scope.stale():
+                    fresh = _Scope(self._root, name, self._state_root)
+                    fresh.replay(scope.pending)
+                    self._scopes[name] = scope = fresh
+                scope.flush()
+                with IndexLock(MANIFEST_LOCK_NAME, self._lock_root):
+                    self._write_manifest(scope)
+
+    def _write_manifest(self, scope: _Scope) -> None:
+        manifest = _read_json(self._root / "manifest.json", {})
+        scopes = dict(manifest.get("scopes", {}))
+        scopes[scope.name] = scope.summary()
+        _write_json(
+            self._root / "manifest.json",
+            {
+                "version": INDEX_VERSION,
+                "shardCount": SHARD_COUNT,
+                "scopes": dict(sorted(scopes.items())),
+            },
+        )
+
+
+def synchronize_corpus(
+    index: SearchIndex,
+    documents: Iterable[SearchDocument],
+) -> tuple[int, int]:
+    """Upsert changed documents and drop ones whose source file disappeared."""
+    seen: dict[str, set[str]] = {}
+    updated = 0
+    for document in documents:
+        seen.setdefault(document.scope, set()).add(document.key)
+        if index.upsert(document):
+            updated += 1
+    removed = 0
+    for scope in set(index.scope_names()) | set(seen):
+        for key in index.keys(scope) - seen.get(scope, set()):
+            if index.remove(scope, key):
+                removed += 1
+    return updated, removed
+
+
+def rebuild(
+    root: Path = DEFAULT_INDEX_ROOT,
+    state_root: Path = DEFAULT_STATE_ROOT,
+) -> tuple[int, int]:
+    for path in [*root.glob("*/*.json"), *state_root.glob("*.json")]:
+        path.unlink()
+    index = SearchIndex(root, autoflush=False, state_root=state_root)
+    result = synchronize_corpus(index, corpus_documents())
+    index.flush()
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="增量更新站内全文搜索分片索引")
+    parser.add_argument("--output", type=Path, default=DEFAULT_INDEX_ROOT)
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=DEFAULT_STATE_ROOT,
+        help="构建用的键、指纹和分片记录目录，不随站点发布",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="删除现有分片并从全部文章、研报和随笔重新生成",
+    )
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    try:
+        if args.rebuild:
+            updated, removed = rebuild(args.output, args.state)
+        else:
+            index = SearchIndex(args.output, autoflush=False, state_root=args.state)
+            updated, removed = synchronize_corpus(index, corpus_documents())
+            index.flush()
+    except (OSError, ValueError) as error:
+        print(f"搜索索引更新失败: {error}", file=sys.stderr)
+        return 1
+    total_bytes = sum(path.stat().st_size for path in args.output.rglob("*.json"))
+    print(
+        f"搜索索引已更新：写入 {updated} 篇，移除 {removed} 篇，"
+        f"分片共 {total_bytes / 1024:.0f} KiB"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+"""Write plain-text and statistics sidecars next to the content collections."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import json
+import math
+import re
+import sys
+from pathlib import Path
+from typing import Any, Optional
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CONTENT_ROOT = PROJECT_ROOT / "src" / "content"
+SIDECAR_ROOT = PROJECT_ROOT / "src" / "sidecars"
+COLLECTIONS = ("articles", "reports", "notes")
+# Version 2 moved the plain text out of the JSON into a `.txt` next to it, so
+# the site build imports only the small statistics.
+SIDECAR_VERSION = 2
+STYLE_BLOCK_RE = re.compile(r"<style\b[^>]*>.*?</style>", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+WHITESPACE_RE = re.compile(r"\s+")
+HAN_RE = re.compile(r"[\u3400-\u9fff]")
+IMAGE_RE = re.compile(r"<(?:img|image)\b|!\[[^\]]*\]\(", re.IGNORECASE)
+
+
+def plain_text(value: str) -> str:
+    """Mirror `plainText` in src/lib/articles.ts for HTML article bodies."""
+    text = TAG_RE.sub(" ", STYLE_BLOCK_RE.sub(" ", value))
+    text = html.unescape(text).replace("\xa0", " ")
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def split_markdown(source: str) -> tuple[dict[str, Any], str]:
+    """Split the flat frontmatter this repository writes from the body."""
+    if not source.startswith("---\n"):
+        return {}, source
+    end = source.find("\n---\n", 4)
+    if end < 0:
+        return {}, source
+    frontmatter: dict[str, Any] = {}
+    for line in source[4:end].splitlines():
+        if not line or line.startswith((" ", "\t", "-")) or ":" not in line:
+            continue
+        key, raw_value = line.split(":", 1)
+        raw_value = raw_value.strip()
+        try:
+            frontmatter[key.strip()] = json.loads(raw_value)
+        except ValueError:
+            frontmatter[key.strip()] = raw_value
+    return frontmatter, source[end + 5 :]
+
+
+def source_hash(markdown: str) -> str:
+    return hashlib.sha256(markdown.encode("utf-8")).hexdigest()[:20]
+
+
+def reading_minutes(text: str) -> int:
+    """Mirror `readingMinutes` in src/lib/articles.ts."""
+    han_characters = len(HAN_RE.findall(text))
+    words = len(HAN_RE.sub(" ", text).split())
+    return max(1, math.ceil((han_characters + words * 2) / 400))
+
+
+def document_sidecar(markdown: str) -> dict[str, Any]:
+    _, body = split_markdown(markdown)
+    text = plain_text(body)
+    return {
+        "version": SIDECAR_VERSION,
+        "sourceHash": source_hash(markdown),
+        "characters": len(text),
+        "hanCharacters": len(HAN_RE.findall(text)),
+        "images": len(IMAGE_RE.findall(body)),
+        "readingMinutes": reading_minutes(text),
+        "text": text,
+    }
+
+
+def sidecar_path(markdown_path: Path, root: Path = SIDECAR_ROOT) -> Path:
+    return root / markdown_path.parent.name / f"{markdown_path.stem}.json"
+
+
+def text_path(markdown_path: Path, root: Path = SIDECAR_ROOT) -> Path:
+    return sidecar_path(markdown_path, root).with_suffix(".txt")
+
+
+def load_sidecar(markdown_path: Path, root: Path = SIDECAR_ROOT) -> Optional[dict[str, Any]]:
+    """The statistics with the plain text from the `.txt` merged back in as `text`."""
+    path = sidecar_path(markdown_path, root)
+    if not path.is_file():
+        return None
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if "text" not in payload:
+        try:
+            payload["text"] = text_path(markdown_path, root).read_text(encoding="utf-8")
+        except OSError:
+            return None
+    return payload
+
+
+def fresh_sidecar(markdown_path: Path, markdown: str) -> Optional[dict[str, Any]]:
+    """Return the stored sidecar only if it still describes `markdown`."""
+    payload = load_sidecar(markdown_path)
+    if (
+        payload is None
+        or payload.get("version") != SIDECAR_VERSION
+        or payload.get("sourceHash") != source_hash(markdown)
+    ):
+        return None
+    return payload
+
+
+def _write_text(path: Path, value: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(value, encoding="utf-8")
+    temporary_path.replace(path)
+
+
+def write_sidecar(
+    markdown_path: Path,
+    markdown: Optional[str] = None,
+    root: Path = SIDECAR_ROOT,
+) -> bool:
+    """Write the sidecar for one Markdown file; return whether it changed."""
+    if markdown is None:
+        markdown = markdown_path.read_text(encoding="utf-8")
+    payload = document_sidecar(markdown)
+    current = load_sidecar(markdown_path, root)
+    if current == payload:
+        return False
+    text = payload.pop("text")
+    if (
+        current is None
+        or current.get("version") != SIDECAR_VERSION
+        or current.get("text") != text
+    ):
+        _write_text(text_path(markdown_path, root), text)
+    # The statistics go last: their sourceHash vouches for the text beside them.
+    _write_text(
+        sidecar_path(markdown_path, root),
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n",
+    )
+    return True
+
+
+def remove_sidecar(markdown_path: Path, root: Path = SIDECAR_ROOT) -> None:
+    sidecar_path(markdown_path, root).unlink(missing_ok=True)
+    text_path(markdown_path, root).unlink(missing_ok=True)
+
+
+def backfill(
+    collections: tuple[str, ...] = COLLECTIONS,
+    content_root: Path = CONTENT_ROOT,
+    root: Path = SIDECAR_ROOT,
+) -> tuple[int, int, int]:
+    """Bring every sidecar in line with its Markdown file."""
+    written = unchanged = removed = 0
+    for collection in collections:
+        markdown_paths = sorted((content_root / collection).glob("*.md"))
+        for markdown_path in markdown_paths:
+            if write_sidecar(markdown_path, root=root):
+                written += 1
+            else:
+                unchanged += 1
+        expected = {path.stem for path in markdown_paths}
+        for path in sorted([*(root / collection).glob("*.json"), *(root / collection).glob("*.txt")]):
+            if path.stem not in expected:
+                path.unlink()
+                removed += 1
+    return written, unchanged, removed
+
+
+def stale_sidecars(
+    collections: tuple[str, ...] = COLLECTIONS,
+    content_root: Path = CONTENT_ROOT,
+) -> list[Path]:
+    stale: list[Path] = []
+    for collection in collections:
+        for markdown_path in sorted((content_root / collection).glob("*.md")):
+            markdown = markdown_path.read_text(encoding="utf-8")
+            if fresh_sidecar(markdown_path, markdown) is None:
+                stale.append(markdown_path)
+    return stale
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="生成文章、研报和随笔的纯文本统计旁路文件")
+    parser.add_argument(
+        "--collection",
+        action="append",
+        choices=COLLECTIONS,
+        default=[],
+        help="只处理指定内容集合；可重复使用，默认处理全部",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="只检查旁路文件是否与 Markdown 一致，不写入",
+    )
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    collections = tuple(args.collection) or COLLECTIONS
+    try:
+        if args.check:
+            stale = stale_sidecars(collections)
+            for path in stale:
+                print(f"- {path.relative_to(PROJECT_ROOT)}", file=sys.stderr)
+            if stale:
+                print(f"{len(stale)} 个旁路文件缺失或过期", file=sys.stderr)
+                return 1
+            print("旁路文件与 Markdown 一致")
+            return 0
+        written, unchanged, removed = backfill(collections)
+    except (OSError, ValueError) as error:
+        print(f"旁路文件生成失败: {error}", file=sys.stderr)
+        return 1
+    print(f"旁路文件已更新：写入 {written} 个，未变化 {unchanged} 个，删除 {removed} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
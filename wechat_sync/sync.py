@@ -6,17 +6,58 @@ import argparse
 import json
 import os
 import re
+import signal
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
 from dataclasses import dataclass
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from types import FrameType
+from typing import Any, Callable, Generator, Iterable, Iterator, Optional
 from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from zoneinfo import ZoneInfo
 
-from .client import RapidAPIClient, RapidAPIError, load_api_key_pool
-from .downloader import ArticleSummary, WeChatArticleDownloader
+from .client import (
+    HistoryPage,
+    RapidAPIClient,
+    RapidAPIError,
+    RapidAPIKeyError,
+    load_api_key_pool,
+)
+from .downloader import (
+    ArticleSummary,
+    DownloadedArticle,
+    HtmlProcessPool,
+    WeChatArticleDownloader,
+)
+from .hedging import (
+    HedgePolicy,
+    LatencyHistory,
+    add_hedge_arguments,
+    hedge_argument_error,
+    hedge_policy_from_args,
+)
+from .image_meta import placeholders_available
+from .index_format import INDEX_VERSION
+from .index_store import IndexStore
+from .locking import LockBusyError, RunLock, lock_wait_summary
+from .manifest import DEFAULT_MANIFEST_PATH, ChangeTracker, changed_file_count
+from .metrics import AccountMetrics, render_textfile, write_textfile
+from .pacing import (
+    RateLimiter,
+    add_rate_arguments,
+    rate_argument_error,
+    rate_limiter_from_args,
+)
+from .profiling import add_profile_arguments, run_profiled
+from .search_index import SearchIndex
+from .tracing import disable as disable_tracing
+from .tracing import enable as enable_tracing
+from .tracing import span, write_step_summary
 
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -25,6 +66,15 @@ INDEX_ROOT = Path(__file__).resolve().parent / "indexes"
 SHANGHAI = ZoneInfo("Asia/Shanghai")
 MAX_LIST_PAGES_PER_ACCOUNT = 40
 SLUG_RE = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)*$")
+# Failed pending articles wait 1h, 2h, 4h, ... before the next paid detail call.
+RETRY_BASE_DELAY = timedelta(hours=1)
+RETRY_MAX_DELAY = timedelta(days=7)
+QUARANTINE_AFTER_ATTEMPTS = 6
+ERROR_MESSAGE_LIMIT = 300
+# Planning estimate before the first article of a run has been measured.
+DEFAULT_ARTICLE_SECONDS = 60.0
+# Left for the final index save, change manifest and metrics after the last article.
+TIME_BUDGET_RESERVE_SECONDS = 30.0
 
 
 @dataclass(frozen=True)
@@ -36,6 +86,77 @@ class AccountConfig:
     reported_count: Optional[int]
 
 
+@dataclass(frozen=True)
+class RetryState:
+    attempts: int = 0
+    last_error: str = ""
+    last_error_message: str = ""
+    next_attempt_at: Optional[datetime] = None
+
+    def eligible(self, now: datetime) -> bool:
+        return self.next_attempt_at is None or self.next_attempt_at <= now
+
+
+class TimeBudget:
+    """Wall-clock deadline for one run, planned from measured article durations.
+
+    Without a limit it never runs out but still counts articles carried over
+    by a stop request.
+    """
+
+    def __init__(self, seconds: Optional[float] = None) -> None:
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.carried_over = 0
+        self._durations: list[float] = []
+
+    @property
+    def limited(self) -> bool:
+        return self.deadline is not None
+
+    def remaining(self) -> float:
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - time.monotonic() - TIME_BUDGET_RESERVE_SECONDS
+
+    def record(self, seconds: float) -> None:
+        self._durations.append(seconds)
+
+    def article_estimate(self) -> float:
+        if not self._durations:
+            return DEFAULT_ARTICLE_SECONDS
+        # A high percentile rather than the mean: one slow image-heavy article
+        # past the deadline costs more than stopping one article early.
+        ordered = sorted(self._durations)
+        return ordered[int(0.9 * (len(ordered) - 1))]
+
+    def fits(self) -> bool:
+        return self.remaining() >= self.article_estimate()
+
+    def planned(self, count: int) -> int:
+        return min(count, max(0, int(self.remaining() // self.article_estimate())))
+
+
+def request_count(client: RapidAPIClient) -> int:
+    """RapidAPI requests the client has sent, hedges and failovers included."""
+    return sum(histogram.count for histogram in list(client.request_latency.values()))
+
+
+class RequestBudget:
+    """RapidAPI requests one run may still send, counted on the client it uses."""
+
+    def __init__(self, client: RapidAPIClient, allowance: int) -> None:
+        self._client = client
+        self._started_at = request_count(client)
+        self.allowance = allowance
+
+    @property
+    def used(self) -> int:
+        return request_count(self._client) - self._started_at
+
+    def fits(self) -> bool:
+        return self.used < self.allowance
+
+
 @dataclass(frozen=True)
 class CollectionState:
     articles: list[ArticleSummary]
@@ -44,13 +165,26 @@ class CollectionState:
     backfill_offset: str
 
 
-def _write_actions_outputs(succeeded: int, failed: int) -> None:
+def _write_actions_outputs(
+    succeeded: int,
+    failed: int,
+    manifest_path: Optional[Path] = None,
+    manifest: Optional[dict[str, Any]] = None,
+    carried_over: int = 0,
+) -> None:
     output_path = os.environ.get("GITHUB_OUTPUT", "").strip()
     if not output_path:
         return
     with Path(output_path).open("a", encoding="utf-8") as output:
         output.write(f"articles_synced={succeeded}\n")
         output.write(f"articles_failed={failed}\n")
+        output.write(f"articles_carried_over={carried_over}\n")
+        if manifest_path is not None and manifest is not None:
+            output.write(f"change_manifest={manifest_path}\n")
+            output.write(f"changed_files={changed_file_count(manifest)}\n")
+            output.write(
+                f"changed_months={','.join(manifest['publishedMonths'])}\n"
+            )
 
 
 def _load_json(path: Path) -> dict[str, Any]:
@@ -179,37 +313,106 @@ def _url_key(value: str) -> str:
     return urlunsplit((parsed.scheme, parsed.netloc, parsed.path, parsed.query, ""))
 
 
-def _is_indexed(
-    article: ArticleSummary,
-    indexed_ids: set[str],
-    indexed_urls: set[str],
-    indexed_title_dates: set[tuple[str, date]],
-) -> bool:
-    return (
-        article.article_id in indexed_ids
-        or _url_key(article.url) in indexed_urls
-        or (article.title, article.published_at.date()) in indexed_title_dates
-    )
+class IndexedArticles:
+    """Dedup keys of an account's archived articles, loading month shards on a miss.
+
+    Keys start from the months the index has loaded. A lookup that misses
+    loads the shards within a day of the article's publication time first,
+    so an already archived article is usually found without reading further.
+    Only when those miss too is every remaining shard loaded, so an article
+    archived under another date is still matched by its ID or URL before it
+    is treated as new. That happens at most once per index.
+    """
+
+    def __init__(self, store: IndexStore, index: dict[str, Any]) -> None:
+        self._store = store
+        self._index = index
+        self.ids: set[str] = set()
+        self.urls: set[str] = set()
+        self.title_dates: set[tuple[str, date]] = set()
+        self.add(index.get("articles") or [])
+
+    def add(self, entries: Iterable[Any]) -> None:
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            article_id = str(entry.get("articleId", "")).strip()
+            if article_id:
+                self.ids.add(article_id)
+            if str(entry.get("sourceUrl", "")).strip():
+                self.urls.add(_url_key(str(entry.get("sourceUrl", ""))))
+            title = str(entry.get("title", "")).strip()
+            if title and entry.get("publishedAt") is not None:
+                self.title_dates.add((title, _timestamp(entry.get("publishedAt")).date()))
+
+    def known(self, article: ArticleSummary) -> bool:
+        """Whether the keys loaded so far already cover the article."""
+        return (
+            article.article_id in self.ids
+            or _url_key(article.url) in self.urls
+            or (article.title, article.published_at.date()) in self.title_dates
+        )
+
+    def __contains__(self, article: ArticleSummary) -> bool:
+        if self.known(article):
+            return True
+        months = {
+            (article.published_at + timedelta(days=offset)).strftime("%Y-%m")
+            for offset in (-1, 0, 1)
+        }
+        self.add(self._store.load_months(self._index, months))
+        if self.known(article):
+            return True
+        self.add(self._store.load_months(self._index, self._store.months))
+        return self.known(article)
 
 
-def _pending_record(article: ArticleSummary) -> dict[str, str]:
-    return {
+def _pending_record(
+    article: ArticleSummary,
+    retry: RetryState = RetryState(),
+) -> dict[str, Any]:
+    record: dict[str, Any] = {
         "articleId": article.article_id,
         "title": article.title,
         "url": article.url,
         "coverUrl": article.cover_url,
         "publishedAt": article.published_at.isoformat(),
     }
+    if retry.last_error:
+        record["attempts"] = retry.attempts
+        record["lastError"] = retry.last_error
+        record["lastErrorMessage"] = retry.last_error_message
+    if retry.next_attempt_at is not None:
+        record["nextAttemptAt"] = retry.next_attempt_at.isoformat()
+    return record
+
+
+def _retry_state(item: dict[str, Any]) -> RetryState:
+    next_attempt_at = item.get("nextAttemptAt")
+    return RetryState(
+        attempts=max(0, int(item.get("attempts") or 0)),
+        last_error=str(item.get("lastError") or ""),
+        last_error_message=str(item.get("lastErrorMessage") or ""),
+        next_attempt_at=_timestamp(next_attempt_at) if next_attempt_at else None,
+    )
 
 
-def _save_index(path: Path, index: dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    temporary_path = path.with_suffix(".json.tmp")
-    temporary_path.write_text(
-        json.dumps(index, ensure_ascii=False, indent=2) + "\n",
-        encoding="utf-8",
+def _failed_attempt(retry: RetryState, error: Exception, now: datetime) -> RetryState:
+    if isinstance(error, RapidAPIKeyError):
+        # The whole key pool is exhausted; the article itself is not to blame.
+        return RetryState(
+            attempts=retry.attempts,
+            last_error=type(error).__name__,
+            last_error_message=str(error)[:ERROR_MESSAGE_LIMIT],
+        )
+    attempts = retry.attempts + 1
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return RetryState(
+        attempts=attempts,
+        last_error=type(error).__name__,
+        last_error_message=str(error)[:ERROR_MESSAGE_LIMIT],
+        next_attempt_at=(now + delay).replace(microsecond=0),
     )
-    temporary_path.replace(path)
 
 
 def _collection_state(
@@ -230,14 +433,11 @@ def _collection_state(
 def _collect_articles(
     client: RapidAPIClient,
     account: AccountConfig,
-    indexed_ids: set[str],
-    indexed_urls: set[str],
-    indexed_title_dates: set[tuple[str, date]],
+    indexed: IndexedArticles,
     backfill_complete: bool,
     backfill_next_page: int,
     backfill_offset: str,
     max_pages: int,
-    delay_seconds: float,
 ) -> CollectionState:
     collected: dict[str, ArticleSummary] = {}
     offset = ""
@@ -247,7 +447,13 @@ def _collect_articles(
     # Incremental sync starts at the newest V2 cursor; persisted cursors remain
     # reserved for explicit historical backfills.
     for page_position in range(1, max_pages + 1):
-        history_page = client.fetch_history_page(account.seed_article_url, offset)
+        with span(
+            "sync.list_page",
+            account=account.slug,
+            page=page_position,
+        ) as page_span:
+            history_page = client.fetch_history_page(account.seed_article_url, offset)
+            page_span.set(rows=len(history_page.rows))
         page_articles = [_normalize_article(row) for row in history_page.rows]
         if not page_articles:
             if page_position == 1:
@@ -266,9 +472,7 @@ def _collect_articles(
         for article in page_articles:
             if (
                 article.published_at.date() >= account.earliest
-                and not _is_indexed(
-                    article, indexed_ids, indexed_urls, indexed_title_dates
-                )
+                and article not in indexed
             ):
                 collected[_url_key(article.url)] = article
 
@@ -278,9 +482,7 @@ def _collect_articles(
                 for article in page_articles
             )
             or any(
-                _is_indexed(
-                    article, indexed_ids, indexed_urls, indexed_title_dates
-                )
+                article in indexed
                 for article in page_articles
             )
             or history_page.is_end
@@ -290,8 +492,6 @@ def _collect_articles(
             break
 
         offset = history_page.next_offset
-        if page_position < max_pages:
-            time.sleep(delay_seconds)
 
     if not reached_incremental_boundary:
         raise RapidAPIError(
@@ -307,71 +507,115 @@ def _collect_articles(
     )
 
 
-def _collect_history_articles(
+def _history_pages(
     client: RapidAPIClient,
     account: AccountConfig,
-    indexed_ids: set[str],
-    indexed_urls: set[str],
-    indexed_title_dates: set[tuple[str, date]],
+    indexed: IndexedArticles,
     backfill_offset: str,
     backfill_next_page: int,
     max_pages: int,
-    delay_seconds: float,
-) -> CollectionState:
-    collected: dict[str, ArticleSummary] = {}
+) -> Generator[CollectionState, None, None]:
+    """Yield V2 history pages one at a time, fetching the next page in the background.
+
+    Each yielded state carries only that page's new articles and the cursor just
+    past it, so the caller can persist the cursor once those articles are
+    archived or queued. Closing the generator abandons any prefetch in flight.
+    """
+    closing_event = threading.Event()
+
+    def fetch(cursor: str, page: int) -> Optional[HistoryPage]:
+        if closing_event.is_set():
+            return None
+        with span("sync.history_page", account=account.slug, page=page) as page_span:
+            history_page = client.fetch_history_page(account.seed_article_url, cursor)
+            page_span.set(rows=len(history_page.rows))
+        return history_page
+
     offset = backfill_offset
     page_number = backfill_next_page if offset else 1
-    backfill_complete = False
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-prefetch")
+    try:
+        future = executor.submit(fetch, offset, page_number)
+        for page_position in range(1, max_pages + 1):
+            try:
+                history_page = future.result()
+            except RapidAPIError:
+                if page_position == 1:
+                    raise
+                print(
+                    f"[{account.name}] V2 历史列表额度已停止本批回补，"
+                    f"断点保留在第 {page_number} 页"
+                )
+                return
+            if history_page is None:
+                return
 
-    for page_position in range(1, max_pages + 1):
-        try:
-            history_page = client.fetch_history_page(
-                account.seed_article_url,
-                offset,
-            )
-        except RapidAPIError:
-            if page_position == 1:
-                raise
-            print(
-                f"[{account.name}] V2 历史列表额度已停止本批回补，"
-                f"断点保留在第 {page_number} 页"
+            page_articles = [_normalize_article(row) for row in history_page.rows]
+            fresh = [
+                article
+                for article in page_articles
+                if article.published_at.date() >= account.earliest
+                and article not in indexed
+            ]
+            reached_boundary = any(
+                article.published_at.date() < account.earliest
+                for article in page_articles
             )
-            break
-
-        page_articles = [_normalize_article(row) for row in history_page.rows]
-        for article in page_articles:
-            if (
-                article.published_at.date() >= account.earliest
-                and not _is_indexed(
-                    article,
-                    indexed_ids,
-                    indexed_urls,
-                    indexed_title_dates,
-                )
-            ):
-                collected[_url_key(article.url)] = article
+            if reached_boundary or history_page.is_end or not history_page.next_offset:
+                yield _collection_state(fresh, True, page_number + 1, "")
+                return
 
-        reached_boundary = any(
-            article.published_at.date() < account.earliest
-            for article in page_articles
-        )
-        if reached_boundary or history_page.is_end or not history_page.next_offset:
-            backfill_complete = True
-            offset = ""
+            offset = history_page.next_offset
             page_number += 1
-            break
-
-        offset = history_page.next_offset
-        page_number += 1
-        if page_position < max_pages:
-            time.sleep(delay_seconds)
+            if page_position < max_pages:
+                # Ask for the next page while the caller downloads this one; the
+                # client's list bucket still spaces it from the previous page.
+                future = executor.submit(fetch, offset, page_number)
+            yield _collection_state(fresh, False, page_number, offset)
+    finally:
+        closing_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _archive_in_order(
+    pending: list[ArticleSummary],
+    archive: Callable[[ArticleSummary], DownloadedArticle],
+    workers: int,
+    admit: Callable[[int, ArticleSummary], bool],
+) -> Iterator[tuple[int, ArticleSummary, DownloadedArticle | Exception, float]]:
+    """Archive up to `workers` articles at once and yield outcomes in queue order.
+
+    `admit` is asked before each article starts. Once it refuses, articles already
+    in flight still finish and are yielded, so their results reach the index.
+    """
+
+    def timed(article: ArticleSummary) -> tuple[DownloadedArticle | Exception, float]:
+        started = time.monotonic()
+        try:
+            outcome: DownloadedArticle | Exception = archive(article)
+        except Exception as error:
+            outcome = error
+        return outcome, time.monotonic() - started
+
+    if workers == 1:
+        for position, article in enumerate(pending, start=1):
+            if not admit(position, article):
+                return
+            yield (position, article, *timed(article))
+        return
 
-    return CollectionState(
-        articles=sorted(collected.values(), key=lambda article: article.published_at),
-        backfill_complete=backfill_complete,
-        backfill_next_page=page_number,
-        backfill_offset=offset,
-    )
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="article") as executor:
+        in_flight: deque[tuple[int, ArticleSummary, Future[Any]]] = deque()
+        for position, article in enumerate(pending, start=1):
+            if len(in_flight) >= workers:
+                done_position, done_article, future = in_flight.popleft()
+                yield (done_position, done_article, *future.result())
+            if not admit(position, article):
+                break
+            in_flight.append((position, article, executor.submit(timed, article)))
+        while in_flight:
+            done_position, done_article, future = in_flight.popleft()
+            yield (done_position, done_article, *future.result())
 
 
 def _synchronize_account(
@@ -379,56 +623,58 @@ def _synchronize_account(
     client: RapidAPIClient,
     downloader: WeChatArticleDownloader,
     max_pages: int,
-    delay_seconds: float,
     history_v2: bool,
+    stop_requested: Optional[Callable[[], bool]] = None,
+    retry_quarantined: bool = False,
+    time_budget: Optional[TimeBudget] = None,
+    article_workers: int = 1,
+    request_budget: Optional[RequestBudget] = None,
 ) -> tuple[int, int]:
     index_path = INDEX_ROOT / f"{account.slug}.json"
-    index = _load_json(index_path)
-    existing_entries = index.get("articles", [])
-    if not isinstance(existing_entries, list):
+    store = IndexStore(index_path)
+    # Only the month shards that dedup lookups reach are read; see IndexedArticles.
+    index = store.load(lazy=True)
+    entries = index.get("articles", [])
+    if not isinstance(entries, list):
         raise ValueError(f"{index_path.name} 的 articles 字段不是数组")
-
-    indexed_ids = {
-        str(entry.get("articleId", "")).strip()
-        for entry in existing_entries
-        if isinstance(entry, dict) and str(entry.get("articleId", "")).strip()
-    }
-    indexed_urls = {
-        _url_key(str(entry.get("sourceUrl", "")))
-        for entry in existing_entries
-        if isinstance(entry, dict) and str(entry.get("sourceUrl", "")).strip()
-    }
-    indexed_title_dates = {
-        (
-            str(entry.get("title", "")).strip(),
-            _timestamp(entry.get("publishedAt")).date(),
-        )
-        for entry in existing_entries
-        if isinstance(entry, dict)
-        and str(entry.get("title", "")).strip()
-        and entry.get("publishedAt") is not None
-    }
+    indexed = IndexedArticles(store, index)
 
     raw_pending = index.get("pendingArticles", [])
     if not isinstance(raw_pending, list):
         raise ValueError(f"{index_path.name} 的 pendingArticles 字段不是数组")
+    raw_quarantined = index.get("quarantinedArticles", [])
+    if not isinstance(raw_quarantined, list):
+        raise ValueError(f"{index_path.name} 的 quarantinedArticles 字段不是数组")
+    quarantined_by_id: dict[str, tuple[ArticleSummary, RetryState]] = {}
+    for item in raw_quarantined:
+        if not isinstance(item, dict):
+            continue
+        article = _normalize_article(item)
+        if article not in indexed:
+            quarantined_by_id[article.article_id] = (article, _retry_state(item))
     pending_by_id: dict[str, ArticleSummary] = {}
+    retry_by_id: dict[str, RetryState] = {}
     for item in raw_pending:
         if not isinstance(item, dict):
             continue
         article = _normalize_article(item)
-        if not _is_indexed(
-            article, indexed_ids, indexed_urls, indexed_title_dates
-        ):
+        if article not in indexed:
+            pending_by_id[article.article_id] = article
+            retry_by_id[article.article_id] = _retry_state(item)
+    if retry_quarantined and quarantined_by_id:
+        print(f"[{account.name}] {len(quarantined_by_id)} 篇隔离文章放回 pending 队列")
+        for article, _ in quarantined_by_id.values():
             pending_by_id[article.article_id] = article
+            retry_by_id.pop(article.article_id, None)
+        quarantined_by_id.clear()
 
-    migrated_complete_default = bool(existing_entries) and "backfillComplete" not in index
+    migrated_complete_default = store.article_count > 0 and "backfillComplete" not in index
     backfill_complete = bool(
         index.get("backfillComplete", migrated_complete_default)
     )
     known_history_remaining = (
         account.reported_count is not None
-        and len(existing_entries) < account.reported_count
+        and store.article_count < account.reported_count
     )
     backfill_next_page = max(1, int(index.get("backfillNextPage", 1)))
     backfill_offset = str(index.get("backfillOffset") or "").strip()
@@ -438,45 +684,36 @@ def _synchronize_account(
     if history_v2 and known_history_remaining and backfill_complete:
         backfill_complete = False
         print(
-            f"[{account.name}] 已归档 {len(existing_entries)}/"
+            f"[{account.name}] 已归档 {store.article_count}/"
             f"{account.reported_count} 篇，继续探测可能延迟开放的历史分页"
         )
     if history_v2:
-        collection = _collect_history_articles(
+        pages = _history_pages(
             client=client,
             account=account,
-            indexed_ids=indexed_ids,
-            indexed_urls=indexed_urls,
-            indexed_title_dates=indexed_title_dates,
+            indexed=indexed,
             backfill_offset=backfill_offset,
             backfill_next_page=backfill_next_page,
             max_pages=max_pages,
-            delay_seconds=delay_seconds,
         )
     else:
-        collection = _collect_articles(
+        latest = _collect_articles(
             client=client,
             account=account,
-            indexed_ids=indexed_ids,
-            indexed_urls=indexed_urls,
-            indexed_title_dates=indexed_title_dates,
+            indexed=indexed,
             backfill_complete=backfill_complete,
             backfill_next_page=backfill_next_page,
             backfill_offset=backfill_offset,
             max_pages=max_pages,
-            delay_seconds=delay_seconds,
         )
-    for article in collection.articles:
-        if not _is_indexed(
-            article, indexed_ids, indexed_urls, indexed_title_dates
-        ):
-            pending_by_id[article.article_id] = article
+        pages = (state for state in (latest,))
 
-    entries = list(existing_entries)
+    # Articles this run archived, replayed if another writer commits in between.
+    added_ids: set[str] = set()
 
-    def save_state() -> None:
-        next_index = {
-            "version": 5,
+    def build_index() -> dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
             "account": {
                 "slug": account.slug,
                 "name": account.name,
@@ -487,70 +724,224 @@ def _synchronize_account(
             "backfillNextPage": collection.backfill_next_page,
             "backfillOffset": collection.backfill_offset,
             "pendingArticles": [
-                _pending_record(article)
+                _pending_record(
+                    article,
+                    retry_by_id.get(article.article_id, RetryState()),
+                )
                 for article in sorted(
                     pending_by_id.values(),
                     key=lambda item: item.published_at,
                     reverse=True,
                 )
             ],
+            "quarantinedArticles": [
+                _pending_record(article, retry)
+                for article, retry in sorted(
+                    quarantined_by_id.values(),
+                    key=lambda item: item[0].published_at,
+                    reverse=True,
+                )
+            ],
             "articles": entries,
         }
+
+    def merge_state(fresh: dict[str, Any]) -> dict[str, Any]:
+        """Keep another writer's articles and replay this run's additions on top."""
+        fresh_entries = [
+            entry for entry in fresh.get("articles", []) or [] if isinstance(entry, dict)
+        ]
+        fresh_ids = {str(entry.get("articleId", "")).strip() for entry in fresh_entries}
+        ours = [
+            entry
+            for entry in entries
+            if str(entry.get("articleId", "")).strip() in added_ids - fresh_ids
+        ]
+        entries[:] = sorted(
+            [*fresh_entries, *ours],
+            key=lambda entry: str(entry.get("publishedAt", "")),
+            reverse=True,
+        )
+        indexed.add(fresh_entries)
+        # Articles imported elsewhere meanwhile leave this run's queues. Their
+        # months were loaded when they were queued, so no shard is read here.
+        for article_id, article in list(pending_by_id.items()):
+            if indexed.known(article):
+                pending_by_id.pop(article_id)
+                retry_by_id.pop(article_id, None)
+        for article_id, (article, _) in list(quarantined_by_id.items()):
+            if indexed.known(article):
+                quarantined_by_id.pop(article_id)
+        return {**build_index(), "updatedAt": datetime.now(tz=SHANGHAI).isoformat()}
+
+    def save_state() -> None:
+        next_index = build_index()
         current_without_timestamp = {
             key: value for key, value in index.items() if key != "updatedAt"
         }
         if current_without_timestamp == next_index:
             return
         next_index["updatedAt"] = datetime.now(tz=SHANGHAI).isoformat()
-        _save_index(index_path, next_index)
+        with span("sync.save_state", account=account.slug) as save_span:
+            saved = store.commit(next_index, merge_state)
+            save_span.set(bytes=index_path.stat().st_size, merges=store.merges)
         index.clear()
-        index.update(next_index)
-
-    save_state()
-    pending = sorted(pending_by_id.values(), key=lambda article: article.published_at)
-    backfill_label = "历史回补完成" if collection.backfill_complete else (
-        f"历史回补待续（下次从第 {collection.backfill_next_page} 页附近继续）"
-    )
-    print(
-        f"[{account.name}] 发现 {len(collection.articles)} 篇未入库文章，"
-        f"本次需处理 {len(pending)} 篇（含失败重试）；{backfill_label}"
-    )
+        index.update(saved)
 
     succeeded = 0
     failures: list[tuple[ArticleSummary, str]] = []
-    for position, article in enumerate(pending, start=1):
-        print(f"[{account.name} {position}/{len(pending)}] 下载 {article.title}")
-        try:
-            detail = client.fetch_article_detail(article.url)
-            downloaded = downloader.download_detail(article, account.name, detail)
-        except Exception as error:
-            failures.append((article, str(error)))
-            print(f"  失败: {error}", file=sys.stderr)
-        else:
-            relative_path = downloaded.markdown_path.relative_to(PROJECT_ROOT).as_posix()
-            entries.append(
-                {
-                    "articleId": downloaded.article_id,
-                    "title": downloaded.title,
-                    "publishedAt": downloaded.published_at.isoformat(),
-                    "sourceUrl": downloaded.source_url,
-                    "markdownPath": relative_path,
-                    "cover": downloaded.cover_path,
-                    "assetCount": downloaded.asset_count,
-                }
+    # Articles tried in an earlier page round of this run wait for the next run.
+    attempted: set[str] = set()
+    stopped = False
+    with closing(pages):
+        for page_round, collection in enumerate(pages, start=1):
+            for article in collection.articles:
+                if article.article_id not in quarantined_by_id and article not in indexed:
+                    pending_by_id[article.article_id] = article
+            # The page's articles are queued in the same write that moves the
+            # cursor past it, so an interrupted run can never skip them.
+            save_state()
+
+            started_at = datetime.now(tz=SHANGHAI)
+            # Newest first, so a run cut short by its time budget still lands fresh
+            # articles and leaves the older backlog for the next run.
+            pending = sorted(
+                (
+                    article
+                    for article in pending_by_id.values()
+                    if article.article_id not in attempted
+                    and retry_by_id.get(article.article_id, RetryState()).eligible(started_at)
+                ),
+                key=lambda article: article.published_at,
+                reverse=True,
             )
-            entries.sort(key=lambda entry: str(entry.get("publishedAt", "")), reverse=True)
-            indexed_ids.add(downloaded.article_id)
-            indexed_urls.add(_url_key(downloaded.source_url))
-            indexed_title_dates.add(
-                (downloaded.title, downloaded.published_at.date())
+            deferred = sum(
+                1
+                for article in pending_by_id.values()
+                if article.article_id not in attempted
+            ) - len(pending)
+            backfill_label = "历史回补完成" if collection.backfill_complete else (
+                f"历史回补待续（下次从第 {collection.backfill_next_page} 页附近继续）"
             )
-            pending_by_id.pop(article.article_id, None)
-            succeeded += 1
-            print(f"  已保存 {relative_path}，本地资源 {downloaded.asset_count} 个")
-        save_state()
-        if position < len(pending):
-            time.sleep(delay_seconds)
+            print(
+                f"[{account.name}] 发现 {len(collection.articles)} 篇未入库文章，"
+                f"本次需处理 {len(pending)} 篇（含失败重试）；{backfill_label}"
+            )
+            if deferred and page_round == 1:
+                print(f"[{account.name}] {deferred} 篇失败文章仍在退避期，本次跳过")
+            if time_budget is not None and time_budget.limited and pending:
+                print(
+                    f"[{account.name}] 剩余时间预算 {max(0.0, time_budget.remaining()) / 60:.1f} 分钟，"
+                    f"按每篇约 {time_budget.article_estimate():.0f} 秒计划处理 "
+                    f"{time_budget.planned(len(pending))}/{len(pending)} 篇"
+                )
+
+            def admit(position: int, article: ArticleSummary) -> bool:
+                nonlocal stopped
+                carried_over = len(pending) - position + 1
+                if stop_requested is not None and stop_requested():
+                    print(f"[{account.name}] 收到停止请求，{carried_over} 篇文章保留在 pending 队列")
+                    if time_budget is not None:
+                        time_budget.carried_over += carried_over
+                    stopped = True
+                    return False
+                if time_budget is not None and not time_budget.fits():
+                    time_budget.carried_over += carried_over
+                    print(f"[{account.name}] 时间预算不足，{carried_over} 篇文章结转到下次同步")
+                    stopped = True
+                    return False
+                if request_budget is not None and not request_budget.fits():
+                    print(
+                        f"[{account.name}] 请求预算 {request_budget.allowance} 次已用完，"
+                        f"{carried_over} 篇文章保留在 pending 队列"
+                    )
+                    stopped = True
+                    return False
+                attempted.add(article.article_id)
+                print(f"[{account.name} {position}/{len(pending)}] 下载 {article.title}")
+                return True
+
+            def archive(article: ArticleSummary) -> DownloadedArticle:
+                with span(
+                    "sync.article",
+                    account=account.slug,
+                    article=article.article_id,
+                ):
+                    detail = client.fetch_article_detail(article.url)
+                    return downloader.download_detail(article, account.name, detail)
+
+            for position, article, outcome, elapsed in _archive_in_order(
+                pending,
+                archive,
+                article_workers,
+                admit,
+            ):
+                if isinstance(outcome, Exception):
+                    error = outcome
+                    failures.append((article, str(error)))
+                    print(f"  失败 {article.title}: {error}", file=sys.stderr)
+                    retry = _failed_attempt(
+                        retry_by_id.get(article.article_id, RetryState()),
+                        error,
+                        datetime.now(tz=SHANGHAI),
+                    )
+                    if retry.attempts >= QUARANTINE_AFTER_ATTEMPTS:
+                        pending_by_id.pop(article.article_id, None)
+                        retry_by_id.pop(article.article_id, None)
+                        quarantined_by_id[article.article_id] = (article, retry)
+                        print(
+                            f"  已连续失败 {retry.attempts} 次，移入 quarantinedArticles",
+                            file=sys.stderr,
+                        )
+                    else:
+                        retry_by_id[article.article_id] = retry
+                else:
+                    downloaded = outcome
+                    relative_path = (
+                        downloaded.markdown_path.relative_to(PROJECT_ROOT).as_posix()
+                    )
+                    entry: dict[str, Any] = {
+                        "articleId": downloaded.article_id,
+                        "title": downloaded.title,
+                        "publishedAt": downloaded.published_at.isoformat(),
+                        "sourceUrl": downloaded.source_url,
+                        "markdownPath": relative_path,
+                        "cover": downloaded.cover_path,
+                        "assetCount": downloaded.asset_count,
+                    }
+                    if downloaded.pending_assets:
+                        entry["pendingAssets"] = [
+                            {"stem": request.stem, "url": request.url}
+                            | ({"media": True} if request.media else {})
+                            for request in downloaded.pending_assets
+                        ]
+                    entries.append(entry)
+                    entries.sort(
+                        key=lambda item: str(item.get("publishedAt", "")),
+                        reverse=True,
+                    )
+                    added_ids.add(downloaded.article_id)
+                    indexed.add([entry])
+                    pending_by_id.pop(article.article_id, None)
+                    retry_by_id.pop(article.article_id, None)
+                    succeeded += 1
+                    deferred_label = (
+                        f"（{len(downloaded.pending_assets)} 个延后下载）"
+                        if downloaded.pending_assets
+                        else ""
+                    )
+                    print(
+                        f"  已保存 {relative_path}，本地资源 {downloaded.asset_count} 个"
+                        f"{deferred_label}，正文压缩节省 {downloaded.bytes_saved / 1024:.1f} KiB"
+                    )
+                save_state()
+                if time_budget is not None:
+                    time_budget.record(elapsed)
+            if (
+                stopped
+                or (stop_requested is not None and stop_requested())
+                or (time_budget is not None and not time_budget.fits())
+            ):
+                break
 
     if failures:
         print(f"[{account.name}] 以下文章保留到下次同步重试：", file=sys.stderr)
@@ -559,22 +950,113 @@ def _synchronize_account(
     return succeeded, len(failures)
 
 
+def _quarantine_report(accounts: list[AccountConfig]) -> list[str]:
+    """Markdown table rows for every quarantined article across the accounts."""
+    rows: list[str] = []
+    for account in accounts:
+        try:
+            index = _load_json(INDEX_ROOT / f"{account.slug}.json")
+        except (OSError, ValueError):
+            continue
+        for item in index.get("quarantinedArticles") or []:
+            if not isinstance(item, dict):
+                continue
+            message = " ".join(str(item.get("lastErrorMessage") or "").split())
+            message = message.replace("|", "\\|")
+            rows.append(
+                f"| {account.slug} | {item.get('title', '')} | {item.get('attempts', 0)} "
+                f"| {item.get('lastError', '')} | {message} |"
+            )
+    return rows
+
+
+def _write_quarantine_summary(rows: list[str]) -> None:
+    summary_path = os.environ.get("GITHUB_STEP_SUMMARY", "").strip()
+    if not summary_path or not rows:
+        return
+    with Path(summary_path).open("a", encoding="utf-8") as summary:
+        summary.write("### 已隔离文章\n\n")
+        summary.write("| 账号 | 标题 | 失败次数 | 错误类型 | 最后错误 |\n")
+        summary.write("| --- | --- | ---: | --- | --- |\n")
+        summary.write("\n".join(rows) + "\n\n")
+
+
+def _account_metrics(
+    account: AccountConfig,
+    archived: int,
+    failed: int,
+    sync_error: bool,
+) -> AccountMetrics:
+    try:
+        index = _load_json(INDEX_ROOT / f"{account.slug}.json")
+    except (OSError, ValueError):
+        index = {}
+    pending = index.get("pendingArticles")
+    quarantined = index.get("quarantinedArticles")
+    return AccountMetrics(
+        slug=account.slug,
+        archived=archived,
+        failed=failed,
+        sync_error=sync_error,
+        pending=len(pending) if isinstance(pending, list) else 0,
+        quarantined=len(quarantined) if isinstance(quarantined, list) else 0,
+        backfill_complete=bool(index.get("backfillComplete")),
+        backfill_next_page=int(index.get("backfillNextPage") or 1),
+        backfill_has_offset=bool(str(index.get("backfillOffset") or "").strip()),
+    )
+
+
 def synchronize(
     max_pages: int,
-    delay_seconds: float,
     selected_slugs: set[str],
     history_v2: bool,
+    metrics_path: Optional[Path] = None,
+    client: Optional[RapidAPIClient] = None,
+    downloader: Optional[WeChatArticleDownloader] = None,
+    stop_requested: Optional[Callable[[], bool]] = None,
+    retry_quarantined: bool = False,
+    time_budget: Optional[TimeBudget] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    article_workers: int = 1,
+    html_pool: Optional[HtmlProcessPool] = None,
+    image_placeholders: bool = False,
+    defer_assets: bool = False,
+    request_budget: Optional[RequestBudget] = None,
 ) -> tuple[int, int, list[str]]:
+    """Sync the selected accounts; long-lived callers pass a warm client and downloader.
+
+    With a `request_budget`, no article detail is requested once the budget's
+    allowance has been sent; the rest stay queued for a later run.
+    """
+    started_at = time.time()
     accounts = _load_accounts(selected_slugs)
-    key_pool = load_api_key_pool()
-    client = RapidAPIClient(key_pool)
-    print(f"已加载 {client.key_count} 个 RapidAPI Key，按日期轮换并自动故障转移")
-    downloader = WeChatArticleDownloader()
+    if client is None:
+        client = RapidAPIClient(
+            load_api_key_pool(),
+            rate_limiter=rate_limiter,
+            latency_history=LatencyHistory(),
+            hedge_policy=hedge_policy,
+        )
+        print(f"已加载 {client.key_count} 个 RapidAPI Key，按日期轮换并自动故障转移")
+    if downloader is None:
+        downloader = WeChatArticleDownloader(
+            search_index=SearchIndex(),
+            rate_limiter=rate_limiter,
+            html_pool=html_pool,
+            image_placeholders=image_placeholders,
+            defer_assets=defer_assets,
+        )
     succeeded = 0
     failed = 0
     account_errors: list[str] = []
+    account_metrics: list[AccountMetrics] = []
 
     for position, account in enumerate(accounts, start=1):
+        if time_budget is not None and time_budget.remaining() <= 0:
+            skipped = ", ".join(item.slug for item in accounts[position - 1 :])
+            print(f"时间预算已用完，未检查的公众号结转到下次同步：{skipped}")
+            break
         print(f"=== 同步公众号：{account.name} ({account.slug}) ===")
         try:
             account_succeeded, account_failed = _synchronize_account(
@@ -582,18 +1064,47 @@ def synchronize(
                 client=client,
                 downloader=downloader,
                 max_pages=max_pages,
-                delay_seconds=delay_seconds,
                 history_v2=history_v2,
+                stop_requested=stop_requested,
+                retry_quarantined=retry_quarantined,
+                time_budget=time_budget,
+                article_workers=article_workers,
+                request_budget=request_budget,
             )
         except (OSError, ValueError, RapidAPIError) as error:
             account_errors.append(f"{account.name}: {error}")
             print(f"[{account.name}] 同步失败: {error}", file=sys.stderr)
+            account_metrics.append(_account_metrics(account, 0, 0, True))
         else:
             succeeded += account_succeeded
             failed += account_failed
-        if position < len(accounts):
-            time.sleep(delay_seconds)
+            account_metrics.append(
+                _account_metrics(account, account_succeeded, account_failed, False)
+            )
+        if stop_requested is not None and stop_requested():
+            break
 
+    if client.latency_history is not None:
+        client.latency_history.save()
+    if client.hedges_sent:
+        print(
+            f"详情对冲请求 {client.hedges_sent} 次，"
+            f"其中 {client.hedges_won} 次比原请求先返回"
+        )
+    if metrics_path is not None:
+        write_textfile(
+            metrics_path,
+            render_textfile(
+                accounts=account_metrics,
+                request_latency=client.request_latency,
+                failovers=client.failovers,
+                quota_remaining=client.quota_remaining,
+                key_count=client.key_count,
+                started_at=started_at,
+                finished_at=time.time(),
+            ),
+        )
+        print(f"Prometheus 指标已写入 {metrics_path}")
     return succeeded, failed, account_errors
 
 
@@ -611,17 +1122,90 @@ def build_parser() -> argparse.ArgumentParser:
         default=1,
         help="每个公众号最多读取的列表页数（默认 1）",
     )
-    parser.add_argument("--delay", type=float, default=2.0, help="请求间隔秒数")
     parser.add_argument(
         "--history-v2",
         action="store_true",
         help="使用带 offset 游标的 V2 接口回补历史；会消耗 Pro 月度额度",
     )
+    parser.add_argument(
+        "--change-manifest",
+        type=Path,
+        default=DEFAULT_MANIFEST_PATH,
+        help="本次新增、修改和删除文件的清单路径（默认 data/wechat/change-manifest.json）",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        type=Path,
+        help="运行结束时写入 Prometheus textfile 指标（例如 node_exporter 的 textfile 目录下的 wechat_sync.prom）",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        help="把各阶段耗时以 JSON Lines 追加到该文件，并在 Actions 摘要中输出耗时表",
+    )
+    parser.add_argument(
+        "--retry-quarantined",
+        action="store_true",
+        help=f"把连续失败 {QUARANTINE_AFTER_ATTEMPTS} 次后隔离的文章放回 pending 队列并清零重试计数",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="本次运行最多使用的分钟数；按实测单篇耗时规划，优先处理最新文章，"
+        "预算不足时把剩余文章结转到下次同步",
+    )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=1,
+        help="同时处理的文章数：详情请求和图片下载在线程中并行（默认 1，即逐篇处理）",
+    )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=0,
+        help="解析、清洗和渲染正文的进程数；0 表示在下载线程内完成（默认 0）",
+    )
+    parser.add_argument(
+        "--image-placeholders",
+        action="store_true",
+        help="为正文图片写入模糊低清占位图（需要安装 Pillow）",
+    )
+    parser.add_argument(
+        "--defer-assets",
+        action="store_true",
+        help="先发布正文，图片以占位图代替，之后用 python -m wechat_sync assets 补齐",
+    )
+    add_rate_arguments(parser)
+    add_hedge_arguments(parser)
+    add_profile_arguments(parser)
     return parser
 
 
 def main() -> int:
     args = build_parser().parse_args()
+    return run_profiled(args, lambda: _run(args))
+
+
+def _stop_on_signals() -> Callable[[], bool]:
+    """Turn SIGTERM/SIGINT into a stop request checked between index commits."""
+    received: list[int] = []
+
+    def handle(signum: int, frame: Optional[FrameType]) -> None:
+        if received:
+            raise KeyboardInterrupt
+        received.append(signum)
+        print(
+            f"收到信号 {signal.Signals(signum).name}，保存当前文章后停止；再次发送将立即中断",
+            file=sys.stderr,
+        )
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+    return lambda: bool(received)
+
+
+def _run(args: argparse.Namespace) -> int:
     if args.max_pages < 1:
         print("--max-pages 必须大于 0", file=sys.stderr)
         return 2
@@ -632,27 +1216,92 @@ def main() -> int:
             file=sys.stderr,
         )
         return 2
-    if args.delay < 0:
-        print("--delay 不能小于 0", file=sys.stderr)
+    argument_error = rate_argument_error(args) or hedge_argument_error(args)
+    if argument_error is not None:
+        print(argument_error, file=sys.stderr)
+        return 2
+    if args.time_budget is not None and args.time_budget <= 0:
+        print("--time-budget 必须大于 0", file=sys.stderr)
+        return 2
+    if args.io_workers < 1 or args.cpu_workers < 0:
+        print("--io-workers 必须大于 0，--cpu-workers 不能小于 0", file=sys.stderr)
         return 2
+    if args.image_placeholders and not placeholders_available():
+        print("--image-placeholders 需要 Pillow：pip install Pillow", file=sys.stderr)
+        return 2
+    run_lock = RunLock()
+    try:
+        run_lock.acquire()
+    except LockBusyError as error:
+        print(f"同步未启动: {error}", file=sys.stderr)
+        return 1
+    tracker = ChangeTracker()
+    if args.trace is not None:
+        enable_tracing(args.trace)
+    time_budget = TimeBudget(None if args.time_budget is None else args.time_budget * 60)
+    stop_requested = _stop_on_signals()
+    rate_limiter = rate_limiter_from_args(args)
+    html_pool = HtmlProcessPool(args.cpu_workers) if args.cpu_workers else None
     try:
         succeeded, failed, account_errors = synchronize(
             max_pages=args.max_pages,
-            delay_seconds=args.delay,
             selected_slugs=set(args.account),
             history_v2=args.history_v2,
+            metrics_path=args.metrics_textfile,
+            retry_quarantined=args.retry_quarantined,
+            time_budget=time_budget,
+            stop_requested=stop_requested,
+            rate_limiter=rate_limiter,
+            hedge_policy=hedge_policy_from_args(args),
+            article_workers=args.io_workers,
+            html_pool=html_pool,
+            image_placeholders=args.image_placeholders,
+            defer_assets=args.defer_assets,
         )
     except (OSError, ValueError, RapidAPIError) as error:
         print(f"同步失败: {error}", file=sys.stderr)
-        _write_actions_outputs(0, 1)
+        manifest = tracker.write(args.change_manifest)
+        _write_actions_outputs(0, 1, args.change_manifest, manifest)
         return 1
-
-    _write_actions_outputs(succeeded, failed + len(account_errors))
+    finally:
+        if html_pool is not None:
+            html_pool.close()
+        run_lock.release()
+        tracer = disable_tracing()
+        if tracer is not None:
+            write_step_summary(tracer)
+            print(f"阶段耗时已写入 {tracer.path}")
+
+    print(f"请求节奏：{rate_limiter.summary()}")
+    lock_waits = lock_wait_summary()
+    if lock_waits is not None:
+        print(lock_waits)
+    manifest = tracker.write(args.change_manifest)
+    print(
+        f"变更清单：{len(manifest['articles'])} 篇文章、"
+        f"{changed_file_count(manifest)} 个文件 -> {args.change_manifest}"
+    )
+    _write_actions_outputs(
+        succeeded,
+        failed + len(account_errors),
+        args.change_manifest,
+        manifest,
+        carried_over=time_budget.carried_over,
+    )
     for message in account_errors:
         print(f"- {message}", file=sys.stderr)
+    quarantined = _quarantine_report(_load_accounts(set(args.account)))
+    if quarantined:
+        print(
+            f"{len(quarantined)} 篇文章已隔离，不再自动重试；"
+            "排查后用 --retry-quarantined 放回队列：",
+            file=sys.stderr,
+        )
+        print("\n".join(quarantined), file=sys.stderr)
+        _write_quarantine_summary(quarantined)
     print(
         f"同步完成：新增 {succeeded} 篇，文章失败 {failed} 篇，"
-        f"账号失败 {len(account_errors)} 个"
+        f"结转 {time_budget.carried_over} 篇，账号失败 {len(account_errors)} 个"
     )
     return 1 if failed or account_errors else 0
 
@@ -0,0 +1,160 @@
+"""Optional span timing for the sync pipeline, written as JSON lines."""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class _NullSpan:
+    """Returned while tracing is off so instrumented code pays one call."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("_tracer", "name", "attributes", "_started_at", "_start")
+
+    def __init__(self, tracer: Tracer, name: str, attributes: dict[str, Any]) -> None:
+        self._tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self._started_at = 0.0
+        self._start = 0.0
+
+    def __enter__(self) -> Span:
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self._tracer.record(self.name, self._started_at, duration, self.attributes)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """Append finished spans to a JSON-lines file and keep per-stage totals."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._output = path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._durations: dict[str, list[float]] = {}
+        self._errors: dict[str, int] = {}
+        self._bytes: dict[str, int] = {}
+
+    def record(
+        self,
+        name: str,
+        started_at: float,
+        duration: float,
+        attributes: dict[str, Any],
+    ) -> None:
+        line = json.dumps(
+            {
+                "name": name,
+                "start": round(started_at, 6),
+                "durationMs": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+                **attributes,
+            },
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            self._output.write(line + "\n")
+            self._durations.setdefault(name, []).append(duration)
+            if "error" in attributes:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            if isinstance(attributes.get("bytes"), int):
+                self._bytes[name] = self._bytes.get(name, 0) + attributes["bytes"]
+
+    def close(self) -> None:
+        with self._lock:
+            self._output.close()
+
+    def summary_markdown(self) -> str:
+        """Render the per-stage latency table for the Actions step summary."""
+        lines = [
+            "### 同步各阶段耗时",
+            "",
+            "| 阶段 | 次数 | 失败 | 总耗时 (s) | P50 (ms) | P95 (ms) | 最大 (ms) | 字节 |",
+            "| --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: |",
+        ]
+        with self._lock:
+            stages = sorted(
+                self._durations.items(),
+                key=lambda item: sum(item[1]),
+                reverse=True,
+            )
+            for name, durations in stages:
+                ordered = sorted(durations)
+                lines.append(
+                    f"| `{name}` | {len(ordered)} | {self._errors.get(name, 0)} | "
+                    f"{sum(ordered):.2f} | {_percentile(ordered, 0.5) * 1000:.0f} | "
+                    f"{_percentile(ordered, 0.95) * 1000:.0f} | "
+                    f"{ordered[-1] * 1000:.0f} | {self._bytes.get(name, 0)} |"
+                )
+        if not stages:
+            lines.append("| （无记录） | 0 | 0 | 0 | 0 | 0 | 0 | 0 |")
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+_tracer: Optional[Tracer] = None
+
+
+def span(name: str, **attributes: Any) -> Span | _NullSpan:
+    tracer = _tracer
+    if tracer is None:
+        return NULL_SPAN
+    return Span(tracer, name, attributes)
+
+
+def enable(path: Path) -> Tracer:
+    global _tracer
+    disable()
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def write_step_summary(tracer: Tracer) -> None:
+    summary_path = os.environ.get("GITHUB_STEP_SUMMARY", "").strip()
+    if not summary_path:
+        return
+    with Path(summary_path).open("a", encoding="utf-8") as output:
+        output.write(tracer.summary_markdown())
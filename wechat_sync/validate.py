@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import argparse
 import json
 import re
 import sys
@@ -9,16 +10,28 @@ from pathlib import Path
 from typing import Any, Optional
 from urllib.parse import urlsplit
 
+from .index_store import IndexStore
+from .partial_assets import PENDING_ASSET
+from .profiling import add_profile_arguments, run_profiled
+from .search_index import DEFAULT_INDEX_ROOT as SEARCH_INDEX_ROOT
+from .search_index import SearchIndex, article_scope
+from .sidecars import stale_sidecars
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 CONFIG_PATH = Path(__file__).resolve().parent / "accounts.json"
 INDEX_ROOT = Path(__file__).resolve().parent / "indexes"
 CONTENT_ROOT = PROJECT_ROOT / "src" / "content" / "articles"
+COLLECTION_ROOT = PROJECT_ROOT / "src" / "content"
 PUBLIC_ROOT = PROJECT_ROOT / "public"
 IMAGE_SOURCE_RE = re.compile(
     r"<(?:img|image)\b[^>]*(?:src|href)=[\"']([^\"']+)[\"']",
     re.IGNORECASE,
 )
+MEDIA_SOURCE_RE = re.compile(
+    r"<(?:audio|video|source)\b[^>]*\bsrc=[\"']([^\"']+)[\"']",
+    re.IGNORECASE,
+)
 CSS_URL_RE = re.compile(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)", re.IGNORECASE)
 MOJIBAKE_RE = re.compile(r"(?:’╝|ŃĆ|[ÕĶń][^\s<])")
 
@@ -45,6 +58,70 @@ def _load_object(path: Path) -> dict[str, Any]:
     return payload
 
 
+def _pending_stems(entry: dict[str, Any], label: str, errors: list[str]) -> set[str]:
+    items = entry.get("pendingAssets", [])
+    if not isinstance(items, list):
+        errors.append(f"{label} 的 pendingAssets 必须是数组")
+        return set()
+    stems: set[str] = set()
+    for item in items:
+        if not isinstance(item, dict) or not item.get("stem") or not item.get("url"):
+            errors.append(f"{label} 的 pendingAssets 结构无效")
+            continue
+        stems.add(str(item["stem"]))
+    return stems
+
+
+def _asset_errors(
+    value: str,
+    pending_stems: set[str],
+    markdown_value: str,
+    missing_message: str,
+) -> list[str]:
+    """A pending placeholder is fine only while its stem is still registered."""
+    if value.startswith(f"{PENDING_ASSET}#"):
+        if urlsplit(value).fragment in pending_stems:
+            return []
+        return [f"{markdown_value} 引用了未登记的待下载资源: {value}"]
+    path = _local_public_path(value)
+    if path is None or not path.is_file():
+        return [f"{markdown_value} {missing_message}: {value}"]
+    return []
+
+
+def pending_assets() -> tuple[int, int]:
+    """Articles still published with deferred assets, and how many assets they wait for."""
+    articles = assets = 0
+    for index_path in INDEX_ROOT.glob("*.json"):
+        try:
+            entries = IndexStore(index_path).load()["articles"]
+        except (OSError, ValueError):
+            continue
+        for entry in entries:
+            items = entry.get("pendingAssets") if isinstance(entry, dict) else None
+            if isinstance(items, list) and items:
+                articles += 1
+                assets += len(items)
+    return articles, assets
+
+
+def _search_index_errors(slugs: list[str], article_keys: dict[str, set[str]]) -> list[str]:
+    if not (SEARCH_INDEX_ROOT / "manifest.json").is_file():
+        return ["缺少站内搜索索引，请运行 python -m wechat_sync.search_index --rebuild"]
+    search_index = SearchIndex(SEARCH_INDEX_ROOT)
+    expected = {article_scope(slug): article_keys.get(slug, set()) for slug in slugs}
+    expected["report"] = {path.stem for path in (COLLECTION_ROOT / "reports").glob("*.md")}
+    expected["note"] = {path.stem for path in (COLLECTION_ROOT / "notes").glob("*.md")}
+    errors: list[str] = []
+    for scope, keys in sorted(expected.items()):
+        indexed = search_index.keys(scope)
+        for key in sorted(keys - indexed):
+            errors.append(f"搜索索引 {scope} 缺少文档: {key}")
+        for key in sorted(indexed - keys):
+            errors.append(f"搜索索引 {scope} 包含已删除文档: {key}")
+    return errors
+
+
 def validate() -> list[str]:
     errors: list[str] = []
     try:
@@ -71,14 +148,18 @@ def validate() -> list[str]:
     seen_ids: set[str] = set()
     seen_urls: set[str] = set()
     seen_paths: set[Path] = set()
+    article_keys: dict[str, set[str]] = {}
 
     for slug, source_name in configured_accounts:
         index_path = INDEX_ROOT / f"{slug}.json"
+        store = IndexStore(index_path)
         try:
-            index = _load_object(index_path)
+            index = store.load()
         except (OSError, ValueError) as error:
             errors.append(f"无法读取 {index_path.relative_to(PROJECT_ROOT)}: {error}")
             continue
+        for stray in store.stray_shards():
+            errors.append(f"存在未登记的索引分片: {stray.relative_to(PROJECT_ROOT)}")
 
         entries = index.get("articles")
         pending = index.get("pendingArticles", [])
@@ -123,6 +204,7 @@ def validate() -> list[str]:
             if markdown_path in seen_paths:
                 errors.append(f"{label} 的 markdownPath 重复: {markdown_value}")
             seen_paths.add(markdown_path)
+            article_keys.setdefault(slug, set()).add(markdown_path.stem)
             if not markdown_path.is_file():
                 errors.append(f"{label} 的 Markdown 不存在: {markdown_value}")
                 continue
@@ -138,28 +220,42 @@ def validate() -> list[str]:
             if len(MOJIBAKE_RE.findall(markdown)) >= 8:
                 errors.append(f"{markdown_value} 疑似包含字符编码乱码")
 
+            pending_stems = _pending_stems(entry, label, errors)
             cover = str(entry.get("cover", "")).strip()
             if cover:
-                cover_path = _local_public_path(cover)
-                if cover_path is None or not cover_path.is_file():
-                    errors.append(f"{markdown_value} 的本地封面不存在: {cover}")
+                errors.extend(
+                    _asset_errors(cover, pending_stems, markdown_value, "的本地封面不存在")
+                )
 
             image_sources = IMAGE_SOURCE_RE.findall(markdown) + CSS_URL_RE.findall(markdown)
             for image_source in image_sources:
                 if image_source.startswith("data:"):
                     continue
-                image_path = _local_public_path(image_source)
-                if image_path is None:
+                if _local_public_path(image_source) is None:
                     errors.append(f"{markdown_value} 仍包含远程正文图片: {image_source}")
-                elif not image_path.is_file():
-                    errors.append(f"{markdown_value} 引用的正文图片不存在: {image_source}")
-
-        for position, item in enumerate(pending):
-            if not isinstance(item, dict) or not str(item.get("articleId", "")).strip():
-                errors.append(f"{index_path.name}:pendingArticles[{position}] 结构无效")
-                continue
-            if str(item["articleId"]).strip() in account_ids:
-                errors.append(f"{index_path.name}:pendingArticles[{position}] 已存在于完成索引")
+                    continue
+                errors.extend(
+                    _asset_errors(image_source, pending_stems, markdown_value, "引用的正文图片不存在")
+                )
+            for media_source in MEDIA_SOURCE_RE.findall(markdown):
+                if _local_public_path(media_source) is None:
+                    errors.append(f"{markdown_value} 仍包含远程音视频: {media_source}")
+                    continue
+                errors.extend(
+                    _asset_errors(media_source, pending_stems, markdown_value, "引用的音视频不存在")
+                )
+
+        quarantined = index.get("quarantinedArticles", [])
+        if not isinstance(quarantined, list):
+            errors.append(f"{index_path.name} 的 quarantinedArticles 必须是数组")
+            quarantined = []
+        for queue, items in (("pendingArticles", pending), ("quarantinedArticles", quarantined)):
+            for position, item in enumerate(items):
+                if not isinstance(item, dict) or not str(item.get("articleId", "")).strip():
+                    errors.append(f"{index_path.name}:{queue}[{position}] 结构无效")
+                    continue
+                if str(item["articleId"]).strip() in account_ids:
+                    errors.append(f"{index_path.name}:{queue}[{position}] 已存在于完成索引")
 
     indexed_files = set(CONTENT_ROOT.glob("*.md"))
     for orphan in sorted(indexed_files - seen_paths):
@@ -169,11 +265,33 @@ def validate() -> list[str]:
     for index_path in INDEX_ROOT.glob("*.json"):
         if index_path.name not in configured_index_names:
             errors.append(f"存在未配置的公众号索引: {index_path.relative_to(PROJECT_ROOT)}")
-
+    configured_slugs = {slug for slug, _ in configured_accounts}
+    for shard_root in INDEX_ROOT.iterdir():
+        if shard_root.is_dir() and shard_root.name not in configured_slugs:
+            errors.append(f"存在未配置的公众号索引分片: {shard_root.relative_to(PROJECT_ROOT)}")
+
+    errors.extend(
+        _search_index_errors([slug for slug, _ in configured_accounts], article_keys)
+    )
+    for markdown_path in stale_sidecars():
+        errors.append(
+            f"{markdown_path.relative_to(PROJECT_ROOT)} 的纯文本旁路文件缺失或过期"
+        )
     return errors
 
 
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="发布前检查公众号索引、文章、图片、旁路文件和搜索索引是否一致")
+    add_profile_arguments(parser)
+    return parser
+
+
 def main() -> int:
+    args = build_parser().parse_args()
+    return run_profiled(args, _run)
+
+
+def _run() -> int:
     errors = validate()
     if errors:
         print("归档完整性检查失败:", file=sys.stderr)
@@ -181,6 +299,12 @@ def main() -> int:
             print(f"- {error}", file=sys.stderr)
         return 1
     print("双公众号归档完整性检查通过")
+    articles, assets = pending_assets()
+    if assets:
+        print(
+            f"另有 {articles} 篇文章的 {assets} 个资源延后下载，"
+            "运行 python -m wechat_sync assets 补齐"
+        )
     return 0
 
 